@@ -1,8 +1,25 @@
 from django.contrib import admin
-from .models import Order
+from django.utils import timezone
+from django.db.models import Sum
+from core.exports import ExportMixin
+from .exports import invoice_zip_response
+from .models import Order, OrderLine, InvoiceJob, CartLine, DailySales
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    fields = ('product', 'name', 'quantity', 'unit_price', 'line_total')
+    readonly_fields = fields
+    can_delete = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportMixin, admin.ModelAdmin):
+    inlines = [OrderLineInline]
+    actions = ['download_invoices', *ExportMixin.actions]
     list_display = (
         'order_id',
         'created',
@@ -27,3 +44,70 @@ class OrderAdmin(admin.ModelAdmin):
             'fields': ('whatsapp_sent', 'pdf_invoice'),
         }),
     )
+
+    ORDER_COLUMNS = ('order_id', 'created', 'shipping_zone', 'shipping_cost', 'total_paid', 'whatsapp_sent')
+    ITEM_COLUMNS = ('product_id', 'name', 'quantity', 'price', 'total')
+
+    def export_columns(self):
+        return [*self.ORDER_COLUMNS, *(f'item_{column}' for column in self.ITEM_COLUMNS)]
+
+    def export_rows(self, queryset):
+        """One row per order item, with the order's fields repeated."""
+        for order in queryset.values(*self.ORDER_COLUMNS, 'items').iterator(chunk_size=self.export_chunk_size):
+            items = order.pop('items') or [{}]
+            for item in items:
+                yield {**order, **{f'item_{column}': item.get(column) for column in self.ITEM_COLUMNS}}
+
+    @admin.action(description="Download invoices (ZIP)")
+    def download_invoices(self, request, queryset):
+        return invoice_zip_response(queryset, f'invoices_{timezone.localdate()}.zip')
+
+
+@admin.register(InvoiceJob)
+class InvoiceJobAdmin(admin.ModelAdmin):
+    list_display = ('order', 'status', 'attempts', 'run_after', 'updated')
+    list_filter = ('status',)
+    list_select_related = ('order',)
+    readonly_fields = ('order', 'attempts', 'last_error', 'locked_at', 'created', 'updated')
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected invoice jobs")
+    def retry_jobs(self, request, queryset):
+        count = queryset.update(status=InvoiceJob.PENDING, attempts=0, run_after=timezone.now(), locked_at=None)
+        self.message_user(request, f"{count} invoice job(s) queued again.")
+
+
+@admin.register(CartLine)
+class CartLineAdmin(admin.ModelAdmin):
+    list_display = ('cart_id', 'name', 'quantity', 'price', 'updated')
+    search_fields = ('cart_id', 'name')
+    raw_id_fields = ('product',)
+
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """Sales dashboard. Reads only the rollup table, so it stays fast however many orders exist."""
+    list_display = ('date', 'dimension', 'label', 'orders', 'units', 'revenue', 'shipping')
+    list_filter = ('dimension',)
+    date_hierarchy = 'date'
+    search_fields = ('label', 'key')
+    change_list_template = 'admin/cart/dailysales/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response  # redirect / error page
+        if 'dimension__exact' not in request.GET:
+            queryset = queryset.filter(dimension=DailySales.TOTAL)   # don't count a sale once per dimension
+        response.context_data['summary'] = queryset.aggregate(
+            orders=Sum('orders'), units=Sum('units'), revenue=Sum('revenue'), shipping=Sum('shipping'),
+        )
+        return response
@@ -1,21 +1,38 @@
 # cart/cart.py
 from decimal import Decimal
-from django.conf import settings
 from shop.models import Product
+from .stores import get_cart_store
+
+BATCH_OPERATIONS = ('add', 'set', 'remove')
+MAX_BATCH_OPERATIONS = 100
+
+
+class CartOperationError(ValueError):
+    pass
 
 
 class Cart:
+    """
+    Shopping cart. Lines are kept by the store chosen in settings.CART_STORE
+    (cart/stores.py). One instance per request (see CartMiddleware): the
+    product lookup and totals are computed on first use and reused until
+    the cart is changed.
+    """
+
     def __init__(self, request):
         self.session = request.session
-        cart = self.session.get(settings.CART_SESSION_ID)
-        if not cart:
-            # create empty cart if doesn't exist
-            cart = self.session[settings.CART_SESSION_ID] = {}
-        self.cart = cart
+        self.store = get_cart_store(request)
+        # Nothing is written until something is added, so browsing never
+        # creates a session row or cart.
+        self.cart = self.store.load()
+        self._items = None
+        self._total = None
 
     def add(self, product, quantity=1):
+        quantity = max(int(quantity), 1)   # a line always holds at least one
         product_id = str(product.id)
-        if product_id not in self.cart:
+        created = product_id not in self.cart
+        if created:
             self.cart[product_id] = {
                 'id': product.id,
                 'name': product.name,
@@ -23,6 +40,7 @@ class Cart:
                 'quantity': 0,
             }
         self.cart[product_id]['quantity'] += quantity
+        self.store.set_line(product_id, self.cart[product_id], created)
         self.save()
 
     def update(self, product_id, quantity):
@@ -32,32 +50,117 @@ class Cart:
                 self.remove(product_id)
             else:
                 self.cart[product_id]['quantity'] = quantity
-            self.save()
+                self.store.set_line(product_id, self.cart[product_id], False)
+                self.save()
 
     def remove(self, product_id):
         product_id = str(product_id)
         if product_id in self.cart:
             del self.cart[product_id]
+            self.store.delete_lines([product_id])
             self.save()
 
+    def apply(self, operations):
+        """
+        Apply ``[{'op': 'add'|'set'|'remove', 'product_id': 1, 'quantity': 2}, ...]``
+        all-or-nothing: products are checked with one query, and the new cart is
+        persisted with a single store write. Raises CartOperationError.
+        """
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            raise CartOperationError(f"At most {MAX_BATCH_OPERATIONS} operations per request.")
+        parsed = []
+        for index, operation in enumerate(operations):
+            try:
+                op = operation['op']
+                product_id = str(int(operation['product_id']))
+                # A remove ignores any quantity it is sent
+                quantity = 0 if op == 'remove' else int(operation.get('quantity', 1 if op == 'add' else 0))
+            except (TypeError, KeyError, ValueError):
+                raise CartOperationError(f"Operation {index}: expected op, product_id and an integer quantity.")
+            if op not in BATCH_OPERATIONS:
+                raise CartOperationError(f"Operation {index}: unknown op {op!r}.")
+            if quantity < (1 if op == 'add' else 0):
+                raise CartOperationError(f"Operation {index}: invalid quantity {quantity}.")
+            parsed.append((op, product_id, quantity))
+
+        wanted = {product_id for op, product_id, _ in parsed if op != 'remove'}
+        products = {
+            str(row['id']): row for row in
+            Product.objects.filter(id__in=wanted).values('id', 'name', 'price', 'available', 'in_stock')
+        }
+        # Lines already in the cart may be changed even if the product was since hidden or sold out
+        # (checkout re-checks stock).
+        invalid = [
+            pid for pid in wanted
+            if pid not in products or not (products[pid]['available'] and products[pid]['in_stock'] or pid in self.cart)
+        ]
+        if invalid:
+            raise CartOperationError(f"Unknown or unavailable product(s): {', '.join(sorted(invalid, key=int))}.")
+
+        lines = {product_id: dict(line) for product_id, line in self.cart.items()}
+        for op, product_id, quantity in parsed:
+            if op == 'remove' or (op == 'set' and quantity == 0):
+                lines.pop(product_id, None)
+                continue
+            if product_id not in lines:
+                product = products[product_id]
+                lines[product_id] = {
+                    'id': product['id'],
+                    'name': product['name'],
+                    'price': str(product['price']),
+                    'quantity': 0,
+                }
+            lines[product_id]['quantity'] = quantity if op == 'set' else lines[product_id]['quantity'] + quantity
+
+        changed = {product_id: line for product_id, line in lines.items() if self.cart.get(product_id) != line}
+        removed = [product_id for product_id in self.cart if product_id not in lines]
+        if changed or removed:
+            self.store.write_lines(changed, removed)
+        self.cart = lines
+        self.save()
+
+    def summary(self):
+        """JSON-friendly totals and lines (from stored line data — no product query)."""
+        return {
+            'cart_total': len(self),
+            'cart_price': float(self.get_total_price()),
+            'items': [{
+                'product_id': line['id'],
+                'name': line['name'],
+                'quantity': line['quantity'],
+                'price': line['price'],
+                'total_price': str(Decimal(line['price']) * line['quantity']),
+            } for line in self.cart.values()],
+        }
+
     def save(self):
-        self.session.modified = True
+        """Forget memoized items/totals after a change (the store has already persisted it)."""
+        self._items = None
+        self._total = None
 
-    def __iter__(self):
-        """Safe iterator — auto-removes deleted products, never crashes template"""
+    def get_items(self):
+        """Cart lines with their products — one query per request, deleted products dropped."""
+        if self._items is None:
+            self._items = self._load_items()
+        return self._items
+
+    def _load_items(self):
         product_ids = list(self.cart.keys())
         valid_ids = [pid for pid in product_ids if pid.isdigit()]
-        
+
         if not valid_ids:
-            return  # empty cart
+            return []  # empty cart
 
-        products = Product.objects.filter(id__in=valid_ids)
+        products = Product.objects.for_listing().filter(id__in=valid_ids)
         products_dict = {str(p.id): p for p in products}
 
+        items = []
+        stale = []
         for product_id in product_ids:
             if product_id not in products_dict:
                 # Product was deleted → silently remove from cart
                 del self.cart[product_id]
+                stale.append(product_id)
                 continue
 
             item = self.cart[product_id].copy()
@@ -65,18 +168,28 @@ class Cart:
             item['price'] = Decimal(item['price'])
             item['total_price'] = item['price'] * item['quantity']
             item['product_id'] = int(product_id)  # safe for url tag
-            yield item
+            items.append(item)
 
-        # Save cleaned cart
-        self.save()
+        if stale:
+            # Save cleaned cart
+            self.store.delete_lines(stale)
+            self._total = None
+        return items
+
+    def __iter__(self):
+        """Safe iterator — auto-removes deleted products, never crashes template"""
+        return iter(self.get_items())
 
     def __len__(self):
         return sum(item['quantity'] for item in self.cart.values())
 
     def get_total_price(self):
-        return sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        if self._total is None:
+            self._total = sum(Decimal(item['price']) * item['quantity'] for item in self.cart.values())
+        return self._total
 
     def clear(self):
-        if settings.CART_SESSION_ID in self.session:
-            del self.session[settings.CART_SESSION_ID]
-        self.session.modified = True
\ No newline at end of file
+        self.store.clear()
+        self.cart = {}
+        self._items = None
+        self._total = None
@@ -0,0 +1,69 @@
+# cart/exports.py
+"""
+Invoice ZIP downloads, streamed.
+
+The archive is written by zipfile into a small write-only buffer that is
+drained after every chunk, and orders are read with iterator(), so memory
+stays flat however many invoices are selected. Orders without a PDF get
+one rendered on the spot (and saved, so the next export is quicker).
+"""
+import zipfile
+
+from django.http import StreamingHttpResponse
+
+from .invoices import generate_invoice
+
+CHUNK_SIZE = 64 * 1024
+
+
+class _ZipBuffer:
+    """Unseekable file object for zipfile: collects output until drain()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def stream_invoice_zip(orders):
+    """Yield the bytes of a ZIP with one invoice PDF per order in ``orders`` (a queryset)."""
+    buffer = _ZipBuffer()
+    failed = []
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for order in orders.order_by('created').iterator(chunk_size=200):
+            if not order.pdf_invoice:
+                try:
+                    generate_invoice(order)
+                except Exception as exc:  # keep streaming; list the failures at the end
+                    failed.append(f"Order #{order.order_id}: {exc}")
+                    continue
+
+            arcname = f"{order.created:%Y-%m-%d}_invoice_{order.order_id}.pdf"
+            try:
+                with order.pdf_invoice.open('rb') as source, archive.open(arcname, 'w') as target:
+                    while chunk := source.read(CHUNK_SIZE):
+                        target.write(chunk)
+                        if buffer.chunks:
+                            yield buffer.drain()
+            except FileNotFoundError:
+                failed.append(f"Order #{order.order_id}: {order.pdf_invoice.name} is missing from storage")
+
+        if failed:
+            archive.writestr('MISSING.txt', "\n".join(failed) + "\n")
+    yield buffer.drain()   # remaining entry data and the central directory
+
+
+def invoice_zip_response(orders, filename):
+    response = StreamingHttpResponse(stream_invoice_zip(orders), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
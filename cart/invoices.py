@@ -0,0 +1,116 @@
+# cart/invoices.py
+"""
+Invoice PDFs, rendered outside the checkout request.
+
+create_whatsapp_order() only calls enqueue_invoice(); the run_invoice_worker
+command claims InvoiceJob rows and fills in Order.pdf_invoice.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.pdf import render_pdf
+
+from .models import InvoiceJob
+
+
+def invoice_context(order):
+    items = []
+    for item in order.items or []:
+        price = Decimal(item['price'])
+        items.append({
+            'product_id': item.get('product_id'),
+            'name': item['name'],
+            'quantity': item['quantity'],
+            'price': price,
+            'total_price': Decimal(item.get('total') or price * item['quantity']),
+        })
+    return {
+        'order': order,
+        'items': items,
+        'subtotal': order.total_paid,
+        'shipping_zone': order.shipping_zone,
+        'shipping_cost': order.shipping_cost,
+        'total': order.get_total_with_shipping(),
+        'date': timezone.localtime(order.created).strftime('%d/%m/%Y'),
+    }
+
+
+def render_invoice_pdf(order):
+    return render_pdf('cart/invoice_pdf.html', invoice_context(order))
+
+
+def generate_invoice(order):
+    """Render the invoice and attach it to the order."""
+    order.pdf_invoice.save(f'invoice_{order.order_id}.pdf', ContentFile(render_invoice_pdf(order)))
+
+
+def enqueue_invoice(order):
+    job, _ = InvoiceJob.objects.get_or_create(order=order)
+    return job
+
+
+# ==================== WORKER ====================
+
+def _stale(now):
+    """Running jobs whose worker died mid-job."""
+    return Q(status=InvoiceJob.RUNNING, locked_at__lt=now - timedelta(seconds=settings.INVOICE_JOB_LOCK_TIMEOUT))
+
+
+def _claimable(now):
+    return (
+        Q(status=InvoiceJob.PENDING, run_after__lte=now) |
+        _stale(now) & Q(attempts__lt=settings.INVOICE_JOB_MAX_ATTEMPTS)
+    )
+
+
+def fail_abandoned_jobs(now):
+    """Mark stale running jobs that already used up their attempts as failed."""
+    return InvoiceJob.objects.filter(_stale(now), attempts__gte=settings.INVOICE_JOB_MAX_ATTEMPTS).update(
+        status=InvoiceJob.FAILED, last_error='Worker stopped during the last attempt', updated=now,
+    )
+
+
+def claim_next_job():
+    """
+    Atomically take the next runnable job, or return None.
+
+    Claiming is a conditional UPDATE, so several worker threads/processes can
+    poll the same table without a broker or row locks. A job whose worker died
+    is re-claimed until it runs out of INVOICE_JOB_MAX_ATTEMPTS.
+    """
+    now = timezone.now()
+    fail_abandoned_jobs(now)
+    candidates = InvoiceJob.objects.filter(_claimable(now)).values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = InvoiceJob.objects.filter(_claimable(now), pk=pk).update(
+            status=InvoiceJob.RUNNING, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return InvoiceJob.objects.select_related('order').get(pk=pk)
+    return None
+
+
+def run_job(job):
+    try:
+        generate_invoice(job.order)
+    except Exception as exc:  # any failure is retried until max attempts
+        job.last_error = f'{type(exc).__name__}: {exc}'
+        if job.attempts >= settings.INVOICE_JOB_MAX_ATTEMPTS:
+            job.status = InvoiceJob.FAILED
+        else:
+            job.status = InvoiceJob.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.INVOICE_JOB_RETRY_DELAY * job.attempts
+            )
+        job.save(update_fields=['status', 'last_error', 'run_after', 'updated'])
+        return False
+
+    job.status = InvoiceJob.DONE
+    job.last_error = ''
+    job.save(update_fields=['status', 'last_error', 'updated'])
+    return True
@@ -0,0 +1,56 @@
+# cart/management/commands/backfill_order_lines.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from cart.models import Order, OrderLine
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Create OrderLine rows from Order.items for orders that have none. "
+        "Safe to interrupt and re-run: finished orders are skipped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Orders read and written per batch.")
+        parser.add_argument('--start-after', type=int, default=0,
+                            help="Only orders with a higher order_id (resume point printed by a previous run).")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        product_ids = set(Product.objects.values_list('id', flat=True))
+        ids_by_name = dict(Product.objects.values_list('name', 'id'))
+
+        pending = (
+            Order.objects
+            .filter(order_id__gt=options['start_after'])
+            .filter(~Exists(OrderLine.objects.filter(order=OuterRef('pk'))))
+            .only('order_id', 'created', 'items')
+            .order_by('order_id')
+        )
+
+        orders = lines = 0
+        batch = []
+        for order in pending.iterator(chunk_size=chunk_size):
+            batch.append(order)
+            if len(batch) >= chunk_size:
+                lines += self.flush(batch, product_ids, ids_by_name)
+                orders += len(batch)
+                batch = []
+        if batch:
+            lines += self.flush(batch, product_ids, ids_by_name)
+            orders += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {lines} lines for {orders} orders."))
+
+    def flush(self, orders, product_ids, ids_by_name):
+        rows = []
+        for order in orders:
+            rows.extend(OrderLine.from_items(order, product_ids, ids_by_name))
+        with transaction.atomic():
+            OrderLine.objects.bulk_create(rows, batch_size=1000)
+        self.stdout.write(f"  … up to order #{orders[-1].order_id} (resume with --start-after {orders[-1].order_id})")
+        return len(rows)
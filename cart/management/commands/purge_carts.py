@@ -0,0 +1,26 @@
+# cart/management/commands/purge_carts.py
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from cart.models import CartLine
+
+
+class Command(BaseCommand):
+    help = "Delete database cart lines of carts that have not changed for --days days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        idle = (
+            CartLine.objects.values('cart_id')
+            .annotate(last_change=Max('updated'))
+            .filter(last_change__lt=cutoff)
+            .values('cart_id')
+        )
+        deleted, _ = CartLine.objects.filter(cart_id__in=idle).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} abandoned cart lines."))
@@ -0,0 +1,24 @@
+# cart/management/commands/rebuild_sales_rollups.py
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from cart.reports import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the DailySales rollups from OrderLine rows for a date range (default: everything)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="First day to rebuild (YYYY-MM-DD).")
+        parser.add_argument('--end', help="Last day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        bounds = {}
+        for name in ('start', 'end'):
+            if options[name]:
+                bounds[name] = parse_date(options[name])
+                if bounds[name] is None:
+                    raise CommandError(f"--{name} must be a date in YYYY-MM-DD format.")
+
+        rows = rebuild_rollups(**bounds)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} daily sales rows."))
@@ -0,0 +1,76 @@
+# cart/management/commands/run_invoice_worker.py
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from cart.invoices import claim_next_job, run_job
+from core.pdf import stats, warm_pool
+
+
+class Command(BaseCommand):
+    help = "Render queued invoice PDFs (InvoiceJob rows) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Drain the queue once and exit instead of polling forever.",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.INVOICE_WORKER_CONCURRENCY,
+            help="Number of render threads (default: INVOICE_WORKER_CONCURRENCY).",
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=settings.INVOICE_WORKER_POLL_INTERVAL,
+            help="Seconds to sleep when the queue is empty.",
+        )
+
+    def handle(self, *args, **options):
+        self.once = options['once']
+        self.poll_interval = options['poll_interval']
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.done = self.failed = 0
+        warm_pool()
+
+        threads = [
+            threading.Thread(target=self.work, name=f'invoice-worker-{i}', daemon=True)
+            for i in range(max(1, options['concurrency']))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self.stopping.set()
+            self.stdout.write("Stopping after the current jobs…")
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {self.done} invoices, {self.failed} failed attempts "
+            f"(avg {stats()['avg_render_seconds']:.2f}s per PDF)."
+        ))
+
+    def work(self):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                job = claim_next_job()
+                if job is None:
+                    if self.once:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                ok = run_job(job)
+                with self.lock:
+                    if ok:
+                        self.done += 1
+                    else:
+                        self.failed += 1
+                        self.stderr.write(f"Order #{job.order_id}: {job.last_error}")
+        finally:
+            connection.close()
@@ -0,0 +1,19 @@
+# cart/middleware.py
+from django.utils.functional import SimpleLazyObject
+
+from .cart import Cart
+
+
+class CartMiddleware:
+    """
+    Attach ``request.cart``. The Cart is built on first access, so requests
+    that never touch the cart pay nothing, and views, the context processor
+    and templates all share one instance (and its memoized product load).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: Cart(request))
+        return self.get_response(request)
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0006_orderline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('dimension', models.CharField(choices=[('total', 'All sales'), ('product', 'Product'), ('zone', 'Shipping zone'), ('category', 'Category')], max_length=10)),
+                ('key', models.CharField(blank=True, max_length=100)),
+                ('label', models.CharField(blank=True, max_length=200)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('shipping', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+                'ordering': ['-date', 'dimension', '-revenue'],
+                'indexes': [models.Index(fields=['dimension', 'date'], name='cart_dailys_dimensi_e7e8cf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key', 'date'), name='unique_daily_sales')],
+            },
+        ),
+    ]
@@ -1,6 +1,9 @@
 # orders/models.py
+from decimal import Decimal
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 from shop.models import Product
 
 class Order(models.Model):
@@ -20,4 +23,138 @@ class Order(models.Model):
         return f"Order #{self.order_id}"
 
     def get_total_with_shipping(self):
-        return self.total_paid + self.shipping_cost
\ No newline at end of file
+        return self.total_paid + self.shipping_cost
+
+
+class OrderLine(models.Model):
+    """
+    One row per product in an order, so reports can aggregate in SQL instead
+    of parsing Order.items. Written alongside the order at checkout; older
+    orders are filled in by `manage.py backfill_order_lines`.
+    """
+    order = models.ForeignKey(Order, related_name='lines', on_delete=models.CASCADE)
+    # Null when the product has since been deleted (or a legacy item could not be matched)
+    product = models.ForeignKey(Product, related_name='order_lines', null=True, blank=True, on_delete=models.SET_NULL)
+    name = models.CharField(max_length=200)
+    quantity = models.PositiveIntegerField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2)
+    created = models.DateTimeField(db_index=True)   # copy of Order.created for date-range reports
+
+    class Meta:
+        ordering = ['order', 'pk']
+        indexes = [models.Index(fields=['product', 'created'])]
+
+    def __str__(self):
+        return f"{self.quantity} × {self.name} (order #{self.order_id})"
+
+    @classmethod
+    def from_items(cls, order, product_ids=None, ids_by_name=None):
+        """
+        Unsaved lines for ``order.items``. ``product_ids`` (ids known to exist)
+        and ``ids_by_name`` (for legacy items that only stored a name) let
+        bulk callers resolve products without a query per order.
+        """
+        lines = []
+        for item in order.items or []:
+            product_id = item.get('product_id') or (ids_by_name or {}).get(item.get('name'))
+            if product_ids is not None and product_id not in product_ids:
+                product_id = None
+            unit_price = Decimal(str(item['price']))
+            quantity = int(item['quantity'])
+            lines.append(cls(
+                order=order,
+                product_id=product_id,
+                name=item.get('name', '')[:200],
+                quantity=quantity,
+                unit_price=unit_price,
+                line_total=Decimal(str(item.get('total') or unit_price * quantity)),
+                created=order.created,
+            ))
+        return lines
+
+
+class InvoiceJob(models.Model):
+    """Queued invoice PDF render for an order, processed by `manage.py run_invoice_worker`."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    order = models.OneToOneField(Order, related_name='invoice_job', on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['run_after']
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"Invoice job for order #{self.order_id} ({self.status})"
+
+
+class CartLine(models.Model):
+    """One product in a shopper's cart (DatabaseCartStore). The session only holds ``cart_id``."""
+    cart_id = models.CharField(max_length=32, db_index=True)
+    product = models.ForeignKey(Product, related_name='cart_lines', on_delete=models.CASCADE)
+    name = models.CharField(max_length=200)
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_id', 'product'], name='unique_cart_line'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} × {self.name} (cart {self.cart_id})"
+
+
+class DailySales(models.Model):
+    """
+    Pre-aggregated sales for one day, overall or broken down by product,
+    shipping zone or category. Kept current by cart.reports.record_order()
+    and rebuilt by `manage.py rebuild_sales_rollups`; reports read only this table.
+    """
+    TOTAL = 'total'
+    PRODUCT = 'product'
+    ZONE = 'zone'
+    CATEGORY = 'category'
+    DIMENSION_CHOICES = [
+        (TOTAL, 'All sales'),
+        (PRODUCT, 'Product'),
+        (ZONE, 'Shipping zone'),
+        (CATEGORY, 'Category'),
+    ]
+
+    date = models.DateField()
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=100, blank=True)     # product/category id or zone name; '' for totals
+    label = models.CharField(max_length=200, blank=True)   # display name at the time of the sale
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    shipping = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        ordering = ['-date', 'dimension', '-revenue']
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key', 'date'], name='unique_daily_sales'),
+        ]
+        indexes = [models.Index(fields=['dimension', 'date'])]
+
+    def __str__(self):
+        return f"{self.date} {self.get_dimension_display()} {self.label or self.key}".strip()
@@ -0,0 +1,153 @@
+# cart/reports.py
+"""
+Daily sales rollups (DailySales).
+
+record_order() adds a new order to its day's rows as part of checkout, so
+reports never touch Order/OrderLine. rebuild_rollups() recomputes a date
+range from OrderLine with SQL aggregation — after a backfill, a data fix or
+if the incremental rows are ever in doubt.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from shop.models import Product
+
+from .models import DailySales, Order, OrderLine
+
+NOT_SELECTED = 'Not selected'
+UNKNOWN_PRODUCT = 'Unknown product'
+UNCATEGORIZED = 'Uncategorized'
+CENT = Decimal('0.01')
+
+
+def _increment(date, dimension, key, label, orders=0, units=0, revenue=0, shipping=0):
+    changes = {
+        'orders': F('orders') + orders,
+        'units': F('units') + units,
+        'revenue': F('revenue') + revenue,
+        'shipping': F('shipping') + shipping,
+        'label': label,
+    }
+    row = DailySales.objects.filter(date=date, dimension=dimension, key=key)
+    if row.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            DailySales.objects.create(
+                date=date, dimension=dimension, key=key, label=label,
+                orders=orders, units=units, revenue=revenue, shipping=shipping,
+            )
+    except IntegrityError:
+        row.update(**changes)   # another checkout created the row first
+
+
+def record_order(order, lines):
+    """Add one new order (and its OrderLines) to the rollups. Call inside the checkout transaction."""
+    date = timezone.localdate(order.created)
+    zone = order.shipping_zone or NOT_SELECTED
+    units = sum(line.quantity for line in lines)
+
+    _increment(date, DailySales.TOTAL, '', '', 1, units, order.total_paid, order.shipping_cost)
+    _increment(date, DailySales.ZONE, order.shipping_zone, zone, 1, units, order.total_paid, order.shipping_cost)
+
+    categories = {
+        row['id']: row for row in Product.objects
+        .filter(id__in={line.product_id for line in lines if line.product_id})
+        .values('id', 'category_id', 'category__name')
+    }
+    by_product = defaultdict(lambda: [None, 0, Decimal(0)])
+    by_category = defaultdict(lambda: [None, 0, Decimal(0)])
+    for line in lines:
+        product_key = str(line.product_id or '')
+        by_product[product_key][0] = line.name if line.product_id else UNKNOWN_PRODUCT
+        by_product[product_key][1] += line.quantity
+        by_product[product_key][2] += line.line_total
+
+        category = categories.get(line.product_id) or {}
+        category_key = str(category.get('category_id') or '')
+        by_category[category_key][0] = category.get('category__name') or UNCATEGORIZED
+        by_category[category_key][1] += line.quantity
+        by_category[category_key][2] += line.line_total
+
+    for dimension, groups in ((DailySales.PRODUCT, by_product), (DailySales.CATEGORY, by_category)):
+        for key, (label, quantity, revenue) in groups.items():
+            _increment(date, dimension, key, label, 1, quantity, revenue)
+
+
+def rebuild_rollups(start=None, end=None, batch_size=1000):
+    """Recompute DailySales for the days in [start, end] (either bound optional). Returns rows written."""
+    orders, lines, stale = Order.objects.all(), OrderLine.objects.all(), DailySales.objects.all()
+    if start:
+        orders, lines = orders.filter(created__date__gte=start), lines.filter(created__date__gte=start)
+        stale = stale.filter(date__gte=start)
+    if end:
+        orders, lines = orders.filter(created__date__lte=end), lines.filter(created__date__lte=end)
+        stale = stale.filter(date__lte=end)
+    orders = orders.annotate(day=TruncDate('created')).order_by()
+    lines = lines.annotate(day=TruncDate('created')).order_by()
+
+    units_by_day = defaultdict(int)
+    units_by_zone = defaultdict(int)
+    for row in lines.values('day', 'order__shipping_zone').annotate(units=Sum('quantity')):
+        units_by_day[row['day']] += row['units']
+        units_by_zone[row['day'], row['order__shipping_zone']] += row['units']
+
+    rows = []
+    for row in orders.values('day').annotate(n=Count('pk'), revenue=Sum('total_paid'), shipping=Sum('shipping_cost')):
+        rows.append(DailySales(
+            date=row['day'], dimension=DailySales.TOTAL, key='', label='',
+            orders=row['n'], units=units_by_day[row['day']], revenue=row['revenue'], shipping=row['shipping'],
+        ))
+    for row in orders.values('day', 'shipping_zone').annotate(
+        n=Count('pk'), revenue=Sum('total_paid'), shipping=Sum('shipping_cost'),
+    ):
+        rows.append(DailySales(
+            date=row['day'], dimension=DailySales.ZONE,
+            key=row['shipping_zone'], label=row['shipping_zone'] or NOT_SELECTED,
+            orders=row['n'], units=units_by_zone[row['day'], row['shipping_zone']],
+            revenue=row['revenue'], shipping=row['shipping'],
+        ))
+    for row in lines.values('day', 'product_id').annotate(
+        label=Max('name'), n=Count('order', distinct=True), units=Sum('quantity'), revenue=Sum('line_total'),
+    ):
+        rows.append(DailySales(
+            date=row['day'], dimension=DailySales.PRODUCT,
+            key=str(row['product_id'] or ''), label=row['label'] if row['product_id'] else UNKNOWN_PRODUCT,
+            orders=row['n'], units=row['units'], revenue=row['revenue'],
+        ))
+    for row in lines.values('day', 'product__category_id').annotate(
+        label=Max('product__category__name'), n=Count('order', distinct=True),
+        units=Sum('quantity'), revenue=Sum('line_total'),
+    ):
+        rows.append(DailySales(
+            date=row['day'], dimension=DailySales.CATEGORY,
+            key=str(row['product__category_id'] or ''), label=row['label'] or UNCATEGORIZED,
+            orders=row['n'], units=row['units'], revenue=row['revenue'],
+        ))
+
+    with transaction.atomic():
+        stale.delete()
+        DailySales.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def sales_report(dimension, start, end):
+    """Report rows from the rollups only: per day for totals, per key (best sellers first) otherwise."""
+    rollups = DailySales.objects.filter(dimension=dimension, date__range=(start, end))
+    if dimension == DailySales.TOTAL:
+        return list(rollups.order_by('date').values('date', 'orders', 'units', 'revenue', 'shipping'))
+    rows = list(
+        rollups.values('key')
+        .annotate(label=Max('label'), orders=Sum('orders'), units=Sum('units'),
+                  revenue=Sum('revenue'), shipping=Sum('shipping'))
+        .order_by('-revenue', 'label')
+    )
+    for row in rows:   # SQLite sums decimals as numbers; keep money at 2 places
+        row['revenue'] = Decimal(row['revenue']).quantize(CENT)
+        row['shipping'] = Decimal(row['shipping']).quantize(CENT)
+    return rows
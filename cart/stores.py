@@ -0,0 +1,227 @@
+# cart/stores.py
+"""
+Where cart lines live.
+
+The session only remembers a cart id; the lines themselves go to the store
+picked by settings.CART_STORE, so changing one quantity is one small write
+instead of re-serializing the whole session row.
+
+A store maps product ids (as strings) to ``{'id', 'name', 'price', 'quantity'}``
+dicts, the same shape the session cart always used.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from shop.models import Product
+from .models import CartLine
+
+
+class BaseCartStore:
+    def __init__(self, request):
+        self.session = request.session
+
+    def load(self):
+        """All lines, ``{product_id: line}``."""
+        raise NotImplementedError
+
+    def set_line(self, product_id, line, created):
+        """Store one line. ``created`` is True when the product was not in the cart yet."""
+        raise NotImplementedError
+
+    def delete_lines(self, product_ids):
+        raise NotImplementedError
+
+    def write_lines(self, changed, removed):
+        """Upsert ``changed`` lines and drop ``removed`` product ids in one write (Cart.apply)."""
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    # ----- cart id kept in the session -----
+
+    @property
+    def cart_id(self):
+        value = self.session.get(settings.CART_SESSION_ID)
+        return value if isinstance(value, str) else None
+
+    def get_or_create_cart_id(self):
+        cart_id = self.cart_id
+        if cart_id is None:
+            cart_id = self.session[settings.CART_SESSION_ID] = uuid.uuid4().hex
+        return cart_id
+
+    def legacy_lines(self):
+        """Lines of a cart saved in the session before carts had their own store."""
+        value = self.session.get(settings.CART_SESSION_ID)
+        return value if isinstance(value, dict) and value else None
+
+
+class SessionCartStore(BaseCartStore):
+    """The original behaviour: the whole cart is JSON inside the session."""
+
+    def load(self):
+        return self.legacy_lines() or {}
+
+    def _write(self, lines):
+        self.session[settings.CART_SESSION_ID] = lines
+        self.session.modified = True
+
+    def set_line(self, product_id, line, created):
+        lines = self.load()
+        lines[product_id] = line
+        self._write(lines)
+
+    def delete_lines(self, product_ids):
+        lines = self.load()
+        for product_id in product_ids:
+            lines.pop(product_id, None)
+        self._write(lines)
+
+    def write_lines(self, changed, removed):
+        lines = self.load()
+        lines.update(changed)
+        for product_id in removed:
+            lines.pop(product_id, None)
+        self._write(lines)
+
+    def clear(self):
+        self.session.pop(settings.CART_SESSION_ID, None)
+
+
+class DatabaseCartStore(BaseCartStore):
+    """One CartLine row per product; a quantity change is a single-row UPDATE."""
+
+    def load(self):
+        legacy = self.legacy_lines()
+        if legacy is not None:
+            return self._import(legacy)
+        if self.cart_id is None:
+            return {}
+        return {
+            str(row['product_id']): {
+                'id': row['product_id'],
+                'name': row['name'],
+                'price': str(row['price']),
+                'quantity': row['quantity'],
+            }
+            for row in CartLine.objects.filter(cart_id=self.cart_id)
+            .order_by('pk').values('product_id', 'name', 'price', 'quantity')
+        }
+
+    def _import(self, lines):
+        self.session.pop(settings.CART_SESSION_ID)
+        cart_id = self.get_or_create_cart_id()
+        # Products deleted since the cart was saved would break the foreign key.
+        existing = set(Product.objects.filter(pk__in=[line['id'] for line in lines.values()])
+                       .values_list('pk', flat=True))
+        lines = {product_id: line for product_id, line in lines.items() if line['id'] in existing}
+        CartLine.objects.bulk_create([
+            CartLine(cart_id=cart_id, product_id=line['id'], name=line['name'],
+                     price=line['price'], quantity=line['quantity'])
+            for line in lines.values()
+        ], ignore_conflicts=True)
+        return lines
+
+    def set_line(self, product_id, line, created):
+        cart_id = self.get_or_create_cart_id()
+        if created:
+            try:
+                with transaction.atomic():
+                    CartLine.objects.create(
+                        cart_id=cart_id, product_id=line['id'], name=line['name'],
+                        price=line['price'], quantity=line['quantity'],
+                    )
+                return
+            except IntegrityError:
+                pass  # added concurrently from another tab: fall through to the update
+        CartLine.objects.filter(cart_id=cart_id, product_id=product_id).update(quantity=line['quantity'])
+
+    def delete_lines(self, product_ids):
+        if self.cart_id is not None:
+            CartLine.objects.filter(cart_id=self.cart_id, product_id__in=product_ids).delete()
+
+    def write_lines(self, changed, removed):
+        cart_id = self.get_or_create_cart_id()
+        with transaction.atomic():
+            if removed:
+                CartLine.objects.filter(cart_id=cart_id, product_id__in=removed).delete()
+            if changed:
+                CartLine.objects.bulk_create(
+                    [
+                        CartLine(cart_id=cart_id, product_id=line['id'], name=line['name'],
+                                 price=line['price'], quantity=line['quantity'])
+                        for line in changed.values()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['cart_id', 'product'],
+                    update_fields=['quantity', 'updated'],
+                )
+
+    def clear(self):
+        if self.cart_id is not None:
+            CartLine.objects.filter(cart_id=self.cart_id).delete()
+
+
+class CacheCartStore(BaseCartStore):
+    """Lines in the cache under ``cart:<id>``; nothing touches the database."""
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._lines = None
+
+    def _key(self, cart_id):
+        return f'cart:{cart_id}'
+
+    def load(self):
+        if self._lines is None:
+            legacy = self.legacy_lines()
+            if legacy is not None:
+                self.session.pop(settings.CART_SESSION_ID)
+                self._lines = dict(legacy)
+                self._write()
+            elif self.cart_id is None:
+                self._lines = {}
+            else:
+                self._lines = cache.get(self._key(self.cart_id)) or {}
+        return dict(self._lines)
+
+    def _write(self):
+        cache.set(self._key(self.get_or_create_cart_id()), self._lines, settings.CART_CACHE_TIMEOUT)
+
+    def set_line(self, product_id, line, created):
+        self.load()
+        self._lines[product_id] = dict(line)
+        self._write()
+
+    def delete_lines(self, product_ids):
+        self.load()
+        for product_id in product_ids:
+            self._lines.pop(product_id, None)
+        self._write()
+
+    def write_lines(self, changed, removed):
+        self.load()
+        self._lines.update({product_id: dict(line) for product_id, line in changed.items()})
+        for product_id in removed:
+            self._lines.pop(product_id, None)
+        self._write()
+
+    def clear(self):
+        self._lines = {}
+        if self.cart_id is not None:
+            cache.delete(self._key(self.cart_id))
+
+
+CART_STORES = {
+    'session': SessionCartStore,
+    'db': DatabaseCartStore,
+    'cache': CacheCartStore,
+}
+
+
+def get_cart_store(request):
+    return CART_STORES[settings.CART_STORE](request)
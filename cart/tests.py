@@ -1,3 +1,548 @@
-from django.test import TestCase
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
 
-# Create your tests here.
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from shop.models import Category, Product
+from .invoices import claim_next_job, enqueue_invoice, run_job
+from .models import CartLine, DailySales, InvoiceJob, Order, OrderLine
+
+
+def make_product(name='Tomatoes', stock=None, price='100.00'):
+    category, _ = Category.objects.get_or_create(name='Vegetables', slug='vegetables')
+    return Product.objects.create(
+        category=category, name=name, slug=name.lower().replace(' ', '-'),
+        description=name, price=price, stock=stock,
+    )
+
+
+def add_to_cart(client, product, quantity=1):
+    client.post(reverse('cart:cart_add', args=[product.id]), {'quantity': quantity})
+
+
+class StockReservationTests(TestCase):
+    checkout_url = reverse('cart:create_whatsapp_order')
+
+    def test_checkout_takes_stock(self):
+        product = make_product(stock=5)
+        add_to_cart(self.client, product, 3)
+        self.assertEqual(self.client.post(self.checkout_url).status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 2)
+        self.assertTrue(product.in_stock)
+
+    def test_last_units_mark_product_sold_out(self):
+        product = make_product(stock=2)
+        add_to_cart(self.client, product, 2)
+        self.client.post(self.checkout_url)
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 0)
+        self.assertFalse(product.in_stock)
+
+    def test_short_line_rolls_back_whole_order(self):
+        plenty = make_product('Kale', stock=10)
+        scarce = make_product('Spinach', stock=1)
+        add_to_cart(self.client, plenty, 4)
+        add_to_cart(self.client, scarce, 2)
+
+        response = self.client.post(self.checkout_url)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Spinach', response.json()['error'])
+        plenty.refresh_from_db()
+        self.assertEqual(plenty.stock, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_untracked_stock_is_unlimited(self):
+        product = make_product(stock=None)
+        add_to_cart(self.client, product, 50)
+        self.assertEqual(self.client.post(self.checkout_url).status_code, 200)
+        product.refresh_from_db()
+        self.assertIsNone(product.stock)
+        self.assertTrue(product.in_stock)
+
+    def test_in_stock_follows_stock_on_save(self):
+        product = make_product(stock=0)
+        self.assertFalse(product.in_stock)
+        product.stock = 3
+        product.save(update_fields=['stock'])
+        product.refresh_from_db()
+        self.assertTrue(product.in_stock)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """
+    Many shoppers race for a few units: nobody may be sold stock that isn't there.
+
+    Busy responses are retried like a shopper would. Under SQLite a lock error
+    can also surface after the order committed (e.g. saving the session), so
+    the checks are on stock and orders rather than on exact response codes.
+    """
+    SHOPPERS = 20
+    STOCK = 5
+    ATTEMPTS = 20
+
+    def test_concurrent_checkouts_never_oversell(self):
+        product = make_product(stock=self.STOCK)
+        clients = []
+        for _ in range(self.SHOPPERS):
+            client = Client()
+            add_to_cart(client, product)
+            clients.append(client)
+
+        barrier = threading.Barrier(self.SHOPPERS)
+        statuses = []
+
+        def checkout(client):
+            try:
+                barrier.wait()
+                for _ in range(self.ATTEMPTS):
+                    try:
+                        status = client.post(reverse('cart:create_whatsapp_order')).status_code
+                    except OperationalError:   # lock error outside the view
+                        status = 'locked'
+                    if status not in (503, 'locked'):
+                        break
+                    time.sleep(random.uniform(0.001, 0.01))
+                statuses.append(status)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=checkout, args=(client,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        product.refresh_from_db()
+        sold = OrderLine.objects.filter(product=product).aggregate(units=Sum('quantity'))['units'] or 0
+        self.assertEqual(len(statuses), self.SHOPPERS)
+        self.assertTrue(set(statuses) <= {200, 400, 409, 503, 'locked'}, statuses)
+        self.assertLessEqual(statuses.count(200), sold)
+        self.assertGreater(sold, 0)
+        self.assertLessEqual(sold, self.STOCK)
+        self.assertEqual(Order.objects.count(), sold)
+        self.assertEqual(product.stock, self.STOCK - sold)
+        self.assertEqual(product.in_stock, product.stock > 0)
+
+
+class AdminQueryBudgetTests(TestCase):
+    """The admin pages run a fixed number of queries, however many rows there are."""
+    rows = 1200
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        products = [make_product(f'Product {i}') for i in range(5)]
+        orders = Order.objects.bulk_create(
+            Order(total_paid='100.00', shipping_zone='Nairobi', items=[]) for _ in range(cls.rows)
+        )
+        cls.order = orders[0]
+        OrderLine.objects.bulk_create(
+            OrderLine(order=cls.order, created=cls.order.created, product=products[i % 5], name=f'Product {i % 5}',
+                      quantity=1, unit_price='20.00', line_total='20.00')
+            for i in range(50)
+        )
+        InvoiceJob.objects.bulk_create(InvoiceJob(order=order) for order in orders)
+        CartLine.objects.bulk_create(
+            CartLine(cart_id=f'cart{i}', product=products[i % 5], name='Product', price='20.00', quantity=1)
+            for i in range(cls.rows)
+        )
+        today = date.today()
+        DailySales.objects.bulk_create(
+            DailySales(date=today - timedelta(days=i), dimension=DailySales.TOTAL, key='', orders=1, units=1,
+                       revenue='100.00', shipping='0.00')
+            for i in range(cls.rows)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertQueryBudget(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_order_changelist(self):
+        self.assertQueryBudget(reverse('admin:cart_order_changelist'), 6)
+
+    def test_order_change_form(self):
+        self.assertQueryBudget(reverse('admin:cart_order_change', args=[self.order.pk]), 5)
+
+    def test_invoice_job_changelist(self):
+        self.assertQueryBudget(reverse('admin:cart_invoicejob_changelist'), 5)
+
+    def test_cart_line_changelist(self):
+        self.assertQueryBudget(reverse('admin:cart_cartline_changelist'), 5)
+
+    def test_daily_sales_changelist(self):
+        self.assertQueryBudget(reverse('admin:cart_dailysales_changelist'), 8)
+
+
+@override_settings(INVOICE_JOB_MAX_ATTEMPTS=2, INVOICE_JOB_LOCK_TIMEOUT=60)
+class InvoiceJobClaimTests(TestCase):
+    def setUp(self):
+        self.job = enqueue_invoice(Order.objects.create(total_paid='100.00', items=[]))
+
+    def die_while_running(self, attempts):
+        # The worker claimed the job and never came back
+        InvoiceJob.objects.filter(pk=self.job.pk).update(
+            status=InvoiceJob.RUNNING, attempts=attempts, locked_at=timezone.now() - timedelta(minutes=5),
+        )
+
+    def test_pending_job_is_claimed_once(self):
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.status, job.attempts), (self.job.pk, InvoiceJob.RUNNING, 1))
+        self.assertIsNone(claim_next_job())
+
+    def test_stale_running_job_is_reclaimed(self):
+        self.die_while_running(attempts=1)
+        job = claim_next_job()
+        self.assertEqual((job.pk, job.attempts), (self.job.pk, 2))
+
+    def test_stale_job_out_of_attempts_fails(self):
+        self.die_while_running(attempts=2)
+        self.assertIsNone(claim_next_job())
+        self.job.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), (InvoiceJob.FAILED, 2))
+        self.assertTrue(self.job.last_error)
+
+    def test_render_error_is_retried_then_failed(self):
+        # An item without a price can't be put on an invoice
+        Order.objects.filter(pk=self.job.order_id).update(items=[{'name': 'Kale'}])
+        self.assertFalse(run_job(claim_next_job()))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, InvoiceJob.PENDING)
+        self.assertGreater(self.job.run_after, timezone.now())
+
+        InvoiceJob.objects.filter(pk=self.job.pk).update(run_after=timezone.now())
+        self.assertFalse(run_job(claim_next_job()))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, InvoiceJob.FAILED)
+        self.assertIn('KeyError', self.job.last_error)
+
+
+class RequestCartTests(TestCase):
+    def product_queries(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "shop_product"' in q['sql']]
+
+    def test_cart_page_loads_products_once(self):
+        for name in ('Kale', 'Mango', 'Lemon'):
+            add_to_cart(self.client, make_product(name), 2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual(len(self.product_queries(queries)), 1)
+        self.assertEqual(response.context['total_with_shipping'], Decimal('600.00'))
+        self.assertEqual(len(list(response.context['cart'])), 3)
+
+    def test_deleted_product_drops_out_of_the_cart(self):
+        kale, mango = make_product('Kale'), make_product('Mango')
+        add_to_cart(self.client, kale)
+        add_to_cart(self.client, mango)
+        kale.delete()
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual([item['name'] for item in response.context['cart']], ['Mango'])
+        self.assertEqual(response.context['total_with_shipping'], Decimal('100.00'))
+
+    def test_browsing_without_a_cart_writes_no_session(self):
+        response = self.client.get(reverse('cart:cart_detail'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+
+class CartStoreTests(TestCase):
+    def setUp(self):
+        self.kale, self.mango = make_product('Kale'), make_product('Mango', price='50.00')
+        cache.clear()
+
+    def cart_lines(self):
+        return {item['name']: item['quantity'] for item in self.client.get(reverse('cart:cart_detail')).context['cart']}
+
+    def test_every_store_keeps_the_same_cart(self):
+        for store in ('db', 'cache', 'session'):
+            with self.subTest(store=store), self.settings(CART_STORE=store):
+                self.client = Client()
+                add_to_cart(self.client, self.kale, 2)
+                add_to_cart(self.client, self.mango)
+                add_to_cart(self.client, self.kale)
+                self.client.post(reverse('cart:cart_remove', args=[self.mango.id]))
+                self.assertEqual(self.cart_lines(), {'Kale': 3})
+
+    def test_db_store_keeps_only_the_cart_id_in_the_session(self):
+        add_to_cart(self.client, self.kale, 2)
+        cart_id = self.client.session[settings.CART_SESSION_ID]
+        self.assertIsInstance(cart_id, str)
+        self.assertEqual(CartLine.objects.get(cart_id=cart_id, product=self.kale).quantity, 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            add_to_cart(self.client, self.kale)
+        writes = [q['sql'] for q in queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 1)   # one UPDATE of the line, no session rewrite
+        self.assertIn('"cart_cartline"', writes[0])
+
+    def test_legacy_session_cart_is_imported(self):
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = {
+            str(self.kale.id): {'id': self.kale.id, 'name': 'Kale', 'price': '100.00', 'quantity': 4},
+        }
+        session.save()
+        self.assertEqual(self.cart_lines(), {'Kale': 4})
+        self.assertIsInstance(self.client.session[settings.CART_SESSION_ID], str)
+        self.assertEqual(CartLine.objects.get().quantity, 4)
+
+    def test_legacy_cart_with_a_deleted_product_is_imported(self):
+        gone = make_product('Lemon')
+        session = self.client.session
+        session[settings.CART_SESSION_ID] = {
+            str(self.kale.id): {'id': self.kale.id, 'name': 'Kale', 'price': '100.00', 'quantity': 4},
+            str(gone.id): {'id': gone.id, 'name': 'Lemon', 'price': '100.00', 'quantity': 1},
+        }
+        session.save()
+        gone.delete()
+        self.assertEqual(self.cart_lines(), {'Kale': 4})
+        self.assertEqual(list(CartLine.objects.values_list('product_id', flat=True)), [self.kale.id])
+
+    def test_invalid_quantity_is_rejected(self):
+        url = reverse('cart:cart_add', args=[self.kale.id])
+        for quantity in ('0', '-2', 'two', ''):
+            with self.subTest(quantity=quantity):
+                response = self.client.post(url, {'quantity': quantity}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                self.assertEqual(response.status_code, 400)
+                self.assertRedirects(self.client.post(url, {'quantity': quantity}), self.kale.get_absolute_url(),
+                                     fetch_redirect_response=False)
+        self.assertFalse(CartLine.objects.exists())
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        self.kale, self.mango = make_product('Kale'), make_product('Mango', price='50.00')
+
+    def batch(self, *operations):
+        return self.client.post(
+            reverse('cart:cart_batch'), json.dumps({'operations': list(operations)}), content_type='application/json',
+        )
+
+    def test_operations_apply_in_one_write(self):
+        add_to_cart(self.client, self.kale)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.batch(
+                {'op': 'add', 'product_id': self.mango.id, 'quantity': 2},
+                {'op': 'set', 'product_id': self.kale.id, 'quantity': 5},
+                {'op': 'add', 'product_id': self.mango.id},
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_total'], 8)
+        self.assertEqual(response.json()['cart_price'], 650.0)
+        self.assertEqual(len([q for q in queries if 'FROM "shop_product"' in q['sql']]), 1)
+        self.assertEqual(dict(CartLine.objects.values_list('name', 'quantity')), {'Kale': 5, 'Mango': 3})
+
+    def test_one_bad_operation_changes_nothing(self):
+        add_to_cart(self.client, self.kale)
+        for operations in (
+            [{'op': 'add', 'product_id': self.mango.id}, {'op': 'add', 'product_id': 999999}],
+            [{'op': 'set', 'product_id': self.kale.id, 'quantity': -1}],
+            [{'op': 'add', 'product_id': self.mango.id, 'quantity': 0}],
+            [{'op': 'buy', 'product_id': self.mango.id}],
+            [{'op': 'add', 'product_id': 'kale'}],
+        ):
+            with self.subTest(operations=operations):
+                response = self.batch(*operations)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
+        self.assertEqual(dict(CartLine.objects.values_list('name', 'quantity')), {'Kale': 1})
+
+    def test_remove_ignores_its_quantity(self):
+        add_to_cart(self.client, self.kale)
+        response = self.batch({'op': 'remove', 'product_id': self.kale.id, 'quantity': -1})
+        self.assertEqual(response.json()['cart_total'], 0)
+
+    def test_sold_out_product_cannot_be_added(self):
+        Product.objects.filter(pk=self.mango.pk).update(in_stock=False)
+        self.assertEqual(self.batch({'op': 'add', 'product_id': self.mango.id}).status_code, 400)
+
+    def test_malformed_body(self):
+        response = self.client.post(reverse('cart:cart_batch'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cart_update_form(self):
+        add_to_cart(self.client, self.kale)
+        add_to_cart(self.client, self.mango)
+        self.client.post(reverse('cart:cart_update'), {
+            f'quantity_{self.kale.id}': '3', f'quantity_{self.mango.id}': '-1',
+        })
+        self.assertEqual(dict(CartLine.objects.values_list('name', 'quantity')), {'Kale': 3})
+
+
+class OrderLineTests(TestCase):
+    def setUp(self):
+        self.kale, self.mango = make_product('Kale'), make_product('Mango', price='50.00')
+
+    def legacy_order(self, items):
+        return Order.objects.create(total_paid='0.00', items=items)
+
+    def backfill(self, *args):
+        out = StringIO()
+        call_command('backfill_order_lines', *args, stdout=out)
+        return out.getvalue()
+
+    def test_checkout_writes_lines(self):
+        add_to_cart(self.client, self.kale, 2)
+        add_to_cart(self.client, self.mango)
+        self.client.post(reverse('cart:create_whatsapp_order'))
+        order = Order.objects.get()
+        self.assertEqual(
+            list(order.lines.values_list('product', 'quantity', 'unit_price', 'line_total')),
+            [(self.kale.id, 2, Decimal('100.00'), Decimal('200.00')), (self.mango.id, 1, Decimal('50.00'), Decimal('50.00'))],
+        )
+        self.assertEqual(order.lines.first().created, order.created)
+
+    def test_backfill_resolves_products(self):
+        order = self.legacy_order([
+            {'product_id': self.kale.id, 'name': 'Kale', 'quantity': 2, 'price': '100.00', 'total': '200.00'},
+            {'name': 'Mango', 'quantity': 3, 'price': '50.00'},                      # legacy: name only
+            {'product_id': 999999, 'name': 'Gone', 'quantity': 1, 'price': '10.00'},  # deleted since
+        ])
+        self.assertIn('Backfilled 3 lines for 1 orders', self.backfill())
+        self.assertEqual(
+            list(order.lines.values_list('product', 'line_total')),
+            [(self.kale.id, Decimal('200.00')), (self.mango.id, Decimal('150.00')), (None, Decimal('10.00'))],
+        )
+
+    def test_backfill_is_resumable(self):
+        item = {'product_id': self.kale.id, 'name': 'Kale', 'quantity': 1, 'price': '100.00'}
+        first, second, third = (self.legacy_order([item]) for _ in range(3))
+        self.assertIn('for 1 orders', self.backfill('--start-after', str(second.order_id)))
+        self.assertIn('for 2 orders', self.backfill('--chunk-size', '1'))
+        self.assertIn('Backfilled 0 lines for 0 orders', self.backfill())
+        self.assertEqual(OrderLine.objects.filter(order__in=[first, second, third]).count(), 3)
+
+
+class SalesRollupTests(TestCase):
+    checkout_url = reverse('cart:create_whatsapp_order')
+    report_url = reverse('cart:sales_report')
+
+    def setUp(self):
+        self.kale, self.mango = make_product('Kale'), make_product('Mango', price='50.00')
+        for zone, products in (('Runda', [self.kale, self.mango]), ('Runda', [self.kale]), (None, [self.mango])):
+            client = Client()
+            for product in products:
+                add_to_cart(client, product, 2)
+            if zone:
+                client.post(reverse('cart:set_shipping_zone'), {'shipping_zone': zone})
+            self.assertEqual(client.post(self.checkout_url).status_code, 200)
+        self.staff = get_user_model().objects.create_user('staff', password='password', is_staff=True)
+
+    def rollups(self):
+        return sorted(DailySales.objects.values_list(
+            'date', 'dimension', 'key', 'label', 'orders', 'units', 'revenue', 'shipping',
+        ))
+
+    def test_checkout_updates_rollups(self):
+        total = DailySales.objects.get(dimension=DailySales.TOTAL)
+        self.assertEqual((total.orders, total.units, total.revenue, total.shipping), (3, 8, Decimal('600.00'), Decimal('600.00')))
+        zones = dict(DailySales.objects.filter(dimension=DailySales.ZONE).values_list('label', 'orders'))
+        self.assertEqual(zones, {'Runda': 2, 'Not selected': 1})
+
+    def test_rebuild_matches_incremental_rows(self):
+        incremental = self.rollups()
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_rebuild_rejects_bad_dates(self):
+        with self.assertRaises(CommandError):
+            call_command('rebuild_sales_rollups', '--start', 'yesterday')
+
+    def test_report_is_staff_only(self):
+        self.assertEqual(self.client.get(self.report_url).status_code, 302)
+
+    def test_report_json_and_csv(self):
+        self.client.force_login(self.staff)
+        rows = self.client.get(self.report_url, {'dimension': 'product'}).json()['rows']
+        self.assertEqual([(row['label'], row['units']) for row in rows], [('Kale', 4), ('Mango', 4)])
+
+        response = self.client.get(self.report_url, {'dimension': 'zone', 'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(response.content.decode().splitlines()[0], 'key,label,orders,units,revenue,shipping')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.report_url, {'dimension': 'category'})
+        self.assertFalse([q for q in queries if 'cart_order' in q['sql']])
+
+    def test_report_rejects_unknown_dimension(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.report_url, {'dimension': 'weather'}).status_code, 400)
+
+    def test_report_rejects_impossible_dates(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.report_url, {'start': '2024-02-30'}).status_code, 400)
+
+
+@override_settings(PDF_RENDER_POOL=False)
+class InvoiceZipTests(TestCase):
+    url = reverse('cart:invoices_zip')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        items = [{'product_id': None, 'name': 'Kale', 'quantity': 2, 'price': '100.00', 'total': '200.00'}]
+        self.stored, self.unrendered, self.lost = (
+            Order.objects.create(total_paid='200.00', items=items) for _ in range(3)
+        )
+        self.stored.pdf_invoice.save('stored.pdf', ContentFile(b'%PDF-stored'))
+        self.lost.pdf_invoice.name = 'invoices/lost.pdf'
+        self.lost.save(update_fields=['pdf_invoice'])
+        self.staff = get_user_model().objects.create_user('staff', password='password', is_staff=True)
+
+    def download(self, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_zip_has_every_invoice(self):
+        archive = self.download()
+        pdfs = {name.rsplit('_', 1)[1]: archive.read(name) for name in archive.namelist() if name.endswith('.pdf')}
+        self.assertEqual(len(pdfs), 2)
+        self.assertEqual(pdfs[f'{self.stored.order_id}.pdf'], b'%PDF-stored')
+        self.assertTrue(pdfs[f'{self.unrendered.order_id}.pdf'].startswith(b'%PDF'))
+        self.assertIn(f'Order #{self.lost.order_id}', archive.read('MISSING.txt').decode())
+
+        self.unrendered.refresh_from_db()
+        self.assertTrue(self.unrendered.pdf_invoice)   # kept for the next export
+
+    def test_date_range(self):
+        Order.objects.filter(pk=self.stored.pk).update(created=timezone.now() - timedelta(days=90))
+        self.assertEqual(len(self.download().namelist()), 2)
+        old = (timezone.localdate() - timedelta(days=90)).isoformat()
+        self.assertEqual(len(self.download(start=old, end=old).namelist()), 1)
+
+    def test_impossible_date_is_rejected(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(self.url, {'end': '2024-02-30'}).status_code, 400)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
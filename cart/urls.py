@@ -9,8 +9,12 @@ urlpatterns = [
     path('add/<int:product_id>/', views.cart_add, name='cart_add'),
     path('remove/<int:product_id>/', views.cart_remove, name='cart_remove'),
     path('update/', views.cart_update, name='cart_update'),
+    path('batch/', views.cart_batch, name='cart_batch'),
     path('set-shipping/', views.set_shipping_zone, name='set_shipping_zone'),
     
     # THIS LINE WAS MISSING — ADD IT NOW!!!
     path('create-whatsapp-order/', views.create_whatsapp_order, name='create_whatsapp_order'),
+    path('order/<int:order_id>/invoice/', views.invoice_status, name='invoice_status'),
+    path('reports/sales/', views.sales_report_view, name='sales_report'),
+    path('reports/invoices.zip', views.invoices_zip, name='invoices_zip'),
 ]
\ No newline at end of file
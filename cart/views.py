@@ -2,17 +2,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_POST
 from django.contrib import messages
-from django.http import JsonResponse
-from django.template.loader import render_to_string
-from django.core.files import File
+from django.http import JsonResponse, Http404, HttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.urls import reverse
+from django.db import OperationalError, transaction
 from django.conf import settings
-from xhtml2pdf import pisa
-from io import BytesIO
 from datetime import datetime
 from shop.models import Product
-from .cart import Cart
-from cart.models import Order  # Your Order model
+from shop.stock import OutOfStock, reserve_stock
+from .cart import CartOperationError
+from .exports import invoice_zip_response
+from .invoices import enqueue_invoice
+from .reports import record_order, sales_report
+from cart.models import Order, OrderLine, InvoiceJob, DailySales  # Your Order model
 from urllib.parse import quote
+import csv
+import json
+from datetime import timedelta
 
 
 SHIPPING_ZONES = {
@@ -24,11 +32,25 @@ SHIPPING_ZONES = {
 # AJAX ADD TO CART — MAIN FIX (NO PAGE RELOAD!)
 @require_POST
 def cart_add(request, product_id):
-    cart = Cart(request)
+    cart = request.cart
     product = get_object_or_404(Product, id=product_id)
     
     # Get quantity (default 1)
-    quantity = int(request.POST.get('quantity', 1))
+    try:
+        quantity = int(request.POST.get('quantity', 1))
+    except (TypeError, ValueError):
+        quantity = 0
+    if quantity < 1:
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': False, 'message': 'Quantity must be a whole number of at least 1.'}, status=400)
+        messages.error(request, 'Quantity must be a whole number of at least 1.')
+        return redirect(product.get_absolute_url())
+
+    if not product.in_stock:
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'success': False, 'message': f'"{product.name}" is sold out.'}, status=409)
+        messages.error(request, f'"{product.name}" is sold out.')
+        return redirect(product.get_absolute_url())
     
     # Add to cart
     cart.add(product=product, quantity=quantity)
@@ -48,7 +70,7 @@ def cart_add(request, product_id):
 
 
 def cart_remove(request, product_id):
-    cart = Cart(request)
+    cart = request.cart
     cart.remove(str(product_id))
     messages.success(request, 'Item removed.')
     return redirect('cart:cart_detail')
@@ -56,25 +78,51 @@ def cart_remove(request, product_id):
 
 @require_POST
 def cart_update(request):
-    cart = Cart(request)
-    updated = False
+    cart = request.cart
+    operations = []
     for key, value in request.POST.items():
         if key.startswith('quantity_'):
             product_id = key.split('_')[1]
             try:
                 qty = int(value)
-                if qty > 0:
-                    cart.update(product_id, qty)
-                else:
-                    cart.remove(product_id)
-                updated = True
             except ValueError:
-                pass
-    if updated:
-        messages.success(request, 'Cart updated!')
+                continue
+            if product_id in cart.cart:
+                operations.append(
+                    {'op': 'set', 'product_id': product_id, 'quantity': qty} if qty > 0
+                    else {'op': 'remove', 'product_id': product_id}
+                )
+    if operations:
+        try:
+            cart.apply(operations)
+        except CartOperationError as exc:
+            messages.error(request, str(exc))
+        else:
+            messages.success(request, 'Cart updated!')
     return redirect('cart:cart_detail')
 
 
+@require_POST
+def cart_batch(request):
+    """
+    Apply several cart changes in one request:
+    {"operations": [{"op": "add"|"set"|"remove", "product_id": 1, "quantity": 2}, ...]}
+    """
+    try:
+        operations = json.loads(request.body)['operations']
+    except (ValueError, KeyError, TypeError):
+        operations = None
+    if not isinstance(operations, list):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON body with an "operations" list.'}, status=400)
+
+    cart = request.cart
+    try:
+        cart.apply(operations)
+    except CartOperationError as exc:
+        return JsonResponse({'success': False, 'error': str(exc)}, status=400)
+    return JsonResponse({'success': True, **cart.summary()})
+
+
 @require_POST
 def set_shipping_zone(request):
     zone = request.POST.get('shipping_zone')
@@ -88,7 +136,7 @@ def set_shipping_zone(request):
 
 
 def cart_detail(request):
-    cart = Cart(request)
+    cart = request.cart
     selected_zone = request.session.get('shipping_zone')
     shipping_cost = SHIPPING_ZONES.get(selected_zone, 0)
     total = cart.get_total_price() + shipping_cost
@@ -104,44 +152,43 @@ def cart_detail(request):
 
 @require_POST
 def create_whatsapp_order(request):
-    cart = Cart(request)
+    cart = request.cart
     if len(cart) == 0:
         return JsonResponse({'error': 'Cart is empty'}, status=400)
 
     selected_zone = request.session.get('shipping_zone', 'Not selected')
     shipping_cost = SHIPPING_ZONES.get(selected_zone, 0)
-    total = cart.get_total_price() + shipping_cost
+    subtotal = cart.get_total_price()
+    total = subtotal + shipping_cost
 
-    # Save order to DB
-    order = Order.objects.create(
-        total_paid=cart.get_total_price(),
-        shipping_zone=selected_zone,
-        shipping_cost=shipping_cost,
-        items=[{
-            'name': item['product'].name,
-            'quantity': item['quantity'],
-            'price': str(item['price']),
-            'total': str(item['total_price'])
-        } for item in cart]
-    )
-
-    # Generate PDF Invoice
-    context = {
-        'order': order,
-        'cart': cart,
-        'shipping_zone': selected_zone,
-        'shipping_cost': shipping_cost,
-        'total': total,
-        'date': datetime.now().strftime('%d/%m/%Y'),
-    }
-    html = render_to_string('cart/invoice_pdf.html', context)
-    result = BytesIO()
-    pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result)
-    
-    if not pdf.err:
-        pdf_file = BytesIO(result.getvalue())
-        order.pdf_invoice.save(f'invoice_{order.order_id}.pdf', File(pdf_file))
-        order.save()
+    # Save order to DB (plus one OrderLine per item for reporting).
+    # Stock is taken first, in the same transaction: a sold-out line rolls everything back.
+    try:
+        with transaction.atomic():
+            reserve_stock({item['product'].id: item['quantity'] for item in cart})
+            order = Order.objects.create(
+                total_paid=subtotal,
+                shipping_zone=selected_zone,
+                shipping_cost=shipping_cost,
+                items=[{
+                    'product_id': item['product'].id,
+                    'name': item['product'].name,
+                    'quantity': item['quantity'],
+                    'price': str(item['price']),
+                    'total': str(item['total_price'])
+                } for item in cart]
+            )
+            lines = OrderLine.objects.bulk_create(OrderLine.from_items(order))
+            record_order(order, lines)
+
+            # Invoice PDF is rendered by `manage.py run_invoice_worker`; the browser polls status_url
+            enqueue_invoice(order)
+    except OutOfStock as exc:
+        return JsonResponse({'error': str(exc)}, status=409)
+    except OperationalError:
+        # Lock contention (e.g. a promo rush): fail fast and let the shopper retry
+        return JsonResponse({'error': 'We are busy processing other orders. Please try again.'}, status=503)
+    request.session['invoice_orders'] = request.session.get('invoice_orders', [])[-19:] + [order.order_id]
 
     # Build the plain text message first
     items_text = "\n".join([
@@ -173,5 +220,79 @@ Thank you for your order! 🌱"""
         'success': True,
         'order_id': order.order_id,
         'whatsapp_url': whatsapp_url,
-        'pdf_url': order.pdf_invoice.url if order.pdf_invoice else None
-    })
\ No newline at end of file
+        'status_url': reverse('cart:invoice_status', args=[order.order_id]),
+        'pdf_url': None,
+    })
+
+
+def invoice_status(request, order_id):
+    # Only the session that placed the order may see its invoice
+    if order_id not in request.session.get('invoice_orders', []):
+        raise Http404
+    order = get_object_or_404(Order.objects.select_related('invoice_job'), order_id=order_id)
+    try:
+        status = order.invoice_job.status
+    except InvoiceJob.DoesNotExist:
+        status = InvoiceJob.DONE if order.pdf_invoice else InvoiceJob.PENDING
+
+    return JsonResponse({
+        'order_id': order.order_id,
+        'status': status,
+        'pdf_url': order.pdf_invoice.url if order.pdf_invoice else None,
+    })
+
+
+def _date_range(request, days=30):
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD, defaulting to the last ``days`` days. ValueError on impossible dates."""
+    end = parse_date(request.GET.get('end') or '') or timezone.localdate()
+    start = parse_date(request.GET.get('start') or '') or end - timedelta(days=days - 1)
+    return start, end
+
+
+REPORT_COLUMNS = {
+    DailySales.TOTAL: ['date', 'orders', 'units', 'revenue', 'shipping'],
+    DailySales.PRODUCT: ['key', 'label', 'orders', 'units', 'revenue'],
+    DailySales.ZONE: ['key', 'label', 'orders', 'units', 'revenue', 'shipping'],
+    DailySales.CATEGORY: ['key', 'label', 'orders', 'units', 'revenue'],
+}
+
+
+@staff_member_required
+def sales_report_view(request):
+    """Sales from the DailySales rollups: ?dimension=total|product|zone|category&start=&end=&format=json|csv"""
+    dimension = request.GET.get('dimension', DailySales.TOTAL)
+    if dimension not in REPORT_COLUMNS:
+        return JsonResponse({'error': f'Unknown dimension {dimension!r}.'}, status=400)
+    try:
+        start, end = _date_range(request)
+    except ValueError:   # well-formed but impossible, e.g. 2024-02-30
+        return JsonResponse({'error': 'Invalid start or end date.'}, status=400)
+    rows = sales_report(dimension, start, end)
+    columns = REPORT_COLUMNS[dimension]
+
+    if request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="sales_{dimension}_{start}_{end}.csv"'
+        writer = csv.writer(response)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[column] for column in columns])
+        return response
+
+    return JsonResponse({
+        'dimension': dimension,
+        'start': start,
+        'end': end,
+        'rows': [{column: row[column] for column in columns} for row in rows],
+    })
+
+
+@staff_member_required
+def invoices_zip(request):
+    """All invoices for orders placed in ?start=&end= (default: last 30 days), as a streamed ZIP."""
+    try:
+        start, end = _date_range(request)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid start or end date.'}, status=400)
+    orders = Order.objects.filter(created__date__range=(start, end))
+    return invoice_zip_response(orders, f'invoices_{start}_{end}.zip')
@@ -1,5 +1,6 @@
 # core/admin.py
 from django.contrib import admin
+from django.db.models import Count
 from .models import GalleryCategory, GalleryItem, Testimonial  # Add Testimonial
 
 @admin.register(GalleryCategory)
@@ -8,9 +9,13 @@ class GalleryCategoryAdmin(admin.ModelAdmin):
     list_editable = ['order']
     prepopulated_fields = {'slug': ('name',)}
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(item_count=Count('items'))
+
     def item_count(self, obj):
-        return obj.items.count()
+        return obj.item_count
     item_count.short_description = 'Items'
+    item_count.admin_order_field = 'item_count'
 
 @admin.register(GalleryItem)
 class GalleryItemAdmin(admin.ModelAdmin):
@@ -18,6 +23,7 @@ class GalleryItemAdmin(admin.ModelAdmin):
     list_filter = ['category', 'content_type', 'is_active']
     list_editable = ['order', 'is_active']
     search_fields = ['title', 'subtitle']
+    list_select_related = ['category']
     ordering = ['order', '-created_at']
 
 # ADD TESTIMONIAL ADMIN
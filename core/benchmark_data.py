@@ -0,0 +1,321 @@
+# core/benchmark_data.py
+"""
+Synthetic large-catalog dataset for the benchmark suite (core/benchmarks.py).
+
+Everything is generated from a seeded random.Random, so two runs with the
+same options produce the same catalog. The ids of the seeded rows are
+recorded in MANIFEST_NAME (in default storage, next to the benchmark
+images), and the rows are marked as well: slugs start with "bench-" and
+orders point at the shared benchmark invoice PDF. Only rows that are both
+recorded and marked are ever deleted again, through QuerySet.delete() so
+cascades and SET_NULLs to real data are honoured.
+
+Rows are written with bulk_create (and removed with the per-row delete
+signals muted), so the derived data the signals would normally keep up to
+date (ratings, search index, order lines, sales rollups, related products)
+is rebuilt at the end.
+"""
+import json
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from PIL import Image
+
+from cart.models import Order, OrderLine
+from cart.reports import rebuild_rollups
+from cart.views import SHIPPING_ZONES
+from core.models import GalleryCategory, GalleryItem
+from core.pdf import html_to_pdf
+from shop.cards import invalidate_product_cards
+from shop.images import generate_variants
+from shop.models import Category, Product, ProductImage, Recipe, RecipeIngredient, Review
+from shop.ratings import rebuild_all_ratings
+from shop.recommendations import build_related_products
+from shop.search import get_search_backend
+
+PREFIX = 'bench-'
+INVOICE_NAME = 'invoices/benchmark.pdf'
+MANIFEST_NAME = 'benchmark/seeded.json'   # {model label: [[first id, last id], ...]} of the seeded rows
+IMAGE_COUNT = 24          # distinct image files, shared between rows
+BATCH_SIZE = 5000
+
+CATEGORY_NAMES = [
+    'Vegetables', 'Fruits', 'Herbs', 'Dairy', 'Eggs', 'Poultry', 'Beef', 'Goat', 'Honey', 'Grains',
+    'Legumes', 'Nuts', 'Spices', 'Juices', 'Bakery', 'Preserves', 'Seedlings', 'Flowers', 'Mushrooms',
+    'Tubers', 'Oils', 'Teas', 'Coffee', 'Fish', 'Hampers',
+]
+ADJECTIVES = ['Fresh', 'Organic', 'Farm', 'Local', 'Baby', 'Red', 'Green', 'Sweet', 'Wild', 'Golden', 'Crisp', 'Ripe']
+NOUNS = [
+    'Tomatoes', 'Spinach', 'Kale', 'Carrots', 'Avocados', 'Mangoes', 'Milk', 'Yoghurt', 'Eggs', 'Honey',
+    'Onions', 'Peppers', 'Basil', 'Mint', 'Beans', 'Maize', 'Potatoes', 'Bananas', 'Lemons', 'Cabbage',
+]
+WORDS = ('grown picked harvested sweet crunchy tender local seasonal rich creamy delivered morning '
+         'garden soil sun rain market kitchen family recipe healthy').split()
+
+
+def benchmark_counts(**overrides):
+    counts = {
+        'categories': len(CATEGORY_NAMES), 'products': 10000, 'reviews': 100000, 'recipes': 300,
+        'orders': 5000, 'gallery_items': 300,
+    }
+    counts.update({key: value for key, value in overrides.items() if value is not None})
+    return counts
+
+
+class BenchmarkDataError(Exception):
+    pass
+
+
+def _text(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _bulk_create(model, objs, manifest=None):
+    created = []
+    for start in range(0, len(objs), BATCH_SIZE):
+        created.extend(model.objects.bulk_create(objs[start:start + BATCH_SIZE]))
+    if manifest is not None:
+        manifest.setdefault(model._meta.label, []).extend(_id_ranges(obj.pk for obj in created))
+    return created
+
+
+def _id_ranges(ids):
+    ranges = []
+    for pk in sorted(ids):
+        if ranges and ranges[-1][1] == pk - 1:
+            ranges[-1][1] = pk
+        else:
+            ranges.append([pk, pk])
+    return ranges
+
+
+def read_manifest():
+    try:
+        with default_storage.open(MANIFEST_NAME) as handle:
+            return json.load(handle)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(manifest):
+    if default_storage.exists(MANIFEST_NAME):
+        default_storage.delete(MANIFEST_NAME)
+    default_storage.save(MANIFEST_NAME, ContentFile(json.dumps(manifest).encode()))
+
+
+# Seeded top-level rows: recorded in the manifest *and* carrying the benchmark marker.
+# Everything else seeded (images, reviews, order lines, ingredients, ...) goes with them by cascade.
+SEEDED = [
+    # deleted in this order
+    (Order, Q(pdf_invoice=INVOICE_NAME)),
+    (Recipe, Q(slug__startswith=PREFIX)),
+    (Product, Q(slug__startswith=PREFIX)),
+    (Category, Q(slug__startswith=PREFIX)),
+    (GalleryItem, Q(category__slug__startswith=PREFIX)),
+    (GalleryCategory, Q(slug__startswith=PREFIX)),
+]
+
+
+def seeded(model, manifest):
+    """The rows of ``model`` a previous seed() created."""
+    recorded = Q(pk__in=[])
+    for first, last in manifest.get(model._meta.label, []):
+        recorded |= Q(pk__range=(first, last))
+    marker = dict(SEEDED)[model]
+    return model.objects.filter(recorded, marker)
+
+
+@contextmanager
+def _muted(signal):
+    """
+    Disconnect every receiver of ``signal`` for the duration. Used for
+    post_delete: the per-row receivers (ratings, search index, cards, recipe
+    PDFs, image variants) would run once per deleted row, and seed()
+    rebuilds all of that afterwards anyway.
+    """
+    with signal.lock:
+        receivers, signal.receivers = signal.receivers, []
+        signal.sender_receivers_cache.clear()
+    try:
+        yield
+    finally:
+        with signal.lock:
+            signal.receivers = receivers
+            signal.sender_receivers_cache.clear()
+
+
+def delete_benchmark_data():
+    """Remove the rows recorded by the last seed(); real data is never touched. Returns rows deleted."""
+    manifest = read_manifest()
+    if not manifest:
+        return 0
+    deleted = 0
+    with transaction.atomic(), _muted(post_delete):
+        for model, _ in SEEDED:
+            deleted += seeded(model, manifest).delete()[0]
+    default_storage.delete(MANIFEST_NAME)
+    return deleted
+
+
+def write_images(folder):
+    """IMAGE_COUNT real JPEGs (with their variants) under MEDIA_ROOT/<folder>/."""
+    names = []
+    for i in range(IMAGE_COUNT):
+        name = f'{folder}/{PREFIX}{i}.jpg'
+        if not default_storage.exists(name):
+            buffer = BytesIO()
+            colours = random.Random(name)   # not the dataset's generator: files may already exist
+            colour = tuple(colours.randrange(256) for _ in range(3))
+            Image.new('RGB', (1200, 900), colour).save(buffer, 'JPEG', quality=85)
+            name = default_storage.save(name, ContentFile(buffer.getvalue()))
+        generate_variants(name, str(settings.MEDIA_ROOT))
+        names.append(name)
+    return names
+
+
+def seed(counts, random_seed=42, progress=print):
+    rng = random.Random(random_seed)
+    now = timezone.now()
+
+    progress("Removing previous benchmark data")
+    delete_benchmark_data()
+    clashes = [
+        str(model._meta.verbose_name_plural) for model, slug in
+        [(Category, 'category-'), (Product, 'product-'), (Recipe, 'recipe-')]
+        if model.objects.filter(slug__startswith=PREFIX + slug).exists()
+    ]
+    if clashes:
+        # Left by a run that wasn't recorded: they aren't known to be safe to delete
+        raise BenchmarkDataError(
+            f"Unrecorded {', '.join(clashes)} with benchmark slugs ({PREFIX}…) exist; remove them first."
+        )
+
+    progress("Writing images")
+    product_images = write_images('products/benchmark')
+    recipe_images = write_images('recipes/benchmark')
+    if not default_storage.exists(INVOICE_NAME):
+        default_storage.save(INVOICE_NAME, ContentFile(html_to_pdf('<h1>Benchmark invoice</h1>')))
+
+    manifest = {}
+    with transaction.atomic():
+        progress(f"Creating {counts['categories']} categories and {counts['products']} products")
+        categories = _bulk_create(Category, [
+            Category(name=f'{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} {i // len(CATEGORY_NAMES) or ""}'.strip(),
+                     slug=f'{PREFIX}category-{i}')
+            for i in range(counts['categories'])
+        ], manifest)
+        products = []
+        for i in range(counts['products']):
+            price = Decimal(rng.randrange(50, 5000)) + Decimal('0.00')
+            stock = rng.choice([None, None, 0, rng.randrange(1, 200)])
+            on_sale = rng.random() < 0.15
+            products.append(Product(
+                category=rng.choice(categories),
+                name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}',
+                slug=f'{PREFIX}product-{i}',
+                short_description=_text(rng, 8),
+                description=_text(rng, 60),
+                price=price,
+                old_price=price * Decimal('1.2') if on_sale else None,
+                available=rng.random() < 0.95,
+                stock=stock,
+                in_stock=stock is None or stock > 0,
+                is_featured=rng.random() < 0.02,
+                is_new=rng.random() < 0.1,
+                is_hot=rng.random() < 0.05,
+                on_sale=on_sale,
+            ))
+        products = _bulk_create(Product, products, manifest)
+
+        _bulk_create(ProductImage, [
+            ProductImage(product=product, image=rng.choice(product_images), alt_text=product.name, is_main=n == 0)
+            for product in products for n in range(rng.choice([1, 1, 2, 3]))
+        ])
+
+        progress(f"Creating {counts['reviews']} reviews")
+        _bulk_create(Review, [
+            Review(
+                product=rng.choice(products), name=f'Customer {i}', email=f'customer{i}@example.com',
+                comment=_text(rng, 25), rating=rng.choices(range(1, 6), weights=[1, 1, 3, 6, 9])[0],
+                is_approved=rng.random() < 0.9,
+            )
+            for i in range(counts['reviews'])
+        ])
+
+        progress(f"Creating {counts['recipes']} recipes")
+        recipes = _bulk_create(Recipe, [
+            Recipe(
+                title=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} Stew {i}', slug=f'{PREFIX}recipe-{i}',
+                image=rng.choice(recipe_images), description=_text(rng, 30),
+                instructions='\n'.join(_text(rng, 15) for _ in range(6)),
+                prep_time=rng.randrange(5, 60), cook_time=rng.randrange(10, 120), servings=rng.randrange(1, 9),
+                difficulty=rng.choice(['easy', 'medium', 'hard']),
+            )
+            for i in range(counts['recipes'])
+        ], manifest)
+        _bulk_create(RecipeIngredient, [
+            RecipeIngredient(recipe=recipe, product=product, quantity=f'{rng.randrange(1, 5)} pcs')
+            for recipe in recipes for product in rng.sample(products, rng.randrange(4, 12))
+        ])
+        featured = Recipe.featured_products.through
+        _bulk_create(featured, [
+            featured(recipe=recipe, product=product) for recipe in recipes for product in rng.sample(products, 2)
+        ])
+
+        progress(f"Creating {counts['orders']} orders over the last year")
+        orders, days = [], []
+        for _ in range(counts['orders']):
+            zone = rng.choice(list(SHIPPING_ZONES))
+            items = []
+            for product in rng.sample(products, rng.randrange(1, 6)):
+                quantity = rng.randrange(1, 4)
+                items.append({
+                    'product_id': product.id, 'name': product.name, 'quantity': quantity,
+                    'price': str(product.price), 'total': str(product.price * quantity),
+                })
+            orders.append(Order(
+                total_paid=sum(Decimal(item['total']) for item in items), shipping_zone=zone,
+                shipping_cost=SHIPPING_ZONES[zone], items=items, whatsapp_sent=True, pdf_invoice=INVOICE_NAME,
+            ))
+            days.append(rng.randrange(365))
+        orders = _bulk_create(Order, orders, manifest)
+        by_day = {}
+        for order, day in zip(orders, days):   # created is auto_now_add, so back-date it afterwards
+            by_day.setdefault(day, []).append(order.pk)
+        for day, ids in by_day.items():
+            Order.objects.filter(pk__in=ids).update(created=now - timedelta(days=day))
+        orders = list(Order.objects.filter(pk__in=[order.pk for order in orders]).only('order_id', 'created', 'items'))
+        _bulk_create(OrderLine, [line for order in orders for line in OrderLine.from_items(order)])
+
+        progress(f"Creating {counts['gallery_items']} gallery items")
+        gallery_categories = _bulk_create(GalleryCategory, [
+            GalleryCategory(name=f'Benchmark {name}', slug=f'{PREFIX}{name.lower()}', order=n)
+            for n, name in enumerate(['Farm', 'Harvest', 'Kitchen', 'Animals', 'Market'])
+        ], manifest)
+        _bulk_create(GalleryItem, [
+            GalleryItem(
+                title=f'Farm moment {i}', subtitle=_text(rng, 3)[:100],
+                instagram_url=f'https://www.instagram.com/p/bench{i}/',
+                content_type=rng.choice(['reel', 'post', 'story']), category=rng.choice(gallery_categories),
+                likes=rng.randrange(5000), comments=rng.randrange(300), order=i,
+            )
+            for i in range(counts['gallery_items'])
+        ], manifest)
+        write_manifest(manifest)
+
+    progress("Rebuilding ratings, search index, sales rollups and related products")
+    rebuild_all_ratings()
+    get_search_backend().rebuild()
+    rebuild_rollups((now - timedelta(days=365)).date(), now.date())
+    build_related_products()
+    invalidate_product_cards(Product.objects.values_list('id', flat=True))
@@ -0,0 +1,203 @@
+# core/benchmarks.py
+"""
+Route benchmarks over the seed_benchmark_data dataset (run_benchmarks command).
+
+Every URL in core/urls.py, shop/urls.py and cart/urls.py has at least one
+case, and the runner refuses to run when a route is added without one. Each
+case is requested through the test client after a warm-up, inside a
+transaction that is rolled back, so POSTs (checkout, testimonials, cart
+changes) leave the database as it was and every iteration sees the same rows.
+
+Latency percentiles and query counts are compared with a stored baseline
+(settings.BENCHMARK_BASELINE). Query counts must not grow at all; p95 may
+grow by the tolerance plus a few milliseconds of noise.
+"""
+import json
+import math
+import time
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cart.models import Order
+from shop.models import Category, Product, Recipe, Review
+from .benchmark_data import INVOICE_NAME, PREFIX
+from .models import GalleryItem
+
+BENCHMARKED_URLCONFS = ('core.urls', 'shop.urls', 'cart.urls')
+STAFF_USERNAME = 'benchmark-staff'
+CART_SIZE = 5
+NOISE_MS = 10   # absolute p95 slack on top of the relative tolerance
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def case(name, route, args=(), query='', method='get', data=None, content_type=None, staff=False):
+    return {
+        'name': name, 'route': route, 'args': args, 'query': query, 'method': method,
+        'data': data, 'content_type': content_type, 'staff': staff,
+    }
+
+
+def build_cases():
+    """The benchmark cases, pointed at representative (and busy) rows of the benchmark dataset."""
+    products = Product.objects.filter(slug__startswith=PREFIX, available=True, in_stock=True, stock__isnull=True)
+    busiest = products.order_by('-rating_count', 'id').first()
+    if busiest is None:
+        raise BenchmarkError("No benchmark data found: run `manage.py seed_benchmark_data` first.")
+    spare = products.order_by('id').exclude(pk=busiest.pk).first()
+    category = Category.objects.filter(slug__startswith=PREFIX).order_by('id').first()
+    recipe = Recipe.objects.filter(slug__startswith=PREFIX).order_by('id').first()
+    order = Order.objects.filter(pdf_invoice=INVOICE_NAME).order_by('order_id').first()
+    day = order.created.date().isoformat()
+
+    return [
+        case('home', 'home'),
+        case('about', 'about'),
+        case('contact', 'contact'),
+        case('gallery', 'gallery'),
+        case('submit_testimonial', 'submit_testimonial', method='post',
+             data={'client_name': 'Benchmark', 'testimonial_text': 'Lovely produce.'}),
+
+        case('shop_list', 'shop:shop_list'),
+        case('shop_list_search', 'shop:shop_list', query='q=fresh+tomatoes'),
+        case('shop_list_category', 'shop:shop_list', query=f'category={category.slug}&orderby=price'),
+        case('shop_list_rating', 'shop:shop_list', query='orderby=rating'),
+        case('shop_list_facets', 'shop:shop_list', query='badge=in_stock&price=500-1000'),
+        case('autocomplete', 'shop:autocomplete', query='q=fresh+to'),
+        case('category_detail', 'shop:category_detail', args=[category.slug]),
+        case('product_detail', 'shop:product_detail', args=[busiest.slug]),
+        case('recipe_list', 'shop:recipe_list'),
+        case('recipe_detail', 'shop:recipe_detail', args=[recipe.slug]),
+        case('recipe_pdf', 'shop:recipe_pdf', args=[recipe.slug]),
+
+        case('cart_detail', 'cart:cart_detail'),
+        case('cart_add', 'cart:cart_add', args=[spare.id], method='post', data={'quantity': 1}),
+        case('cart_remove', 'cart:cart_remove', args=[busiest.id], method='post'),
+        case('cart_update', 'cart:cart_update', method='post', data={f'quantity_{busiest.id}': 2}),
+        case('cart_batch', 'cart:cart_batch', method='post', content_type='application/json',
+             data=json.dumps({'operations': [
+                 {'op': 'add', 'product_id': spare.id, 'quantity': 2},
+                 {'op': 'set', 'product_id': busiest.id, 'quantity': 3},
+             ]})),
+        case('set_shipping_zone', 'cart:set_shipping_zone', method='post', data={'shipping_zone': 'Runda'}),
+        case('create_whatsapp_order', 'cart:create_whatsapp_order', method='post'),
+        case('invoice_status', 'cart:invoice_status', args=[order.order_id]),
+        case('sales_report', 'cart:sales_report', query='dimension=product', staff=True),
+        case('sales_report_csv', 'cart:sales_report', query='dimension=zone&format=csv', staff=True),
+        case('invoices_zip', 'cart:invoices_zip', query=f'start={day}&end={day}', staff=True),
+    ]
+
+
+def dataset_summary():
+    """Row counts of the benchmark dataset; results are only comparable on the same one."""
+    return {
+        'products': Product.objects.filter(slug__startswith=PREFIX).count(),
+        'reviews': Review.objects.filter(product__slug__startswith=PREFIX).count(),
+        'recipes': Recipe.objects.filter(slug__startswith=PREFIX).count(),
+        'orders': Order.objects.filter(pdf_invoice=INVOICE_NAME).count(),
+        'gallery_items': GalleryItem.objects.filter(category__slug__startswith=PREFIX).count(),
+    }
+
+
+def uncovered_routes(cases):
+    names = set()
+    for module in BENCHMARKED_URLCONFS:
+        urlconf = import_module(module)
+        namespace = getattr(urlconf, 'app_name', None)
+        names.update(f'{namespace}:{p.name}' if namespace else p.name for p in urlconf.urlpatterns)
+    return sorted(names - {c['route'] for c in cases})
+
+
+def make_clients(order_id):
+    """A shopper with a few things in the cart (and an order to poll), and a logged-in staff member."""
+    shopper = Client()
+    products = Product.objects.filter(slug__startswith=PREFIX, available=True, stock__isnull=True)
+    for product in products.order_by('-rating_count', 'id')[:CART_SIZE]:
+        shopper.post(reverse('cart:cart_add', args=[product.id]), {'quantity': 1})
+    session = shopper.session
+    session['invoice_orders'] = [order_id]
+    session.save()
+
+    staff = Client()
+    user, _ = get_user_model().objects.get_or_create(username=STAFF_USERNAME, defaults={'is_staff': True})
+    staff.force_login(user)
+    return shopper, staff
+
+
+def request_once(client, spec):
+    """(seconds, queries, status) for one request, rolled back afterwards."""
+    url = reverse(spec['route'], args=spec['args']) + (f"?{spec['query']}" if spec['query'] else '')
+    kwargs = {'content_type': spec['content_type']} if spec['content_type'] else {}
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        with transaction.atomic():
+            response = getattr(client, spec['method'])(url, spec['data'], **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+    return elapsed, len(queries), response.status_code
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run(iterations=20, warmup=2, only=None, progress=None):
+    cases = build_cases()
+    missing = uncovered_routes(cases)
+    if missing:
+        raise BenchmarkError(f"Routes without a benchmark case in core/benchmarks.py: {', '.join(missing)}")
+    if only:
+        cases = [c for c in cases if any(name in c['name'] for name in only)]
+
+    shopper, staff = make_clients(
+        Order.objects.filter(pdf_invoice=INVOICE_NAME).order_by('order_id').values_list('order_id', flat=True).first()
+    )
+
+    results = {}
+    for spec in cases:
+        client = staff if spec['staff'] else shopper
+        for _ in range(warmup):
+            request_once(client, spec)
+        timings, query_counts = [], []
+        for _ in range(iterations):
+            elapsed, queries, status = request_once(client, spec)
+            if status >= 400:
+                raise BenchmarkError(f"{spec['name']} returned HTTP {status}")
+            timings.append(elapsed * 1000)
+            query_counts.append(queries)
+        results[spec['name']] = {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': max(query_counts),
+        }
+        if progress:
+            progress(spec['name'], results[spec['name']])
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Human-readable regressions of ``results`` against ``baseline`` results."""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: {result['queries']} queries (baseline {base['queries']})")
+        limit = base['p95_ms'] * (1 + tolerance) + NOISE_MS
+        if result['p95_ms'] > limit:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.1f}ms (baseline {base['p95_ms']:.1f}ms, limit {limit:.1f}ms)"
+            )
+    return regressions
@@ -0,0 +1,82 @@
+# core/caching.py
+"""
+Single-flight cache helper.
+
+cached_section() keeps a value for ``timeout`` seconds and then serves it
+stale for up to ``stale_grace`` more while exactly one caller (whoever wins
+cache.add() on the lock key) rebuilds it. On a cold miss the other callers
+wait briefly for that rebuild instead of all hitting the database at once.
+
+invalidate() gives a key a new version stamp (read in the same round trip
+as the value) rather than only deleting it: a rebuild that was already
+running stores its result under the version it started with, so readers
+treat it as a miss instead of serving it until the timeout.
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+LOCK_TIMEOUT = 30       # seconds a rebuild may hold the lock
+WAIT_INTERVAL = 0.05    # seconds between polls while another worker rebuilds
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _version_key(key):
+    return f'{key}:version'
+
+
+def _store(key, value, version, timeout, stale_grace):
+    cache.set(key, (time.time() + timeout, value, version), timeout + stale_grace)
+
+
+def _read(key):
+    """(entry or None, current version); an entry stored under an older version counts as missing."""
+    found = cache.get_many([key, _version_key(key)])
+    entry, version = found.get(key), found.get(_version_key(key))
+    if entry is not None and entry[2] != version:
+        entry = None
+    return entry, version
+
+
+def _rebuild(key, builder, version, timeout, stale_grace):
+    try:
+        value = builder()
+        _store(key, value, version, timeout, stale_grace)
+        return value
+    finally:
+        cache.delete(_lock_key(key))
+
+
+def cached_section(key, builder, timeout=None, stale_grace=None, wait=None):
+    timeout = settings.SECTION_CACHE_TIMEOUT if timeout is None else timeout
+    stale_grace = settings.SECTION_CACHE_STALE_GRACE if stale_grace is None else stale_grace
+    wait = settings.SECTION_CACHE_WAIT if wait is None else wait
+
+    entry, version = _read(key)
+    if entry is not None:
+        fresh_until, value, _ = entry
+        if time.time() < fresh_until or not cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+            return value  # fresh, or stale while someone else refreshes it
+        return _rebuild(key, builder, version, timeout, stale_grace)
+
+    if cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+        return _rebuild(key, builder, version, timeout, stale_grace)
+
+    # Cold miss and another worker is already building: wait for its result.
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry, _ = _read(key)
+        if entry is not None:
+            return entry[1]
+    return builder()
+
+
+def invalidate(*keys):
+    cache.set_many({_version_key(key): uuid.uuid4().hex for key in keys}, None)
+    cache.delete_many(keys)
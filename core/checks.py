@@ -0,0 +1,32 @@
+# core/checks.py
+"""
+Deployment checks (`manage.py check --deploy`).
+
+Cached product cards, home sections, facet counts and the autocomplete
+index are invalidated by replacing version stamps in the default cache, and
+CART_STORE = 'cache' keeps whole carts there. A per-process backend keeps
+all of that to the process that made the change.
+"""
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in PER_PROCESS_BACKENDS:
+        return []
+    hint = "Set CACHE_URL to a shared cache (e.g. redis://127.0.0.1:6379/1)."
+    if settings.CART_STORE == 'cache':
+        hint += " With CART_STORE = 'cache', carts are also lost whenever a request lands on another process."
+    return [Warning(
+        f"The default cache ({backend}) is not shared between processes: changes made in one worker "
+        "leave stale product cards, home sections, facet counts and autocomplete suggestions in the others.",
+        hint=hint,
+        id='core.W001',
+    )]
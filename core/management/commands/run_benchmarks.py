@@ -0,0 +1,71 @@
+# core/management/commands/run_benchmarks.py
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks import BenchmarkError, compare, dataset_summary, run
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark every core/shop/cart route against the seed_benchmark_data dataset, report "
+        "p50/p95/p99 latency and query counts, and fail on regressions against the stored baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help="Timed requests per case.")
+        parser.add_argument('--warmup', type=int, default=2, help="Untimed requests per case first.")
+        parser.add_argument('--only', action='append', help="Run cases whose name contains this (repeatable).")
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE, help="Baseline JSON file.")
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help="Allowed relative p95 growth over the baseline (0.5 = 50%%).")
+        parser.add_argument('--save-baseline', action='store_true',
+                            help="Write these results as the new baseline instead of comparing.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'case':<24} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+
+        def progress(name, result):
+            self.stdout.write(
+                f"{name:<24} {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} "
+                f"{result['p99_ms']:>9.1f} {result['queries']:>8}"
+            )
+
+        try:
+            results = run(options['iterations'], options['warmup'], options['only'], progress)
+        except BenchmarkError as exc:
+            raise CommandError(str(exc))
+
+        baseline_path = Path(options['baseline'])
+        dataset = dataset_summary()
+        if options['save_baseline']:
+            baseline = {}
+            if baseline_path.exists() and options['only']:   # a partial run only replaces its own cases
+                baseline = json.loads(baseline_path.read_text())['results']
+            baseline.update(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                'dataset': dataset,
+                'iterations': options['iterations'],
+                'results': dict(sorted(baseline.items())),
+            }, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}."))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(
+                f"No baseline at {baseline_path}; run with --save-baseline to create one."
+            ))
+            return
+        baseline = json.loads(baseline_path.read_text())
+        if baseline.get('dataset') != dataset:
+            raise CommandError(
+                f"The baseline was recorded on a different dataset ({baseline.get('dataset')}, now {dataset}). "
+                "Re-seed with the same options, or save a new baseline."
+            )
+        regressions = compare(results, baseline['results'], options['tolerance'])
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,36 @@
+# core/management/commands/seed_benchmark_data.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmark_data import BenchmarkDataError, benchmark_counts, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate the synthetic large catalog used by run_benchmarks: products, reviews, images, "
+        "recipes, orders and gallery items. Replaces any earlier benchmark rows; real data is untouched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, help="Default 10000.")
+        parser.add_argument('--reviews', type=int, help="Default 100000.")
+        parser.add_argument('--recipes', type=int, help="Default 300.")
+        parser.add_argument('--orders', type=int, help="Default 5000.")
+        parser.add_argument('--gallery-items', type=int, help="Default 300.")
+        parser.add_argument('--seed', type=int, default=42, help="Random seed; the same seed gives the same data.")
+
+    def handle(self, *args, **options):
+        counts = benchmark_counts(
+            products=options['products'], reviews=options['reviews'], recipes=options['recipes'],
+            orders=options['orders'], gallery_items=options['gallery_items'],
+        )
+        started = time.monotonic()
+        try:
+            seed(counts, random_seed=options['seed'], progress=lambda message: self.stdout.write(f"  {message}"))
+        except BenchmarkDataError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded " + ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in counts.items())
+            + f" in {time.monotonic() - started:.0f}s."
+        ))
@@ -0,0 +1,123 @@
+# core/middleware.py
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import perf
+
+logger = logging.getLogger('core.perf')
+
+SERVER_TIMING_METRICS = (
+    # metric name, RequestMetrics key, description
+    ('db', 'db', 'SQL'),
+    ('tpl', 'template', 'Templates'),
+    ('pdf', 'pdf', 'PDF rendering'),
+    ('view', 'view', 'View'),
+)
+
+
+def view_name(view_func):
+    """ShopListView for class-based views, shop.views.recipe_pdf_download for functions."""
+    view_class = getattr(view_func, 'view_class', None)
+    if view_class is not None:
+        return view_class.__name__
+    return f'{view_func.__module__}.{getattr(view_func, "__qualname__", repr(view_func))}'
+
+
+class PerformanceMiddleware:
+    """
+    Opt-in (settings.PERF_INSTRUMENTATION) request profiling: SQL query count
+    and time, template, PDF and view time. Sent back as a Server-Timing header
+    (visible in the browser's network panel) and logged as one JSON line per
+    request to the 'core.perf' logger: a PERF_LOG_SAMPLE_RATE sample at INFO,
+    and every request over PERF_QUERY_BUDGET / PERF_LATENCY_BUDGET_MS at WARNING.
+
+    Goes first in MIDDLEWARE so the total covers the whole stack. For
+    streaming responses the times stop when the response starts streaming.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        perf.install_template_timing()
+
+    def __call__(self, request):
+        metrics, token = perf.start_request()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(perf.sql_execute_wrapper))
+                response = self.get_response(request)
+            total = metrics.elapsed()
+        finally:
+            perf.end_request(token)
+
+        response['Server-Timing'] = self.server_timing(metrics, total)
+        self.log(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = perf.current()
+        if metrics is not None:
+            metrics.view = view_name(view_func)
+            metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        # TemplateResponses render after the view returns; count that as view time too.
+        metrics = perf.current()
+        if metrics is not None and metrics.view_started is not None:
+            response.add_post_render_callback(lambda r: self._end_view(metrics))
+        return response
+
+    def _end_view(self, metrics):
+        if metrics.view_started is not None:
+            metrics.seconds['view'] = time.perf_counter() - metrics.view_started
+            metrics.view_started = None
+
+    def server_timing(self, metrics, total):
+        self._end_view(metrics)
+        entries = []
+        for name, key, description in SERVER_TIMING_METRICS:
+            if key in metrics.seconds:
+                if key in ('db', 'pdf'):
+                    description = f'{description} ({metrics.counts[key]})'
+                entries.append(f'{name};dur={metrics.seconds[key] * 1000:.1f};desc="{description}"')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+    def over_budget(self, metrics, total):
+        problems = []
+        if metrics.counts['db'] > settings.PERF_QUERY_BUDGET:
+            problems.append('queries')
+        if total * 1000 > settings.PERF_LATENCY_BUDGET_MS:
+            problems.append('latency')
+        return problems
+
+    def log(self, request, response, metrics, total):
+        problems = self.over_budget(metrics, total)
+        if not problems and random.random() >= settings.PERF_LOG_SAMPLE_RATE:
+            return
+        record = {
+            'ts': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': metrics.view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'view_ms': round(metrics.seconds['view'] * 1000, 1),
+            'queries': metrics.counts['db'],
+            'db_ms': round(metrics.seconds['db'] * 1000, 1),
+            'template_ms': round(metrics.seconds['template'] * 1000, 1),
+            'pdf_renders': metrics.counts['pdf'],
+            'pdf_ms': round(metrics.seconds['pdf'] * 1000, 1),
+            'over_budget': problems,
+        }
+        if problems:
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
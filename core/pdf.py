@@ -0,0 +1,219 @@
+# core/pdf.py
+"""
+Shared PDF renderer for invoices (cart/invoices.py) and recipe PDFs (shop/pdfs.py).
+
+Templates are rendered to HTML in the caller — they may follow model
+relations, which needs the caller's database connection — and the HTML is
+converted by xhtml2pdf in a small persistent process pool. The workers are
+warmed up on start by converting the real PDF templates (PDF_WARM_UP_TEMPLATES,
+rendered with an empty context), so xhtml2pdf/reportlab, the templates'
+stylesheets and fonts are loaded before the first real render, which then no
+longer pays that cost inside a web worker or holds its GIL.
+
+Static and media URLs in the HTML (e.g. ``{{ recipe.image.url }}``) are read
+straight from STATIC_ROOT / STATICFILES_DIRS / MEDIA_ROOT by a link callback,
+so the output doesn't depend on the host a request came in on and the
+renderer never fetches from the site over HTTP.
+
+A render that times out has its worker killed and the pool replaced:
+xhtml2pdf can't be interrupted, and a stuck worker would otherwise keep
+its slot.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.loader import render_to_string
+
+from . import perf
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_HTML = '<html><head><style>body { font-family: Helvetica; }</style></head><body><p>warm-up</p></body></html>'
+
+
+class PDFRenderError(Exception):
+    pass
+
+
+class PDFRenderTimeout(PDFRenderError):
+    pass
+
+
+# ==================== WORKER PROCESS ====================
+
+def _local_path(roots, uri, rel):
+    """xhtml2pdf link_callback: the file behind a static/media URL, else the URI unchanged."""
+    for prefix, directory in roots:
+        if uri.startswith(prefix):
+            path = os.path.join(directory, uri[len(prefix):])
+            if os.path.isfile(path):
+                return path
+    return uri
+
+
+def _html_to_pdf(html, roots=()):
+    from xhtml2pdf import pisa
+
+    result = BytesIO()
+    link_callback = partial(_local_path, roots) if roots else None
+    pdf = pisa.pisaDocument(BytesIO(html.encode('UTF-8')), result, link_callback=link_callback)
+    if pdf.err:
+        raise PDFRenderError(f"xhtml2pdf reported {pdf.err} error(s)")
+    return result.getvalue()
+
+
+def _warm_up(documents):
+    for html in documents:
+        try:
+            _html_to_pdf(html)
+        except Exception:  # a failed warm-up only costs the first real render
+            pass
+
+
+def local_roots():
+    """(URL prefix, directory) pairs for _local_path, worked out here since workers may not have settings."""
+    static_dirs = [settings.STATIC_ROOT, *settings.STATICFILES_DIRS]
+    return (
+        (settings.MEDIA_URL, str(settings.MEDIA_ROOT)),
+        *((settings.STATIC_URL, str(directory)) for directory in static_dirs if directory),
+    )
+
+
+def warm_up_documents():
+    """HTML of every PDF_WARM_UP_TEMPLATES template (empty context), for the workers to convert on start."""
+    documents = []
+    for template_name in settings.PDF_WARM_UP_TEMPLATES:
+        try:
+            html = render_to_string(template_name, {})
+        except TemplateDoesNotExist:
+            continue
+        # Images point at the site (and are empty here); fetching them isn't what needs warming
+        documents.append(re.sub(r'<img\b[^>]*>', '', html))
+    return documents or [WARM_UP_HTML]
+
+
+# ==================== POOL ====================
+
+_pool = None
+_pool_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {
+    'queued': 0,        # submitted and not finished yet (queue depth + in progress)
+    'rendered': 0,
+    'failed': 0,
+    'timeouts': 0,
+    'render_seconds': 0.0,
+    'max_render_seconds': 0.0,
+}
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS, initializer=_warm_up, initargs=(warm_up_documents(),),
+            )
+        return _pool
+
+
+def warm_pool():
+    """Start the workers now (each runs the warm-up) instead of on the first render."""
+    if settings.PDF_RENDER_POOL:
+        pool = get_pool()
+        for future in [pool.submit(time.sleep, 0) for _ in range(settings.PDF_RENDER_WORKERS)]:
+            future.result()
+
+
+def _reset_pool(broken, terminate=False):
+    """
+    Drop ``broken`` so the next render starts a fresh pool. ``terminate`` also
+    kills its workers, e.g. one stuck past the timeout (renders still running
+    in the others fail with PDFRenderError).
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    if terminate:
+        # ProcessPoolExecutor has no public way to stop a running task
+        for process in list((broken._processes or {}).values()):
+            process.terminate()
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _record(outcome, seconds):
+    with _stats_lock:
+        _stats['queued'] -= 1
+        _stats[outcome] += 1
+        if outcome == 'rendered':
+            _stats['render_seconds'] += seconds
+            _stats['max_render_seconds'] = max(_stats['max_render_seconds'], seconds)
+        queued = _stats['queued']
+    perf.add_timing('pdf', seconds)
+    logger.info("pdf %s in %.3fs (queue depth %d)", outcome, seconds, queued)
+
+
+def stats():
+    """Counters for this web/worker process, e.g. for logging or a health check."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    done = snapshot['rendered']
+    snapshot['avg_render_seconds'] = snapshot['render_seconds'] / done if done else 0.0
+    return snapshot
+
+
+def _run_in_pool(fn, *args, timeout):
+    """``fn(*args)`` in a worker; a timed-out or dead worker gets its pool replaced."""
+    pool = get_pool()
+    try:
+        future = pool.submit(fn, *args)
+    except BrokenProcessPool:   # a worker died earlier (e.g. OOM): start a fresh pool
+        _reset_pool(pool)
+        pool = get_pool()
+        future = pool.submit(fn, *args)
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        _reset_pool(pool, terminate=True)
+        raise PDFRenderTimeout(f"PDF render took longer than {timeout}s")
+    except BrokenProcessPool as exc:
+        _reset_pool(pool)
+        raise PDFRenderError("PDF worker process died") from exc
+
+
+def html_to_pdf(html, timeout=None):
+    """PDF bytes for ``html``. Raises PDFRenderError (PDFRenderTimeout after ``timeout`` seconds)."""
+    timeout = settings.PDF_RENDER_TIMEOUT if timeout is None else timeout
+    with _stats_lock:
+        _stats['queued'] += 1
+    started = time.monotonic()
+    try:
+        if not settings.PDF_RENDER_POOL:
+            content = _html_to_pdf(html, local_roots())
+        else:
+            content = _run_in_pool(_html_to_pdf, html, local_roots(), timeout=timeout)
+    except PDFRenderTimeout:
+        _record('timeouts', time.monotonic() - started)
+        raise
+    except Exception as exc:
+        _record('failed', time.monotonic() - started)
+        if isinstance(exc, PDFRenderError):
+            raise
+        raise PDFRenderError(str(exc)) from exc
+    _record('rendered', time.monotonic() - started)
+    return content
+
+
+def render_pdf(template_name, context, timeout=None):
+    """Render ``template_name`` with ``context`` and convert it to PDF bytes in the worker pool."""
+    return html_to_pdf(render_to_string(template_name, context), timeout=timeout)
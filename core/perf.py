@@ -0,0 +1,86 @@
+# core/perf.py
+"""
+Per-request timings for PerformanceMiddleware (core/middleware.py).
+
+The middleware puts a RequestMetrics in a context variable for the duration
+of a request; SQL (through a connection execute wrapper), template rendering
+and PDF conversion (core/pdf.py) add their time to it with add_timing().
+Outside an instrumented request add_timing() does nothing, so the hooks cost
+one context-variable lookup when instrumentation is off.
+"""
+import contextvars
+import time
+from collections import defaultdict
+
+from django.template.base import Template
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_template_timing_installed = False
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)   # 'db' / 'template' / 'pdf' / 'view' -> seconds
+        self.counts = defaultdict(int)      # ... and how many times each ran
+        self.view = None
+        self.view_started = None
+        self.in_template = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def add_timing(name, seconds):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.seconds[name] += seconds
+        metrics.counts[name] += 1
+
+
+def sql_execute_wrapper(execute, sql, params, many, context):
+    """For connection.execute_wrapper(): time every query on the connection."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        add_timing('db', time.perf_counter() - started)
+
+
+def install_template_timing():
+    """
+    Time template rendering. Only the outermost render in a request is timed,
+    so {% include %}s and inclusion tags aren't counted twice.
+    """
+    global _template_timing_installed
+    if _template_timing_installed:
+        return
+    original_render = Template._render
+
+    def _render(self, context):
+        metrics = _current.get()
+        if metrics is None or metrics.in_template:
+            return original_render(self, context)
+        metrics.in_template = True
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            metrics.in_template = False
+            add_timing('template', time.perf_counter() - started)
+
+    Template._render = _render
+    _template_timing_installed = True
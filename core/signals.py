@@ -0,0 +1,22 @@
+# core/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from shop.cards import cards_invalidated
+from .caching import invalidate
+from .models import Testimonial
+from .views import HOME_PRODUCT_SECTIONS, TESTIMONIALS_SECTION
+
+
+# ==================== HOME PAGE SECTIONS ====================
+
+@receiver(cards_invalidated)
+def catalog_changed(sender, product_ids, **kwargs):
+    invalidate(*HOME_PRODUCT_SECTIONS)
+
+
+@receiver(post_save, sender=Testimonial)
+@receiver(post_delete, sender=Testimonial)
+def testimonial_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate(TESTIMONIALS_SECTION))
@@ -1,3 +1,365 @@
-from django.test import TestCase
+import csv
+import json
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cart.models import Order, OrderLine
+from shop.models import Category, Product, Review
+from . import pdf
+from .benchmark_data import (
+    BenchmarkDataError, benchmark_counts, delete_benchmark_data, read_manifest, seed, seeded,
+)
+from .caching import cached_section, invalidate
+from .checks import check_shared_cache
+from .models import GalleryCategory, GalleryItem, Testimonial
+
+ROWS = 1200
+
+
+class AdminQueryBudgetTests(TestCase):
+    """The admin changelists run a fixed number of queries, however many rows there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        categories = GalleryCategory.objects.bulk_create(
+            GalleryCategory(name=f'Category {i}', slug=f'category-{i}', order=i) for i in range(ROWS)
+        )
+        GalleryItem.objects.bulk_create(
+            GalleryItem(title=f'Item {i}', instagram_url='https://www.instagram.com/p/abc/', category=categories[i])
+            for i in range(ROWS)
+        )
+        Testimonial.objects.bulk_create(
+            Testimonial(client_name=f'Client {i}', testimonial_text='Great produce') for i in range(ROWS)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertQueryBudget(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_gallery_category_changelist(self):
+        self.assertQueryBudget(reverse('admin:core_gallerycategory_changelist'), 5)
+
+    def test_gallery_item_changelist(self):
+        self.assertQueryBudget(reverse('admin:core_galleryitem_changelist'), 6)
+
+    def test_testimonial_changelist(self):
+        self.assertQueryBudget(reverse('admin:core_testimonial_changelist'), 5)
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                       CART_STORE='cache')
+    def test_per_process_cache_warns(self):
+        warnings = check_shared_cache(None)
+        self.assertEqual([w.id for w in warnings], ['core.W001'])
+        self.assertIn("CART_STORE = 'cache'", warnings[0].hint)
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                                           'LOCATION': 'redis://127.0.0.1:6379/1'}})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class CachedSectionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def builder(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_fresh_value_is_built_once(self):
+        self.assertEqual(cached_section('section', self.builder), 'value 1')
+        self.assertEqual(cached_section('section', self.builder), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_another_worker_rebuilds(self):
+        cached_section('section', self.builder, timeout=0)
+        cache.add('section:lock', 1)
+        self.assertEqual(cached_section('section', self.builder), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_rebuilt_by_the_lock_winner(self):
+        cached_section('section', self.builder, timeout=0)
+        self.assertEqual(cached_section('section', self.builder), 'value 2')
+        self.assertIsNone(cache.get('section:lock'))
+
+    def test_cold_miss_falls_back_to_building_after_waiting(self):
+        cache.add('section:lock', 1)
+        self.assertEqual(cached_section('section', self.builder, wait=0), 'value 1')
+        self.assertIsNone(cache.get('section'))   # only the lock holder stores
+
+    def test_failed_rebuild_releases_the_lock(self):
+        def broken():
+            raise RuntimeError('database went away')
+
+        with self.assertRaises(RuntimeError):
+            cached_section('section', broken)
+        self.assertIsNone(cache.get('section:lock'))
+        self.assertEqual(cached_section('section', self.builder), 'value 1')
+
+    def test_invalidate_drops_the_value(self):
+        cached_section('section', self.builder)
+        invalidate('section')
+        self.assertEqual(cached_section('section', self.builder), 'value 2')
+
+    def test_invalidate_during_a_rebuild_discards_its_result(self):
+        def builder():
+            invalidate('section')   # e.g. a product saved while the section was being built
+            return self.builder()
+
+        self.assertEqual(cached_section('section', builder), 'value 1')
+        self.assertEqual(cached_section('section', self.builder), 'value 2')
+        self.assertEqual(cached_section('section', self.builder), 'value 2')
+
+
+class HomeSectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Vegetables', slug='vegetables')
+        Product.objects.create(category=cls.category, name='Kale', slug='kale', description='', price='10.00',
+                               is_hot=True)
+        Testimonial.objects.create(client_name='Achieng', testimonial_text='Lovely kale')
+
+    def setUp(self):
+        cache.clear()
+
+    def home(self):
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_sections_are_served_from_cache(self):
+        with CaptureQueriesContext(connection) as cold:
+            self.home()
+        with CaptureQueriesContext(connection) as warm:
+            self.home()
+        self.assertLess(len(warm), len(cold))
+        self.assertFalse([q for q in warm if 'shop_product' in q['sql'] or 'core_testimonial' in q['sql']])
+
+    def test_product_change_drops_the_product_sections(self):
+        self.home()
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(category=self.category, name='Chillies', slug='chillies', description='',
+                                   price='10.00', is_hot=True)
+        self.assertIn('Chillies', [p.name for p in self.home().context['hot_products']])
+
+    def test_testimonial_change_drops_the_testimonials_section(self):
+        self.home()
+        with self.captureOnCommitCallbacks(execute=True):
+            Testimonial.objects.create(client_name='Kamau', testimonial_text='Fresh eggs')
+        self.assertIn('Kamau', [t.client_name for t in self.home().context['testimonials']])
+
+
+@override_settings(PDF_RENDER_POOL=True, PDF_RENDER_WORKERS=1)
+class PDFPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.addCleanup(self.shutdown)
+
+    def shutdown(self):
+        if pdf._pool is not None:
+            pdf._pool.shutdown(wait=True)
+            pdf._pool = None
+
+    def test_warm_up_uses_the_real_templates(self):
+        documents = pdf.warm_up_documents()
+        self.assertEqual(len(documents), len(settings.PDF_WARM_UP_TEMPLATES))
+        self.assertTrue(all('<img' not in html for html in documents))
+        with self.settings(PDF_WARM_UP_TEMPLATES=['missing.html']):
+            self.assertEqual(pdf.warm_up_documents(), [pdf.WARM_UP_HTML])
+
+    def test_timeout_kills_the_worker(self):
+        pdf.warm_pool()
+        stuck = pdf._pool
+        [worker] = stuck._processes.values()
+        with self.assertRaises(pdf.PDFRenderTimeout):
+            pdf._run_in_pool(time.sleep, 60, timeout=0.5)   # blocks until killed
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertIsNot(pdf.get_pool(), stuck)
+        self.assertTrue(pdf.html_to_pdf('<p>Invoice</p>').startswith(b'%PDF'))
+
+    def test_timeout_after_a_broken_pool_kills_the_new_worker(self):
+        broken = mock.Mock(spec=ProcessPoolExecutor)
+        broken.submit.side_effect = BrokenProcessPool
+        pdf._pool = broken
+        resets = []
+        reset_pool = pdf._reset_pool
+
+        def record_reset(pool, terminate=False):
+            resets.append((pool, terminate, list((pool._processes or {}).values()) if terminate else []))
+            reset_pool(pool, terminate)
+
+        with mock.patch.object(pdf, '_reset_pool', side_effect=record_reset):
+            with self.assertRaises(pdf.PDFRenderTimeout):
+                pdf._run_in_pool(time.sleep, 60, timeout=0.5)   # blocks until killed
+        (first, _, _), (fresh, terminate, [worker]) = resets
+        self.assertIs(first, broken)
+        self.assertIsNot(fresh, broken)
+        self.assertTrue(terminate)
+        worker.join(5)
+        self.assertFalse(worker.is_alive())
+        self.assertIsNot(pdf.get_pool(), fresh)
+
+
+class AdminExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        Product.objects.bulk_create(
+            Product(category=category, name=f'Product {i}', slug=f'product-{i}', description='', price='10.00',
+                    available=i % 2 == 0)
+            for i in range(ROWS)
+        )
+        Order.objects.create(total_paid='300.00', items=[
+            {'product_id': 1, 'name': 'Kale', 'quantity': 2, 'price': '100.00', 'total': '200.00'},
+            {'product_id': 2, 'name': 'Mango', 'quantity': 1, 'price': '100.00', 'total': '100.00'},
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def export(self, name, fmt, **params):
+        response = self.client.get(reverse(f'admin:{name}_export', args=[fmt]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_product_csv_follows_the_changelist_filters(self):
+        rows = list(csv.DictReader(self.export('shop_product', 'csv', available__exact='0').splitlines()))
+        self.assertEqual(len(rows), ROWS // 2)
+        self.assertEqual({row['available'] for row in rows}, {'False'})
+        self.assertEqual(rows[0]['category'], 'Vegetables')
+
+    def test_order_jsonl_has_a_row_per_item(self):
+        rows = [json.loads(line) for line in self.export('cart_order', 'jsonl').splitlines()]
+        self.assertEqual([(row['item_name'], row['item_quantity']) for row in rows], [('Kale', 2), ('Mango', 1)])
+        self.assertEqual({row['total_paid'] for row in rows}, {'300.00'})
+
+    def test_selected_rows_action(self):
+        ids = list(Product.objects.values_list('pk', flat=True)[:3])
+        response = self.client.post(reverse('admin:shop_product_changelist'), {
+            'action': 'export_selected_jsonl', '_selected_action': ids,
+        })
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 3)
+
+    def test_bad_requests(self):
+        url = reverse('admin:shop_product_export', args=['xlsx'])
+        self.assertEqual(self.client.get(url).status_code, 400)
+        url = reverse('admin:shop_product_export', args=['csv'])
+        self.assertEqual(self.client.get(url, {'price__wat': '1'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+
+@modify_settings(MIDDLEWARE={'prepend': 'core.middleware.PerformanceMiddleware'})
+@override_settings(PERF_LOG_SAMPLE_RATE=0, PERF_QUERY_BUDGET=1000, PERF_LATENCY_BUDGET_MS=60000)
+class PerformanceMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        Product.objects.create(category=category, name='Kale', slug='kale', description='', price='10.00')
+
+    def timings(self, response):
+        return dict(entry.split(';', 1) for entry in response['Server-Timing'].split(', '))
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('shop:shop_list'))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'db', 'tpl', 'view', 'total'})
+        self.assertIn(f'desc="SQL ({len(queries)})"', timings['db'])
+
+    def test_only_over_budget_requests_are_logged(self):
+        with self.assertNoLogs('core.perf'):
+            self.client.get(reverse('shop:shop_list'))
+        with self.settings(PERF_QUERY_BUDGET=0), self.assertLogs('core.perf', 'WARNING') as logs:
+            self.client.get(reverse('shop:product_detail', args=['kale']))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['status'], record['over_budget']), ('ProductDetailView', 200, ['queries']))
+        self.assertGreater(record['queries'], 0)
+
+    def test_sampled_requests_are_logged_at_info(self):
+        with self.settings(PERF_LOG_SAMPLE_RATE=1), self.assertLogs('core.perf', 'INFO') as logs:
+            self.client.get(reverse('shop:autocomplete'), {'q': 'ka'})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((logs.records[0].levelname, record['view']), ('INFO', 'shop.views.autocomplete'))
+
+
+@override_settings(PDF_RENDER_POOL=False, IMAGE_VARIANTS_ASYNC=False)
+class BenchmarkDataTests(TestCase):
+    COUNTS = benchmark_counts(products=40, reviews=200, recipes=3, orders=30, gallery_items=5)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        category = Category.objects.create(name='Bench Tools', slug='bench-tools')   # real, despite the prefix
+        self.real_product = Product.objects.create(
+            category=category, name='Garden bench', slug='bench-garden', description='', price='5000.00',
+        )
+        self.real_order = Order.objects.create(total_paid='0.00', items=[])
+
+    def seed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            seed(self.COUNTS, progress=lambda message: None)
+
+    def test_seed_is_reproducible_and_recorded(self):
+        self.seed()
+        names = list(Product.objects.filter(slug__startswith='bench-product-').values_list('name', flat=True))
+        self.assertEqual(len(names), 40)
+        self.assertEqual(Review.objects.count(), 200)
+        manifest = read_manifest()
+        self.assertEqual(len(seeded(Product, manifest)), 40)
+        self.assertNotIn(self.real_product, seeded(Product, manifest))
+
+        self.seed()   # replaces the previous run
+        self.assertEqual(list(Product.objects.filter(slug__startswith='bench-product-').values_list('name', flat=True)),
+                         names)
+
+    def test_delete_only_removes_seeded_rows(self):
+        self.seed()
+        bought = Product.objects.filter(slug__startswith='bench-product-').first()
+        line = OrderLine.objects.create(
+            order=self.real_order, product=bought, name=bought.name, quantity=1,
+            unit_price=bought.price, line_total=bought.price, created=self.real_order.created,
+        )
+        delete_benchmark_data()
+
+        self.assertEqual(list(Product.objects.all()), [self.real_product])
+        self.assertEqual(list(Category.objects.values_list('slug', flat=True)), ['bench-tools'])
+        self.assertEqual(list(Order.objects.all()), [self.real_order])
+        self.assertFalse(Review.objects.exists())
+        line.refresh_from_db()
+        self.assertIsNone(line.product_id)   # real history keeps the line, without the product
+        self.assertEqual(read_manifest(), {})
+
+    def test_unrecorded_benchmark_rows_are_left_alone(self):
+        Product.objects.create(
+            category=self.real_product.category, name='Old', slug='bench-product-0', description='', price='1.00',
+        )
+        delete_benchmark_data()
+        with self.assertRaises(BenchmarkDataError):
+            self.seed()
+        self.assertEqual(Product.objects.count(), 2)
@@ -2,38 +2,50 @@
 from django.shortcuts import render
 from django.views.generic import TemplateView
 from shop.models import Product
+from .caching import cached_section
 from .models import GalleryCategory, GalleryItem, Testimonial
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 
+# Each home page section is cached on its own (core/caching.py) and dropped by
+# core/signals.py when the products or testimonials behind it change.
+HOME_PRODUCT_SECTIONS = ('home:featured', 'home:hot', 'home:new')
+TESTIMONIALS_SECTION = 'home:testimonials'
+
+
+def active_testimonials():
+    return cached_section(TESTIMONIALS_SECTION, lambda: list(
+        Testimonial.objects.filter(is_active=True).order_by('-created_at')[:5]
+    ))
+
+
 class HomeView(TemplateView):
     template_name = 'home.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        products = Product.objects.for_listing().available()
         
         # FEATURED PRODUCTS
-        context['featured_products'] = Product.objects.filter(
-            available=True
-        ).select_related('category').prefetch_related('images').order_by('-created')[:12]
+        context['featured_products'] = cached_section(
+            'home:featured', lambda: list(products.order_by('-created')[:12])
+        )
 
-        context['hot_products'] = Product.objects.filter(
-            available=True, is_hot=True
-        )[:8]
+        context['hot_products'] = cached_section(
+            'home:hot', lambda: list(products.filter(is_hot=True)[:8])
+        )
 
-        context['new_products'] = Product.objects.filter(
-            available=True, is_new=True
-        )[:8]
+        context['new_products'] = cached_section(
+            'home:new', lambda: list(products.filter(is_new=True)[:8])
+        )
 
         # ADD TESTIMONIALS
-        context['testimonials'] = Testimonial.objects.filter(
-            is_active=True
-        ).order_by('-created_at')[:5]
+        context['testimonials'] = active_testimonials()
 
         return context
 
 def about(request):
-    testimonials = Testimonial.objects.filter(is_active=True).order_by('-created_at')[:5]
+    testimonials = active_testimonials()
     context = {
         'testimonials': testimonials,
     }
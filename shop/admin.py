@@ -1,5 +1,9 @@
 # shop/admin.py
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Count
+from django.forms.models import BaseInlineFormSet
+from django.urls import reverse
 from django.utils.html import format_html
 from .models import (
     Category,
@@ -9,6 +13,9 @@ from .models import (
     Recipe,
     RecipeIngredient
 )
+from .images import thumbnail_url
+from .ratings import refresh_product_ratings
+from core.exports import ExportMixin
 
 
 # ==================== INLINES ====================
@@ -18,66 +25,161 @@ class ProductImageInline(admin.TabularInline):
     extra = 1
     fields = ('image', 'alt_text', 'is_main')
 
+    def get_queryset(self, request):
+        # each row is labelled with str(image), which reads product.name
+        return super().get_queryset(request).select_related('product')
+
+
+class RecentReviewFormSet(BaseInlineFormSet):
+    """Only the newest reviews; a popular product can have thousands."""
+    limit = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            self._queryset = super().get_queryset().select_related('product').order_by('-created_at')[:self.limit]
+        return self._queryset
+
 
 class ReviewInline(admin.TabularInline):
     model = Review
+    formset = RecentReviewFormSet
     extra = 0
-    readonly_fields = ('name', 'email', 'rating', 'comment', 'created_at')
+    fields = readonly_fields = ('name', 'email', 'rating', 'comment', 'is_approved', 'created_at')
+    can_delete = False
+    show_change_link = True
+    verbose_name_plural = f"Reviews (newest {RecentReviewFormSet.limit}; moderate them under Reviews)"
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class LabelledAutocompleteSelect(AutocompleteSelect):
+    """
+    AutocompleteSelect that takes the selected option's label from ``labels``
+    when it is there, instead of querying for it on every row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.labels = {}
+
+    def optgroups(self, name, value, attr=None):
+        selected = [str(v) for v in value if str(v) not in self.choices.field.empty_values]
+        if not all(v in self.labels for v in selected):
+            return super().optgroups(name, value, attr)
+        options = [] if self.is_required else [self.create_option(name, '', '', False, 0)]
+        for v in selected:
+            options.append(self.create_option(name, v, self.labels[v], True, len(options)))
+        return [(None, options, 0)]
+
+
+class RecipeIngredientFormSet(BaseInlineFormSet):
+    """Each row's product label comes from the row itself, loaded with select_related."""
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if form.instance.product_id is not None:
+            field = form.fields['product']
+            widget = getattr(field.widget, 'widget', field.widget)   # inside RelatedFieldWidgetWrapper
+            widget.labels = {str(form.instance.product_id): field.label_from_instance(form.instance.product)}
+        return form
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
+    formset = RecipeIngredientFormSet
     extra = 1
     autocomplete_fields = ['product']
     fields = ('product', 'quantity', 'notes')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product', 'recipe')
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'product':
+            kwargs['widget'] = LabelledAutocompleteSelect(db_field, self.admin_site, using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
 
 # ==================== ADMIN CLASSES ====================
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'slug')
+    list_display = ('name', 'slug', 'product_count')
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(product_count=Count('products'))
+
+    @admin.display(description="Products", ordering='product_count')
+    def product_count(self, obj):
+        return obj.product_count
+
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'old_price', 'in_stock', 'is_hot', 'is_new', 'on_sale', 'created')
-    list_editable = ('price', 'old_price', 'in_stock', 'is_hot', 'is_new', 'on_sale')
+class ProductAdmin(ExportMixin, admin.ModelAdmin):
+    list_display = ('name', 'category', 'price', 'old_price', 'stock', 'in_stock', 'is_hot', 'is_new', 'on_sale', 'created')
+    list_editable = ('price', 'old_price', 'stock', 'is_hot', 'is_new', 'on_sale')
     list_filter = ('category', 'available', 'in_stock', 'is_hot', 'is_new', 'on_sale', 'created')
     search_fields = ('name', 'short_description', 'description')
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline, ReviewInline]
-    readonly_fields = ('created', 'updated')
+    readonly_fields = ('created', 'updated', 'rating_avg', 'rating_count', 'rating_histogram', 'all_reviews')
     date_hierarchy = 'created'
+    list_select_related = ('category',)
+    export_fields = (
+        ('id', 'id'), ('name', 'name'), ('slug', 'slug'), ('category', 'category__name'),
+        ('price', 'price'), ('old_price', 'old_price'), ('stock', 'stock'), ('in_stock', 'in_stock'),
+        ('available', 'available'), ('is_featured', 'is_featured'), ('is_hot', 'is_hot'),
+        ('is_new', 'is_new'), ('on_sale', 'on_sale'), ('rating_avg', 'rating_avg'),
+        ('rating_count', 'rating_count'), ('created', 'created'), ('updated', 'updated'),
+    )
+
+    @admin.display(description="Reviews")
+    def all_reviews(self, obj):
+        if not obj.pk:
+            return "-"
+        url = reverse('admin:shop_review_changelist') + f'?product__id__exact={obj.pk}'
+        return format_html('<a href="{}">All {} reviews</a>', url, obj.rating_count)
 
 
 @admin.register(Review)
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(ExportMixin, admin.ModelAdmin):
     list_display = ('product', 'name', 'rating', 'created_at', 'is_approved')
     list_filter = ('rating', 'is_approved', 'created_at', 'product__category')
     search_fields = ('name', 'product__name', 'comment')
     readonly_fields = ('created_at',)
-    actions = ['approve_reviews', 'disapprove_reviews']
+    list_select_related = ('product',)
+    raw_id_fields = ('product',)
+    actions = ['approve_reviews', 'disapprove_reviews', *ExportMixin.actions]
+    export_fields = (
+        ('id', 'id'), ('product_id', 'product_id'), ('product', 'product__name'), ('name', 'name'),
+        ('email', 'email'), ('rating', 'rating'), ('comment', 'comment'),
+        ('is_approved', 'is_approved'), ('created_at', 'created_at'),
+    )
 
     def approve_reviews(self, request, queryset):
+        product_ids = set(queryset.values_list('product_id', flat=True))
         queryset.update(is_approved=True)
+        refresh_product_ratings(product_ids)
     approve_reviews.short_description = "Approve selected reviews"
 
     def disapprove_reviews(self, request, queryset):
+        product_ids = set(queryset.values_list('product_id', flat=True))
         queryset.update(is_approved=False)
+        refresh_product_ratings(product_ids)
     disapprove_reviews.short_description = "Disapprove selected reviews"
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('thumbnail', 'title', 'difficulty', 'prep_time', 'cook_time', 'servings', 'is_active', 'created_at')
+    list_display = ('thumbnail', 'title', 'difficulty', 'prep_time', 'cook_time', 'servings', 'ingredient_count', 'is_active', 'created_at')
     list_filter = ('difficulty', 'is_active', 'created_at')
     search_fields = ('title', 'description', 'instructions')
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = ('created_at',)
-    filter_horizontal = ('featured_products',)
+    autocomplete_fields = ('featured_products',)   # filter_horizontal would render every product
     inlines = [RecipeIngredientInline]
 
     fieldsets = (
@@ -101,12 +203,19 @@ class RecipeAdmin(admin.ModelAdmin):
         }),
     )
 
-    # Beautiful image preview in list
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(ingredient_count=Count('ingredients'))
+
+    @admin.display(description="Ingredients", ordering='ingredient_count')
+    def ingredient_count(self, obj):
+        return obj.ingredient_count
+
+    # Beautiful image preview in list (the 160px variant; URL cached per image)
     def thumbnail(self, obj):
         if obj.image:
             return format_html(
                 '<img src="{}" style="width:80px; height:60px; object-fit:cover; border-radius:6px; box-shadow:0 2px 8px rgba(0,0,0,0.1);">',
-                obj.image.url
+                thumbnail_url(obj.image)
             )
         return "(No image)"
     thumbnail.short_description = "Preview"
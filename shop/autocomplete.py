@@ -0,0 +1,235 @@
+# shop/autocomplete.py
+"""
+In-memory prefix index for search-as-you-type (the shop:autocomplete view).
+
+Every available product and every category is indexed under its normalised
+name and under each word-suffix of it ("organic baby spinach" is also found
+by "baby sp" and "spin"). The keys live in one sorted list, so a lookup is a
+bisect plus a short forward scan and never touches the database.
+
+Web workers build the index from the database when they start (warm_up(),
+called from wamugundafarm/wsgi.py and asgi.py once the app is loaded);
+other processes build it on first use. It is kept up to date in place:
+the signals in shop/signals.py re-read only the products whose cards were
+invalidated, and the category that was saved or deleted. Only refs whose
+suggestion actually differs (name, category, price, url, or the product
+being made available or unavailable) count as a change, so a new rating,
+review or stock level costs one small query and nothing else. Stock isn't
+part of a suggestion: sold-out products are still suggested.
+
+Each change gets the next number of a counter in the cache and a change-log
+entry listing the refs it touched. Other processes replay the entries they
+missed on their next lookup, re-reading just those refs; they rebuild only
+when the log can't bridge the gap (entries expired or evicted, more than
+CHANGE_LOG_LIMIT behind, or a bulk refresh that logged REBUILD).
+"""
+import logging
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.urls import reverse
+
+from .models import Category, Product
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'shop-autocomplete-change-version'
+CHANGE_KEY = 'shop-autocomplete-change:{}'
+CHANGE_LOG_TIMEOUT = 60 * 60 * 24
+CHANGE_LOG_LIMIT = 100    # further behind than this, a process rebuilds instead of replaying
+SCAN_LIMIT = 200          # keys looked at per lookup before ranking
+REBUILD_THRESHOLD = 500   # refreshing more products than this rebuilds the whole index
+REBUILD = 'rebuild'       # change-log entry that makes every process rebuild
+
+
+def normalise(text):
+    return ' '.join(tokenize(text))
+
+
+def index_entries(name, ref):
+    """(key, ref, key is the whole name) for every word-suffix of ``name``."""
+    words = tokenize(name)
+    return {(' '.join(words[i:]), ref, i == 0) for i in range(len(words))}
+
+
+def _url_template(name):
+    # One reverse() per build instead of one per row
+    return reverse(name, args=['SLUG']).replace('{', '{{').replace('}', '}}').replace('SLUG', '{}')
+
+
+def _current_version():
+    cache.add(VERSION_KEY, 0, None)
+    return cache.get(VERSION_KEY, 0)
+
+
+def _publish(change):
+    """Claim the next version for ``change`` (a set of refs, or REBUILD) and log it."""
+    _current_version()
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:   # evicted since the add()
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(CHANGE_KEY.format(version), change, CHANGE_LOG_TIMEOUT)
+    return version
+
+
+class PrefixIndex:
+    """Sorted index entries plus the suggestion each entry's ref stands for."""
+
+    def __init__(self):
+        self.lock = threading.Lock()   # serialises writers; lookups read self.data without it
+        self.version = None
+        # (sorted [(key, ref, whole_name)], {ref: suggestion}); ref is ('category' | 'product', pk).
+        # Replaced as a whole, never mutated.
+        self.data = ([], {})
+
+    # ----- building -----
+
+    @staticmethod
+    def category_suggestions(categories):
+        url = _url_template('shop:category_detail')
+        return {
+            ('category', pk): {'type': 'category', 'name': name, 'url': url.format(slug)}
+            for pk, name, slug in categories.values_list('pk', 'name', 'slug')
+        }
+
+    @staticmethod
+    def product_suggestions(product_ids=None):
+        products = Product.objects.available()
+        if product_ids is not None:
+            products = products.filter(pk__in=product_ids)
+        url = _url_template('shop:product_detail')
+        return {
+            ('product', pk): {
+                'type': 'product', 'name': name, 'category': category, 'price': str(price), 'url': url.format(slug),
+            }
+            for pk, name, slug, price, category in products.values_list(
+                'pk', 'name', 'slug', 'price', 'category__name',
+            ).iterator(chunk_size=2000)
+        }
+
+    def suggestions_for(self, refs):
+        """Current suggestions for ``refs``; refs that are gone or unavailable are left out."""
+        product_ids = {pk for kind, pk in refs if kind == 'product'}
+        category_ids = {pk for kind, pk in refs if kind == 'category'}
+        suggestions = {}
+        if category_ids:
+            suggestions.update(self.category_suggestions(Category.objects.filter(pk__in=category_ids)))
+        if product_ids:
+            suggestions.update(self.product_suggestions(product_ids))
+        return suggestions
+
+    def _build(self):
+        version = _current_version()   # read first: changes logged while building are replayed afterwards
+        suggestions = self.category_suggestions(Category.objects.all())
+        suggestions.update(self.product_suggestions())
+        entries = sorted(entry for ref, s in suggestions.items() for entry in index_entries(s['name'], ref))
+        self.data = (entries, suggestions)
+        self.version = version
+
+    def rebuild(self):
+        with self.lock:
+            self._build()
+
+    def _sync(self):
+        """Catch up with the change log, or rebuild if it can't bridge the gap. Call with the lock held."""
+        current = cache.get(VERSION_KEY)
+        if self.version is not None and current == self.version:
+            return
+        if self.version is None or current is None or not 0 < current - self.version <= CHANGE_LOG_LIMIT:
+            self._build()
+            return
+        keys = [CHANGE_KEY.format(v) for v in range(self.version + 1, current + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys) or REBUILD in changes.values():
+            self._build()
+            return
+        refs = set().union(*changes.values())
+        self._apply(refs, self.suggestions_for(refs))
+        self.version = current
+
+    def ensure_current(self):
+        """Bring the index up to date if this process never built it or another process changed it since."""
+        if self.version is not None and self.version == cache.get(VERSION_KEY):
+            return
+        with self.lock:
+            self._sync()
+
+    def _apply(self, refs, suggestions):
+        """Swap in new suggestions for ``refs`` (missing from ``suggestions`` = removed)."""
+        entries, current = self.data
+        entries = [entry for entry in entries if entry[1] not in refs]
+        merged = {ref: s for ref, s in current.items() if ref not in refs}
+        merged.update(suggestions)
+        for ref, suggestion in suggestions.items():
+            for entry in index_entries(suggestion['name'], ref):
+                insort(entries, entry)
+        self.data = (entries, merged)
+
+    def _refresh(self, refs, suggestions):
+        """Apply and log the refs whose suggestion differs from the indexed one; no change, no new version."""
+        with self.lock:
+            self._sync()   # compare against the current index, not one that's missing other changes
+            current = self.data[1]
+            changed = {ref for ref in refs if current.get(ref) != suggestions.get(ref)}
+            if not changed:
+                return
+            version = _publish(changed)
+            self._apply(changed, {ref: s for ref, s in suggestions.items() if ref in changed})
+            if version == self.version + 1:
+                self.version = version
+            # Otherwise another process logged a change in between: the next _sync() replays
+            # it (and this one again, harmlessly).
+
+    def refresh_products(self, product_ids):
+        product_ids = set(product_ids)
+        if len(product_ids) > REBUILD_THRESHOLD:
+            with self.lock:
+                _publish(REBUILD)   # other processes rebuild too
+                self._build()
+            return
+        self._refresh({('product', pk) for pk in product_ids}, self.product_suggestions(product_ids))
+
+    def refresh_category(self, category_id):
+        """Re-read one category; a deleted one drops out of the index."""
+        self._refresh({('category', category_id)}, self.category_suggestions(Category.objects.filter(pk=category_id)))
+
+    # ----- lookups -----
+
+    def lookup(self, query, limit=None):
+        limit = settings.AUTOCOMPLETE_LIMIT if limit is None else limit
+        prefix = normalise(query)
+        if len(prefix) < settings.AUTOCOMPLETE_MIN_LENGTH:
+            return []
+        self.ensure_current()
+
+        entries, suggestions = self.data
+        start = bisect_left(entries, (prefix,))
+        matches = {}   # ref -> matched on the start of the name
+        for key, ref, whole_name in entries[start:start + SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            matches[ref] = matches.get(ref, False) or whole_name
+        ranked = sorted(
+            matches,
+            key=lambda ref: (ref[0] != 'category', not matches[ref], suggestions[ref]['name'].lower()),
+        )
+        return [suggestions[ref] for ref in ranked[:limit]]
+
+
+index = PrefixIndex()
+
+
+def warm_up():
+    """Build the index now, so the first autocomplete request in a web worker doesn't pay for it."""
+    if not settings.AUTOCOMPLETE_BUILD_ON_START:
+        return
+    try:
+        index.rebuild()
+    except DatabaseError:   # not migrated yet: the first lookup builds it instead
+        logger.warning("Autocomplete index not built on start", exc_info=True)
@@ -0,0 +1,103 @@
+# shop/cards.py
+"""
+Fragment cache for rendered product cards.
+
+Each card is cached under product id + version stamp + template. The
+stamp lives in the cache too and is replaced by invalidate_product_cards()
+(wired to Product / ProductImage / Review / Category changes in
+shop/signals.py), so stale cards are simply never looked up again.
+
+Stamps have to be shared by every worker process, so production needs a
+shared cache backend (CACHE_URL in settings; see core/checks.py).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+DEFAULT_CARD_TEMPLATE = 'shop/partials/product_tile.html'
+
+# Sent with product_ids whenever cards are invalidated, i.e. whenever anything
+# shown on a card changed. Pages that cache product lists listen for it.
+cards_invalidated = Signal()
+
+
+def _version_key(product_id):
+    return f'product-card-version:{product_id}'
+
+
+def _card_key(product_id, version, template_name):
+    return f'product-card:{product_id}:{version}:{template_name}'
+
+
+def invalidate_product_cards(product_ids):
+    """
+    Give the products a new version stamp; their cached cards become unreachable.
+
+    The stamp changes once the current transaction commits (straight away
+    outside one): changed before, a render still reading the old rows could
+    cache them under the new stamp.
+    """
+    product_ids = set(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _replace_versions(product_ids))
+
+
+def _replace_versions(product_ids):
+    replace_card_versions(product_ids)
+    cards_invalidated.send(sender=None, product_ids=product_ids)
+
+
+def replace_card_versions(product_ids):
+    """
+    New stamps right away, without sending cards_invalidated: for when only
+    the card markup changed (e.g. image variants finished), not the products.
+    Touches the cache only, so it is safe outside a request.
+    """
+    cache.set_many({_version_key(pid): uuid.uuid4().hex for pid in product_ids}, None)
+
+
+def _versions(product_ids):
+    version_keys = {pid: _version_key(pid) for pid in product_ids}
+    found = cache.get_many(version_keys.values())
+    versions, missing = {}, {}
+    for pid, key in version_keys.items():
+        if key in found:
+            versions[pid] = found[key]
+        else:
+            versions[pid] = missing[key] = uuid.uuid4().hex
+    if missing:
+        cache.set_many(missing, None)
+    return versions
+
+
+def render_product_cards(products, template_name=DEFAULT_CARD_TEMPLATE):
+    """
+    Return the rendered card HTML for each product, in order.
+
+    Costs two cache round trips for the whole list; only the misses are
+    rendered (and need their category / main image loaded).
+    """
+    products = list(products)
+    if not products:
+        return []
+
+    versions = _versions([p.pk for p in products])
+    card_keys = {p.pk: _card_key(p.pk, versions[p.pk], template_name) for p in products}
+    cached = cache.get_many(card_keys.values())
+
+    rendered, cards = {}, []
+    for product in products:
+        key = card_keys[product.pk]
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = render_to_string(template_name, {'product': product})
+        cards.append(mark_safe(html))
+
+    if rendered:
+        cache.set_many(rendered, settings.PRODUCT_CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,413 @@
+# shop/catalog_import.py
+"""
+Bulk catalog import for the import_catalog command.
+
+Input is a CSV of products (or of recipe ingredients), or a JSON document
+with "categories", "products" and "recipes" sections. Products are written
+with bulk_create / bulk_update in batches; as those skip model signals, the
+importer refreshes the search index, product cards and image variants itself.
+
+Products are matched by slug, then by name (case-insensitive). In "create" mode matches
+are skipped; in "upsert" mode they are updated with the columns present in
+the input. New slugs are made unique against the database and the file.
+"""
+import csv
+import json
+import os
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .cards import invalidate_product_cards
+from .images import schedule_variants
+from .models import Category, Product, ProductImage, Recipe, RecipeIngredient
+from .pdfs import delete_recipe_pdfs
+from .search import get_search_backend
+
+PRODUCT_TEXT_FIELDS = ('short_description', 'description')
+PRODUCT_FLAG_FIELDS = ('available', 'is_featured', 'is_new', 'is_hot', 'on_sale')
+SEARCH_REBUILD_THRESHOLD = 5000   # above this many touched products, rebuild the index in one statement
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+class RowError(ValueError):
+    pass
+
+
+def _decimal(value, field, required=False):
+    if value in (None, ''):
+        if required:
+            raise RowError(f"{field} is required")
+        return None
+    try:
+        return Decimal(str(value).replace(',', '').strip())
+    except InvalidOperation:
+        raise RowError(f"{field}: {value!r} is not a number")
+
+
+def _int(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f"{field}: {value!r} is not a whole number")
+
+
+def _bool(value):
+    return value if isinstance(value, bool) else str(value).strip().lower() in TRUE_VALUES
+
+
+def _differs(instance, field, value):
+    if field == 'category':   # compare ids so an unsaved or unloaded category doesn't cost a query
+        return value.pk is None or instance.category_id != value.pk
+    return getattr(instance, field) != value
+
+
+def _images(value):
+    if not value:
+        return []
+    if isinstance(value, list):
+        return [path for path in value if path]
+    return [path.strip() for path in str(value).split('|') if path.strip()]
+
+
+class SlugAllocator:
+    """Unique slugs against the table and everything allocated during this import."""
+
+    def __init__(self, taken, max_length):
+        self.taken = set(taken)
+        self.max_length = max_length
+
+    def allocate(self, text):
+        base = (slugify(text) or 'item')[:self.max_length]
+        slug, n = base, 2
+        while slug in self.taken:
+            suffix = f'-{n}'
+            slug = f'{base[:self.max_length - len(suffix)]}{suffix}'
+            n += 1
+        self.taken.add(slug)
+        return slug
+
+
+class CatalogImporter:
+    def __init__(self, images_dir=None, upsert=False, dry_run=False, batch_size=1000, progress=None):
+        self.images_dir = images_dir
+        self.upsert = upsert
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.counts = {key: 0 for key in (
+            'categories_created', 'products_created', 'products_updated', 'products_unchanged', 'products_skipped',
+            'images_added', 'images_skipped', 'recipes_created', 'recipes_updated', 'ingredients', 'errors',
+        )}
+        self.errors = []
+        self.skipped = []   # rows deliberately not imported, reported alongside the errors
+        self.touched_products = set()
+        self.new_images = []
+        self.changed_recipes = set()
+
+    # ==================== ENTRY POINTS ====================
+
+    def import_file(self, path, fmt=None):
+        fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            if fmt == 'json':
+                data = json.load(handle)
+                if isinstance(data, list):
+                    data = {'products': data}
+            elif fmt == 'csv':
+                rows = list(csv.DictReader(handle))
+                is_ingredients = rows and {'recipe', 'product'} <= set(rows[0])
+                data = {'ingredients' if is_ingredients else 'products': rows}
+            else:
+                raise ValueError(f"Unsupported format {fmt!r} (use csv or json)")
+        return self.run(data)
+
+    def run(self, data):
+        with transaction.atomic():
+            self.import_categories(data.get('categories', []))
+            self.import_products(data.get('products', []))
+            self.import_recipes(data.get('recipes', []))
+            self.import_ingredients(data.get('ingredients', []))
+            if self.dry_run:
+                transaction.set_rollback(True)
+        if not self.dry_run:
+            self.refresh_derived_data()
+        return self.counts
+
+    def error(self, section, line, exc):
+        self.counts['errors'] += 1
+        self.errors.append(f"{section} row {line}: {exc}")
+
+    # ==================== CATEGORIES ====================
+
+    def load_categories(self):
+        self.categories = {}
+        for category in Category.objects.all():
+            self.categories[category.slug] = category
+            self.categories.setdefault(category.name.lower(), category)
+        self.category_slugs = SlugAllocator(
+            (c.slug for c in self.categories.values()), Category._meta.get_field('slug').max_length,
+        )
+
+    def get_category(self, name, slug=None):
+        if not name and not slug:
+            raise RowError("category is required")
+        category = self.categories.get(slug) if slug else None
+        category = category or self.categories.get((name or '').lower())
+        if category is None:
+            category = Category(name=name or slug, slug=slug or self.category_slugs.allocate(name))
+            self.pending_categories.append(category)
+            self.categories[category.slug] = category
+            self.categories[category.name.lower()] = category
+        return category
+
+    def flush_categories(self):
+        if self.pending_categories:
+            Category.objects.bulk_create(self.pending_categories, batch_size=self.batch_size)
+            self.counts['categories_created'] += len(self.pending_categories)
+            self.pending_categories = []
+
+    def import_categories(self, rows):
+        self.load_categories()
+        self.pending_categories = []
+        for line, row in enumerate(rows, start=1):
+            try:
+                self.get_category(row.get('name'), row.get('slug'))
+            except RowError as exc:
+                self.error('categories', line, exc)
+        self.flush_categories()
+
+    # ==================== PRODUCTS ====================
+
+    def import_products(self, rows):
+        if not rows:
+            return
+        existing = Product.objects.only(
+            'id', 'slug', 'name', 'category', 'price', 'old_price', 'stock', 'in_stock',
+            *PRODUCT_TEXT_FIELDS, *PRODUCT_FLAG_FIELDS,
+        ).in_bulk(field_name='slug')
+        by_name = {product.name.lower(): product for product in existing.values()}
+        slugs = SlugAllocator(existing, Product._meta.get_field('slug').max_length)
+        has_images = set(ProductImage.objects.values_list('product_id', flat=True).distinct())
+
+        to_create, to_update, update_fields, images = [], {}, set(), []
+        for line, row in enumerate(rows, start=1):
+            try:
+                name = (row.get('name') or '').strip()
+                if not name:
+                    raise RowError("name is required")
+                values = self.product_values(row)
+            except RowError as exc:
+                self.error('products', line, exc)
+                continue
+
+            slug = (row.get('slug') or '').strip()
+            # A slug that isn't in the table yet still matches a product by name
+            product = existing.get(slug) or by_name.get(name.lower())
+            if product is not None and not self.upsert:
+                self.counts['products_skipped'] += 1
+                continue
+            if product is None:
+                missing = [field for field in ('category', 'price') if field not in values]
+                if missing:
+                    self.error('products', line, f"{' and '.join(missing)} required for new products")
+                    continue
+                product = Product(name=name, slug=slugs.allocate(slug or name))
+                values.setdefault('description', '')
+                to_create.append(product)
+                existing[product.slug] = by_name[name.lower()] = product
+            else:
+                values = {
+                    field: value for field, value in {**values, 'name': name}.items()
+                    if _differs(product, field, value)
+                }
+                if not values:
+                    self.counts['products_unchanged'] += 1
+                    continue
+                if product.pk is not None:
+                    to_update[product.pk] = product
+                    update_fields.update(values)
+            product.name = name
+            for field, value in values.items():
+                setattr(product, field, value)
+            if 'stock' in values:
+                product.in_stock = product.stock is None or product.stock > 0
+
+            for path in _images(row.get('images') or row.get('image')):
+                images.append((product, path))
+
+            if len(to_create) >= self.batch_size:
+                self.create_products(to_create)
+                to_create = []
+            if line % self.batch_size == 0:
+                self.progress(f"products: {line}/{len(rows)}")
+
+        self.flush_categories()
+        self.create_products(to_create)
+        if to_update:
+            if 'stock' in update_fields:
+                update_fields.add('in_stock')
+            # bulk_update skips auto_now; build_related_products --incremental goes by it
+            update_fields.add('updated')
+            now = timezone.now()
+            for product in to_update.values():
+                product.updated = now
+            Product.objects.bulk_update(list(to_update.values()), sorted(update_fields), batch_size=self.batch_size)
+            self.counts['products_updated'] += len(to_update)
+            self.touched_products.update(to_update)
+        self.progress(f"products: {len(rows)}/{len(rows)}")
+
+        for product, path in images:
+            if product.pk in has_images:
+                self.counts['images_skipped'] += 1
+                self.skipped.append(f"images row {product.slug}: {path!r} skipped, the product already has images")
+        self.attach_images([(product, path) for product, path in images if product.pk not in has_images])
+
+    def product_values(self, row):
+        values = {}
+        if row.get('price') not in (None, ''):
+            values['price'] = _decimal(row['price'], 'price')
+        if 'old_price' in row:
+            values['old_price'] = _decimal(row['old_price'], 'old_price')
+        if 'stock' in row:
+            values['stock'] = _int(row['stock'], 'stock')
+            if values['stock'] is not None and values['stock'] < 0:
+                raise RowError("stock cannot be negative")
+        for field in PRODUCT_TEXT_FIELDS:
+            if field in row:
+                values[field] = row[field] or ''
+        for field in PRODUCT_FLAG_FIELDS:
+            if row.get(field) not in (None, ''):
+                values[field] = _bool(row[field])
+        if row.get('category') or row.get('category_slug'):   # last, so a rejected row creates no category
+            values['category'] = self.get_category(row.get('category'), row.get('category_slug'))
+        return values
+
+    def create_products(self, products):
+        if not products:
+            return
+        self.flush_categories()   # new categories need ids first
+        Product.objects.bulk_create(products, batch_size=self.batch_size)
+        self.counts['products_created'] += len(products)
+        self.touched_products.update(product.pk for product in products)
+
+    # ==================== IMAGES ====================
+
+    def store_image(self, path, upload_to):
+        source = os.path.join(self.images_dir or '', path)
+        if not os.path.isfile(source):
+            raise RowError(f"image {path!r} not found")
+        if self.dry_run:
+            return f'{upload_to}/{os.path.basename(path)}'
+        with open(source, 'rb') as handle:
+            return default_storage.save(f'{upload_to}/{os.path.basename(path)}', File(handle))
+
+    def attach_images(self, images):
+        upload_to = date.today().strftime('products/%Y/%m/%d')
+        rows, seen = [], set()
+        for product, path in images:
+            try:
+                name = self.store_image(path, upload_to)
+            except RowError as exc:
+                self.error('images', product.slug, exc)
+                continue
+            rows.append(ProductImage(product=product, image=name, is_main=product.pk not in seen))
+            seen.add(product.pk)
+        ProductImage.objects.bulk_create(rows, batch_size=self.batch_size)
+        self.counts['images_added'] += len(rows)
+        self.new_images.extend(rows)
+
+    # ==================== RECIPES ====================
+
+    def import_recipes(self, rows):
+        for line, row in enumerate(rows, start=1):
+            try:
+                title = (row.get('title') or '').strip()
+                if not title:
+                    raise RowError("title is required")
+                slug = row.get('slug') or slugify(title)
+                recipe = Recipe.objects.filter(slug=slug).first()
+                if recipe is not None and not self.upsert:
+                    continue
+                created = recipe is None
+                recipe = recipe or Recipe(slug=slug)
+                recipe.title = title
+                for field in ('description', 'instructions', 'difficulty'):
+                    if field in row:
+                        setattr(recipe, field, row[field] or '')
+                for field in ('prep_time', 'cook_time', 'servings'):
+                    if row.get(field) not in (None, ''):
+                        setattr(recipe, field, _int(row[field], field))
+                if row.get('image'):
+                    recipe.image = self.store_image(row['image'], f'recipes/{slug}')
+                elif created:
+                    raise RowError("image is required for new recipes")
+                recipe.save()
+                self.counts['recipes_created' if created else 'recipes_updated'] += 1
+            except RowError as exc:
+                self.error('recipes', line, exc)
+                continue
+            if 'ingredients' in row:
+                self.import_ingredients(
+                    [{**ingredient, 'recipe': recipe.slug} for ingredient in row['ingredients']],
+                    replace=True,
+                )
+
+    def import_ingredients(self, rows, replace=False):
+        if not rows:
+            return
+        recipes = Recipe.objects.in_bulk({row.get('recipe') for row in rows}, field_name='slug')
+        products = {}
+        for slug, pk, name in Product.objects.values_list('slug', 'pk', 'name'):
+            products[slug] = pk
+            products.setdefault(name.lower(), pk)
+
+        ingredients, seen = [], {}   # seen: (recipe, product) -> line
+        for line, row in enumerate(rows, start=1):
+            recipe = recipes.get(row.get('recipe'))
+            product_id = products.get(row.get('product')) or products.get((row.get('product') or '').lower())
+            if recipe is None or product_id is None:
+                self.error('ingredients', line, f"unknown recipe {row.get('recipe')!r} or product {row.get('product')!r}")
+                continue
+            if (recipe.pk, product_id) in seen:
+                # One upsert statement can't touch the same row twice
+                self.error('ingredients', line, f"duplicate of row {seen[recipe.pk, product_id]} (same recipe and product)")
+                continue
+            seen[recipe.pk, product_id] = line
+            ingredients.append(RecipeIngredient(
+                recipe=recipe, product_id=product_id,
+                quantity=row.get('quantity') or '', notes=row.get('notes') or '',
+            ))
+            self.changed_recipes.add(recipe.slug)
+
+        if replace:
+            RecipeIngredient.objects.filter(recipe__in={i.recipe for i in ingredients}).delete()
+        RecipeIngredient.objects.bulk_create(
+            ingredients, batch_size=self.batch_size,
+            update_conflicts=True, unique_fields=['recipe', 'product'], update_fields=['quantity', 'notes'],
+        )
+        self.counts['ingredients'] += len(ingredients)
+
+    # ==================== AFTER COMMIT ====================
+
+    def refresh_derived_data(self):
+        """What the skipped post_save signals would have done."""
+        product_ids = list(self.touched_products)
+        backend = get_search_backend()
+        if len(product_ids) > SEARCH_REBUILD_THRESHOLD:
+            backend.rebuild()
+        else:
+            for start in range(0, len(product_ids), self.batch_size):
+                backend.index_products(product_ids[start:start + self.batch_size])
+        invalidate_product_cards(product_ids + [image.product_id for image in self.new_images])
+        for image in self.new_images:
+            schedule_variants(image.image, [image.product_id])
+        for slug in self.changed_recipes:
+            delete_recipe_pdfs(slug)
@@ -0,0 +1,176 @@
+# shop/facets.py
+"""
+Faceted filtering for the shop list: category, badges and price range.
+
+    ?category=<slug>            one category
+    ?badge=hot&badge=sale       badges, combined with AND (hot, new, sale, in_stock)
+    ?price=500-1000             one PRICE_BUCKETS range ("2500-" has no upper bound)
+
+The counts shown next to every option are computed in a single aggregate
+query with one conditional COUNT per option, over the search results with
+the *other* groups' selections applied (so picking a category still shows
+how many products the sibling categories have). They are cached per
+search + selection under a version stamp that is replaced whenever product
+cards are invalidated, i.e. whenever anything a facet depends on changes.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from core.caching import cached_section
+
+BADGES = {
+    # ?badge= value: (label, filter)
+    'hot': ("Hot", Q(is_hot=True)),
+    'new': ("New", Q(is_new=True)),
+    'sale': ("On Sale", Q(on_sale=True)),
+    'in_stock': ("In Stock", Q(in_stock=True)),
+}
+PRICE_BUCKETS = [(None, 250), (250, 500), (500, 1000), (1000, 2500), (2500, None)]   # KSh, [low, high)
+RESET_PARAMS = ('page', 'cursor')   # a new selection starts again at the first page
+
+VERSION_KEY = 'shop-facets-version'
+
+
+def bucket_key(low, high):
+    return f"{low or 0}-{high or ''}"
+
+
+def bucket_label(low, high):
+    if low is None:
+        return f"Under KSh {high:,}"
+    if high is None:
+        return f"KSh {low:,}+"
+    return f"KSh {low:,} – {high:,}"
+
+
+def bucket_filter(low, high):
+    q = Q()
+    if low is not None:
+        q &= Q(price__gte=low)
+    if high is not None:
+        q &= Q(price__lt=high)
+    return q
+
+
+BUCKETS = {bucket_key(low, high): (bucket_label(low, high), bucket_filter(low, high)) for low, high in PRICE_BUCKETS}
+
+
+def invalidate_facets():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.add(VERSION_KEY, version, None)
+        version = cache.get(VERSION_KEY, version)
+    return version
+
+
+class Facets:
+    """The facet selection in a request's query string, and the counts that go with it."""
+
+    def __init__(self, params, categories):
+        self.params = params
+        self.categories = list(categories)
+        self.category = params.get('category') or None
+        self.badges = [badge for badge in dict.fromkeys(params.getlist('badge')) if badge in BADGES]
+        self.price = params.get('price') if params.get('price') in BUCKETS else None
+
+    @property
+    def active(self):
+        return bool(self.category or self.badges or self.price)
+
+    def filter(self, exclude=None):
+        """Q for the current selection, leaving out the ``exclude`` group ('category' or 'price')."""
+        q = Q()
+        if self.category and exclude != 'category':
+            category_ids = [c.pk for c in self.categories if c.slug == self.category]
+            q &= Q(category_id__in=category_ids)
+        for badge in self.badges:
+            q &= BADGES[badge][1]
+        if self.price and exclude != 'price':
+            q &= BUCKETS[self.price][1]
+        return q
+
+    def apply(self, queryset):
+        return queryset.filter(self.filter())
+
+    # ----- counts -----
+
+    def count_expressions(self):
+        expressions = {}
+        other = self.filter(exclude='category')
+        for category in self.categories:
+            expressions[f'category_{category.pk}'] = Count('pk', filter=Q(category_id=category.pk) & other)
+        current = self.filter()
+        for badge, (_, q) in BADGES.items():
+            expressions[f'badge_{badge}'] = Count('pk', filter=q & current)
+        other = self.filter(exclude='price')
+        for n, (_, q) in enumerate(BUCKETS.values()):
+            expressions[f'price_{n}'] = Count('pk', filter=q & other)
+        return expressions
+
+    def counts(self, queryset):
+        """All option counts for ``queryset`` (the search results before facet filtering), in one query."""
+        if queryset.query.is_empty():   # e.g. a search with no usable terms: nothing to count (and no SQL)
+            return dict.fromkeys(self.count_expressions(), 0)
+        sql, params = queryset.order_by().query.sql_with_params()
+        categories = ','.join(str(c.pk) for c in self.categories)
+        selection = f"{self.category}|{','.join(sorted(self.badges))}|{self.price}|{categories}"
+        digest = hashlib.md5(f'{sql}|{params}|{selection}'.encode()).hexdigest()
+        key = f'shop-facets:{_version()}:{digest}'
+        return cached_section(
+            key,
+            lambda: queryset.order_by().aggregate(**self.count_expressions()),
+            timeout=settings.FACET_CACHE_TIMEOUT,
+        )
+
+    # ----- template data -----
+
+    def url(self, **changes):
+        params = self.params.copy()
+        for name in RESET_PARAMS:
+            params.pop(name, None)
+        for name, value in changes.items():
+            if name == 'badge':
+                badges = [b for b in self.badges if b != value] if value in self.badges else self.badges + [value]
+                params.setlist('badge', badges)
+            elif value is None:
+                params.pop(name, None)
+            else:
+                params[name] = value
+        query = params.urlencode()
+        return f'?{query}' if query else '?'
+
+    def groups(self, queryset):
+        counts = self.counts(queryset)
+        return {
+            'categories': [
+                {
+                    'value': category.slug, 'label': category.name, 'count': counts[f'category_{category.pk}'],
+                    'selected': category.slug == self.category,
+                    'url': self.url(category=None if category.slug == self.category else category.slug),
+                }
+                for category in self.categories
+            ],
+            'badges': [
+                {
+                    'value': badge, 'label': label, 'count': counts[f'badge_{badge}'],
+                    'selected': badge in self.badges, 'url': self.url(badge=badge),
+                }
+                for badge, (label, _) in BADGES.items()
+            ],
+            'prices': [
+                {
+                    'value': key, 'label': label, 'count': counts[f'price_{n}'],
+                    'selected': key == self.price, 'url': self.url(price=None if key == self.price else key),
+                }
+                for n, (key, (label, _)) in enumerate(BUCKETS.items())
+            ],
+        }
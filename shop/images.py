@@ -0,0 +1,201 @@
+# shop/images.py
+"""
+Resized WebP / JPEG variants of uploaded product and recipe images.
+
+Variants are written next to MEDIA_ROOT/variants/ with a predictable name,
+generated in a process pool after the upload is committed, and exposed to
+templates through the {% responsive_image %} tag (shop/templatetags/image_variants.py).
+Alongside them a small JSON manifest records which variants were written and
+their actual widths, so building a srcset reads one cached manifest instead
+of asking storage about every file.
+"""
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'variants'
+# name -> max width in px (smaller originals are re-encoded, never upscaled)
+VARIANTS = {
+    'thumbnail': 160,
+    'card': 400,
+    'detail': 1000,
+}
+THUMBNAIL_URL_TIMEOUT = 60 * 60 * 24   # seconds a resolved variant URL is cached
+THUMBNAIL_FALLBACK_TIMEOUT = 60       # ... or the original's URL, while the variant is still being generated
+FORMATS = {
+    'webp': {'ext': 'webp', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'ext': 'jpg', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+
+def variant_name(name, variant, fmt):
+    stem, _ = os.path.splitext(name)
+    return f"{VARIANT_DIR}/{stem}-{variant}.{FORMATS[fmt]['ext']}"
+
+
+def manifest_name(name):
+    stem, _ = os.path.splitext(name)
+    return f"{VARIANT_DIR}/{stem}.json"
+
+
+def generate_variants(name, media_root, force=False):
+    """
+    Write every variant of MEDIA_ROOT/<name>, then its manifest. Pure PIL, no
+    Django, so it can run in a worker process. Returns the number of files written.
+    """
+    source = os.path.join(media_root, name)
+    source_mtime = os.path.getmtime(source)
+    written = 0
+    widths = {}   # variant -> actual width in px
+
+    with Image.open(source) as original:
+        original = ImageOps.exif_transpose(original)
+        for variant, width in VARIANTS.items():
+            resized = original.copy()
+            resized.thumbnail((width, width * 10), Image.Resampling.LANCZOS)
+            widths[variant] = resized.width
+            for fmt, spec in FORMATS.items():
+                target = os.path.join(media_root, variant_name(name, variant, fmt))
+                if not force and os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                image = resized
+                if fmt == 'jpeg' and image.mode != 'RGB':
+                    # JPEG has no alpha channel: flatten onto white.
+                    background = Image.new('RGB', image.size, (255, 255, 255))
+                    background.paste(image, mask=image.convert('RGBA').split()[-1])
+                    image = background
+                image.save(target, fmt.upper(), **spec['options'])
+                written += 1
+
+    with open(os.path.join(media_root, manifest_name(name)), 'w') as manifest:
+        json.dump(widths, manifest)
+    return written
+
+
+def _thumbnail_key(name, variant):
+    return f"image-url:{variant}:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def _manifest_key(name):
+    return f"image-variants:{hashlib.md5(name.encode()).hexdigest()}"
+
+
+def _forget(name):
+    """Drop the cached manifest and URLs for ``name`` so they are read again."""
+    cache.delete_many([_manifest_key(name)] + [_thumbnail_key(name, variant) for variant in VARIANTS])
+
+
+def variant_widths(name):
+    """{variant: width} from the manifest written with the variants ({} until they exist). Cached."""
+    key = _manifest_key(name)
+    widths = cache.get(key)
+    if widths is None:
+        try:
+            with default_storage.open(manifest_name(name)) as manifest:
+                widths = json.load(manifest)
+        except (OSError, ValueError):
+            return {}   # not generated yet; looked up again next time
+        cache.set(key, widths, None)
+    return widths
+
+
+def delete_variants(name):
+    _forget(name)
+    paths = [variant_name(name, variant, fmt) for variant in VARIANTS for fmt in FORMATS]
+    for path in paths + [manifest_name(name)]:
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_VARIANT_WORKERS)
+    return _pool
+
+
+def _variants_done(name, product_ids):
+    """
+    Runs once variants exist: cached URLs and cards that fell back to the
+    original are rebuilt. Called on the pool's callback thread, so it only
+    touches the cache, never the database.
+    """
+    from .cards import replace_card_versions
+
+    _forget(name)
+    if product_ids:
+        replace_card_versions(product_ids)
+
+
+def schedule_variants(fieldfile, product_ids=()):
+    """
+    Generate variants for an uploaded image once the surrounding transaction
+    commits; the cards of ``product_ids`` are invalidated when they are done.
+    """
+    if not fieldfile:
+        return
+    name = fieldfile.name
+    media_root = str(settings.MEDIA_ROOT)
+    product_ids = set(product_ids)
+
+    def done(future):
+        exc = future.exception()
+        if exc is not None:
+            logger.error("Generating image variants for %s failed", name, exc_info=exc)
+            return
+        _variants_done(name, product_ids)
+
+    def run():
+        if settings.IMAGE_VARIANTS_ASYNC:
+            get_pool().submit(generate_variants, name, media_root).add_done_callback(done)
+        else:
+            generate_variants(name, media_root)
+            _variants_done(name, product_ids)
+
+    transaction.on_commit(run)
+
+
+def variant_srcset(fieldfile, fmt):
+    """'url 160w, url 400w, ...' for the variants in the image's manifest, at their real widths."""
+    if not fieldfile:
+        return ''
+    candidates, seen = [], set()
+    for variant, width in sorted(variant_widths(fieldfile.name).items(), key=lambda item: item[1]):
+        if width in seen:   # a small original gives several variants the same width
+            continue
+        seen.add(width)
+        candidates.append(f'{default_storage.url(variant_name(fieldfile.name, variant, fmt))} {width}w')
+    return ', '.join(candidates)
+
+
+def thumbnail_url(fieldfile, variant='thumbnail'):
+    """
+    URL of a JPEG variant, falling back to the original upload. Cached, so a
+    list of images (e.g. an admin changelist) doesn't ask storage per row.
+    """
+    if not fieldfile:
+        return ''
+    key = _thumbnail_key(fieldfile.name, variant)
+    url = cache.get(key)
+    if url is None:
+        path = variant_name(fieldfile.name, variant, 'jpeg')
+        if default_storage.exists(path):
+            url, timeout = default_storage.url(path), THUMBNAIL_URL_TIMEOUT
+        else:
+            url, timeout = fieldfile.url, THUMBNAIL_FALLBACK_TIMEOUT
+        cache.set(key, url, timeout)
+    return url
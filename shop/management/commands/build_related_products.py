@@ -0,0 +1,33 @@
+# shop/management/commands/build_related_products.py
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from shop.models import RelatedProduct
+from shop.recommendations import build_related_products, changed_since
+
+
+class Command(BaseCommand):
+    help = "Precompute related / frequently-bought-together products from order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help="Only recompute products ordered or edited since the last run.",
+        )
+
+    def handle(self, *args, **options):
+        product_ids = None
+        if options['incremental']:
+            last_run = RelatedProduct.objects.aggregate(last=Max('computed_at'))['last']
+            if last_run is None:
+                self.stdout.write("No previous run found — doing a full build.")
+            else:
+                product_ids = changed_since(last_run)
+                if not product_ids:
+                    self.stdout.write(self.style.SUCCESS("Nothing changed since the last run."))
+                    return
+
+        products, rows = build_related_products(product_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {rows} recommendations for {products} products."
+        ))
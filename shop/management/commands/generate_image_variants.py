@@ -0,0 +1,50 @@
+# shop/management/commands/generate_image_variants.py
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from shop.cards import replace_card_versions
+from shop.images import _forget, generate_variants
+from shop.models import ProductImage, Recipe
+
+
+class Command(BaseCommand):
+    help = "Backfill resized WebP/JPEG variants for existing product and recipe images."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_VARIANT_WORKERS)
+        parser.add_argument('--force', action='store_true', help="Regenerate variants that are up to date.")
+
+    def handle(self, *args, **options):
+        products = defaultdict(set)   # image name -> ids of the products showing it
+        for name, product_id in ProductImage.objects.exclude(image='').values_list('image', 'product_id'):
+            products[name].add(product_id)
+        names = set(products) | set(Recipe.objects.exclude(image='').values_list('image', flat=True))
+        media_root = str(settings.MEDIA_ROOT)
+
+        written = failed = 0
+        refreshed = set()
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(generate_variants, name, media_root, options['force']): name
+                for name in sorted(names)
+            }
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    written += future.result()
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f"{name}: {exc}")
+                    continue
+                _forget(name)   # cached manifest / URLs from before the variants existed
+                refreshed |= products.get(name, set())
+
+        # Cards cached without a srcset are rendered again
+        replace_card_versions(refreshed)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {len(names)} images: {written} variant files written, {failed} failed."
+        ))
@@ -0,0 +1,58 @@
+# shop/management/commands/import_catalog.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_import import CatalogImporter
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import categories, products (with images) and recipes from a CSV or JSON file. "
+        "CSV columns: name, slug, category, category_slug, price, old_price, stock, "
+        "short_description, description, available, is_featured, is_new, is_hot, on_sale, images "
+        "(paths separated by |). A CSV with recipe and product columns imports recipe ingredients."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file to import.")
+        parser.add_argument('--format', choices=['csv', 'json'], help="Defaults to the file extension.")
+        parser.add_argument('--images-dir', help="Directory that image paths in the file are relative to.")
+        parser.add_argument(
+            '--mode', choices=['create', 'upsert'], default='create',
+            help="create: skip products/recipes that already exist. upsert: update them.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Validate and report without saving anything or copying images.",
+        )
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(
+            images_dir=options['images_dir'],
+            upsert=options['mode'] == 'upsert',
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size'],
+            progress=lambda message: self.stdout.write(f"  {message}") if options['verbosity'] > 1 else None,
+        )
+        started = time.monotonic()
+        try:
+            counts = importer.import_file(options['path'], options['format'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for message in importer.errors[:50]:
+            self.stderr.write(message)
+        if len(importer.errors) > 50:
+            self.stderr.write(f"... and {len(importer.errors) - 50} more errors")
+        for message in importer.skipped[:50]:
+            self.stdout.write(message)
+        if len(importer.skipped) > 50:
+            self.stdout.write(f"... and {len(importer.skipped) - 50} more skipped")
+
+        summary = ", ".join(f"{key.replace('_', ' ')}: {value}" for key, value in counts.items() if value)
+        prefix = "Dry run — nothing saved. " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{summary or 'nothing to import'} ({time.monotonic() - started:.1f}s)"
+        ))
@@ -0,0 +1,15 @@
+# shop/management/commands/rebuild_ratings.py
+from django.core.management.base import BaseCommand
+
+from shop.ratings import rebuild_all_ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored rating_avg / rating_count / rating_histogram for every product."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = rebuild_all_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt ratings for {updated} products."))
@@ -0,0 +1,15 @@
+# shop/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand
+
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from scratch."
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"{type(backend).__name__}: indexed {indexed} products."
+        ))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:48
+
+import shop.models
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_ratings(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Review = apps.get_model('shop', 'Review')
+
+    histograms = {}
+    rows = (
+        Review.objects.filter(is_approved=True).order_by()
+        .values_list('product_id', 'rating').annotate(n=Count('id'))
+    )
+    for product_id, rating, n in rows:
+        histograms.setdefault(product_id, shop.models.empty_rating_histogram())[str(rating)] = n
+
+    products = list(Product.objects.filter(id__in=histograms))
+    for product in products:
+        histogram = histograms[product.id]
+        count = sum(histogram.values())
+        product.rating_count = count
+        product.rating_avg = round(sum(int(s) * n for s, n in histogram.items()) / count, 2)
+        product.rating_histogram = histogram
+    Product.objects.bulk_update(products, ['rating_avg', 'rating_count', 'rating_histogram'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_recipe_recipeingredient_recipe_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(blank=True, default=shop.models.empty_rating_histogram),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-rating_avg', '-rating_count'], name='shop_produc_rating__faa8d1_idx'),
+        ),
+        migrations.RunPython(populate_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Creates the FTS5 index used by shop.search.SqliteFTS5Backend (SQLite only).
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts USING fts5("
+                "name, short_description, description, category, "
+                "tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+            )
+        except OperationalError:
+            # SQLite built without FTS5 — shop.search falls back to icontains.
+            return
+        cursor.execute(
+            "INSERT INTO shop_product_fts (rowid, name, short_description, description, category) "
+            "SELECT p.id, p.name, p.short_description, p.description, c.name "
+            "FROM shop_product p JOIN shop_category c ON c.id = p.category_id"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_product_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
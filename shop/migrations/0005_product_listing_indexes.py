@@ -0,0 +1,21 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', 'category', '-created'], name='shop_produc_availab_78247d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['available', 'price'], name='shop_produc_availab_7320db_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('co_purchases', models.PositiveIntegerField(default=0, help_text='Orders containing both products')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='shop.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_for', to='shop.product')),
+            ],
+            options={
+                'ordering': ('-score',),
+                'indexes': [models.Index(fields=['product', '-score'], name='shop_relate_product_8a8e9a_idx')],
+                'unique_together': {('product', 'related')},
+            },
+        ),
+    ]
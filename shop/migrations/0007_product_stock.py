@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+def mark_sold_out(apps, schema_editor):
+    # Products switched off by hand become tracked with nothing on hand;
+    # everything else stays untracked (stock=None) until someone enters a count.
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.filter(in_stock=False).update(stock=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock',
+            field=models.PositiveIntegerField(blank=True, help_text='Units on hand, reserved at checkout (shop/stock.py). Leave empty if stock is not tracked.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='in_stock',
+            field=models.BooleanField(default=True, editable=False),
+        ),
+        migrations.RunPython(mark_sold_out, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,15 @@
 # shop/models.py
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+
+def empty_rating_histogram():
+    return {str(star): 0 for star in range(1, 6)}
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=120, unique=True)
@@ -18,6 +25,28 @@ class Category(models.Model):
         return reverse('shop:category_detail', args=[self.slug])
 
 
+class ProductQuerySet(models.QuerySet):
+    def available(self):
+        return self.filter(available=True)
+
+    def with_main_image(self):
+        """Attach each product's main image (is_main first, then the earliest) in one query."""
+        main_images = ProductImage.objects.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('product_id'),
+                order_by=[F('is_main').desc(), F('id').asc()],
+            )
+        ).filter(position=1)
+        return self.prefetch_related(
+            Prefetch('images', queryset=main_images, to_attr='prefetched_main_images')
+        )
+
+    def for_listing(self):
+        """Everything a product card needs: category plus main image."""
+        return self.select_related('category').with_main_image()
+
+
 class Product(models.Model):
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
@@ -33,7 +62,11 @@ class Product(models.Model):
 
     # Stock & Visibility
     available = models.BooleanField(default=True)
-    in_stock = models.BooleanField(default=True)
+    stock = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="Units on hand, reserved at checkout (shop/stock.py). Leave empty if stock is not tracked.",
+    )
+    in_stock = models.BooleanField(default=True, editable=False)   # derived from stock — see save()
 
     # Badges
     is_featured = models.BooleanField(default=False)
@@ -41,25 +74,68 @@ class Product(models.Model):
     is_hot = models.BooleanField(default=False)
     on_sale = models.BooleanField(default=False)
 
+    # Ratings (denormalized from approved reviews — see shop/ratings.py)
+    rating_avg = models.FloatField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_histogram = models.JSONField(default=empty_rating_histogram, blank=True)
+
     # Timestamps
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = ProductQuerySet.as_manager()
+
     class Meta:
         ordering = ('-created',)
-        indexes = [models.Index(fields=['-created']), models.Index(fields=['slug'])]
+        indexes = [
+            models.Index(fields=['-created']),
+            models.Index(fields=['slug']),
+            models.Index(fields=['-rating_avg', '-rating_count']),
+            models.Index(fields=['available', 'category', '-created']),
+            models.Index(fields=['available', 'price']),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.in_stock = self.stock is None or self.stock > 0
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'stock' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'in_stock'}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse('shop:product_detail', args=[self.slug])
 
     def average_rating(self):
-        return self.reviews.aggregate(avg=models.Avg('rating'))['avg'] or 5.0
+        return self.rating_avg if self.rating_count else 5.0
 
     def review_count(self):
-        return self.reviews.count()
+        return self.rating_count
+
+    @property
+    def main_image(self):
+        if hasattr(self, 'prefetched_main_images'):  # set by ProductQuerySet.with_main_image()
+            return self.prefetched_main_images[0] if self.prefetched_main_images else None
+        return self.images.order_by('-is_main', 'id').first()
+
+
+class RelatedProduct(models.Model):
+    """Ranked recommendations for a product, written by the build_related_products command."""
+    product = models.ForeignKey(Product, related_name='recommendations', on_delete=models.CASCADE)
+    related = models.ForeignKey(Product, related_name='recommended_for', on_delete=models.CASCADE)
+    score = models.FloatField()
+    co_purchases = models.PositiveIntegerField(default=0, help_text="Orders containing both products")
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ('-score',)
+        unique_together = ('product', 'related')
+        indexes = [models.Index(fields=['product', '-score'])]
+
+    def __str__(self):
+        return f"{self.product.name} → {self.related.name} ({self.score:.2f})"
 
 
 # Multiple Images
@@ -0,0 +1,221 @@
+# shop/pagination.py
+"""
+Keyset ("cursor") pagination for the catalog list views.
+
+OFFSET pagination makes page N cost N pages of work plus a COUNT(*).
+In cursor mode each page is fetched with a WHERE clause on the last row's
+ordering values instead, so every page costs the same as the first one.
+Cursors are signed, opaque tokens passed as ``?cursor=``.
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'shop.pagination.cursor'
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder rounds datetimes to milliseconds; keyset equality needs them exact.
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def approximate_count(queryset):
+    """COUNT(*) cached per query for CATALOG_COUNT_CACHE_TIMEOUT seconds."""
+    if queryset.query.is_empty():   # e.g. a search with no usable terms
+        return 0
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:   # e.g. category_id__in=[] for an unknown category
+        return 0
+    digest = hashlib.md5(f'{sql}|{params}'.encode()).hexdigest()
+    key = f'catalog-count:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, settings.CATALOG_COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class ApproximateCountPaginator(Paginator):
+    approximate = True
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+class CursorPaginator:
+    """Stand-in for Paginator in cursor mode; only knows the (lazy) total."""
+
+    def __init__(self, queryset, per_page, approximate=False):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.approximate = approximate
+
+    @cached_property
+    def count(self):
+        if self.approximate:
+            return approximate_count(self.queryset)
+        return self.queryset.count()
+
+
+class CursorPage:
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def get_keyset(queryset):
+    """
+    Return the ordering as [(name, descending)] with pk appended as a
+    tie-breaker, or None when the ordering can't be paginated by keyset
+    (expressions, random ordering, related-field lookups).
+    """
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    keys = []
+    for item in ordering:
+        if not isinstance(item, str) or item == '?':
+            return None
+        name = item.lstrip('-')
+        if '__' in name:
+            return None
+        keys.append(('pk' if name == 'id' else name, item.startswith('-')))
+    if not any(name == 'pk' for name, _ in keys):
+        keys.append(('pk', keys[-1][1] if keys else False))
+    return keys
+
+
+def _signature(keys):
+    return [('-' if desc else '') + name for name, desc in keys]
+
+
+def _to_python(model, name, value):
+    if value is None:
+        return None
+    try:
+        field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return float(value)  # annotations such as search_rank
+    return field.to_python(value)
+
+
+def encode_cursor(keys, obj, reverse=False):
+    values = [getattr(obj, name) for name, _ in keys]
+    payload = {
+        'o': _signature(keys),
+        'v': CursorEncoder().encode(values),
+        'r': reverse,
+    }
+    return signing.dumps(payload, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, keys, model):
+    """Return (values, reverse); (None, False) for tokens from another ordering."""
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+    except signing.BadSignature:
+        raise Http404('Invalid cursor.')
+    if payload.get('o') != _signature(keys):
+        return None, False
+    raw = json.loads(payload['v'])
+    values = [_to_python(model, name, value) for (name, _), value in zip(keys, raw)]
+    return values, bool(payload.get('r'))
+
+
+def keyset_filter(keys, values, reverse=False):
+    """(a, b, pk) > (x, y, z) spelled out as an OR of prefixes, per-column direction."""
+    condition = Q()
+    for i, (name, desc) in enumerate(keys):
+        lookup = 'gt' if desc == reverse else 'lt'
+        prefix = {keys[j][0]: values[j] for j in range(i)}
+        condition |= Q(**prefix, **{f'{name}__{lookup}': values[i]})
+    return condition
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for ListView subclasses.
+
+    Enabled per view with ``pagination_mode = 'cursor'`` or site-wide with
+    settings.CATALOG_PAGINATION. A request carrying ``?cursor=`` always uses
+    it. settings.CATALOG_APPROXIMATE_COUNT swaps the per-page COUNT(*) for a
+    cached one in either mode.
+    """
+    pagination_mode = None
+    cursor_query_param = 'cursor'
+
+    def use_cursor_pagination(self):
+        mode = self.pagination_mode or settings.CATALOG_PAGINATION
+        return mode == 'cursor' or self.cursor_query_param in self.request.GET
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        paginator_class = ApproximateCountPaginator if settings.CATALOG_APPROXIMATE_COUNT else self.paginator_class
+        return paginator_class(queryset, per_page, orphans=orphans,
+                               allow_empty_first_page=allow_empty_first_page, **kwargs)
+
+    def paginate_queryset(self, queryset, page_size):
+        keys = get_keyset(queryset) if self.use_cursor_pagination() else None
+        if keys is None:
+            return super().paginate_queryset(queryset, page_size)
+
+        values, reverse = None, False
+        token = self.request.GET.get(self.cursor_query_param)
+        if token:
+            values, reverse = decode_cursor(token, keys, queryset.model)
+
+        page_qs = queryset
+        if values is not None:
+            page_qs = page_qs.filter(keyset_filter(keys, values, reverse))
+        page_qs = page_qs.order_by(*[
+            ('-' if desc != reverse else '') + name for name, desc in keys
+        ])
+
+        rows = list(page_qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        at_start = values is None or (reverse and not has_more)
+        at_end = not reverse and not has_more
+        next_cursor = encode_cursor(keys, rows[-1]) if rows and not at_end else None
+        previous_cursor = encode_cursor(keys, rows[0], reverse=True) if rows and not at_start else None
+
+        paginator = CursorPaginator(queryset, page_size, approximate=settings.CATALOG_APPROXIMATE_COUNT)
+        page = CursorPage(rows, paginator, next_cursor, previous_cursor)
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,76 @@
+# shop/pdfs.py
+"""
+Recipe PDFs rendered once and kept on disk.
+
+A PDF is stored as MEDIA_ROOT/recipe_pdfs/<slug>-<digest>.pdf, where the
+digest hashes everything the PDF shows (recipe fields, ingredient rows,
+the template itself) and nothing about the request: the photo is read from
+MEDIA_ROOT (core/pdf.py), not fetched from the requesting host. The digest
+doubles as the download's ETag, so an unchanged recipe is never re-rendered
+and a revalidating browser gets a 304.
+"""
+import hashlib
+import json
+import os
+import re
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.template.loader import get_template
+
+from core.pdf import PDFRenderError, render_pdf
+
+PDF_DIR = 'recipe_pdfs'
+TEMPLATE_NAME = 'shop/recipe_pdf.html'
+
+
+def recipe_pdf_digest(recipe, ingredients):
+    template = get_template(TEMPLATE_NAME)
+    payload = {
+        'recipe': [
+            recipe.pk, recipe.slug, recipe.title, recipe.image.name, recipe.description,
+            recipe.instructions, recipe.prep_time, recipe.cook_time, recipe.servings, recipe.difficulty,
+        ],
+        'ingredients': [[i.pk, i.product.name, i.quantity, i.notes] for i in ingredients],
+        'template': os.path.getmtime(template.origin.name),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def recipe_pdf_path(recipe, digest):
+    return f'{PDF_DIR}/{recipe.slug}-{digest}.pdf'
+
+
+def render_recipe_pdf(recipe, ingredients):
+    try:
+        return render_pdf(TEMPLATE_NAME, {
+            'recipe': recipe,
+            'ingredients': ingredients,
+        })
+    except PDFRenderError:
+        return None
+
+
+def delete_recipe_pdfs(slug, keep=None):
+    """Remove stored PDFs for a recipe (all of them, or all but ``keep``)."""
+    try:
+        _, files = default_storage.listdir(PDF_DIR)
+    except FileNotFoundError:
+        return
+    pattern = re.compile(rf'^{re.escape(slug)}-[0-9a-f]{{32}}(_\w+)?\.pdf$')
+    for filename in files:
+        path = f'{PDF_DIR}/{filename}'
+        if pattern.match(filename) and path != keep:
+            default_storage.delete(path)
+
+
+def get_recipe_pdf(recipe, ingredients, digest):
+    """Storage path of the PDF for ``digest``, rendering it on first request. None on render error."""
+    path = recipe_pdf_path(recipe, digest)
+    if not default_storage.exists(path):
+        content = render_recipe_pdf(recipe, ingredients)
+        if content is None:
+            return None
+        default_storage.save(path, ContentFile(content))
+        delete_recipe_pdfs(recipe.slug, keep=path)
+    return path
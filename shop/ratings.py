@@ -0,0 +1,73 @@
+# shop/ratings.py
+"""
+Denormalized review aggregates stored on Product.
+
+Listing pages read Product.rating_avg / rating_count / rating_histogram
+directly, so these helpers are the only place that aggregates Review rows.
+"""
+from django.db.models import Count
+
+from .cards import invalidate_product_cards
+from .models import Product, Review, empty_rating_histogram
+
+
+def _collect(product_ids=None):
+    """Return {product_id: histogram} for approved reviews in one grouped query."""
+    reviews = Review.objects.filter(is_approved=True)
+    if product_ids is not None:
+        reviews = reviews.filter(product_id__in=product_ids)
+
+    histograms = {}
+    rows = reviews.order_by().values_list('product_id', 'rating').annotate(n=Count('id'))
+    for product_id, rating, n in rows:
+        histograms.setdefault(product_id, empty_rating_histogram())[str(rating)] = n
+    return histograms
+
+
+def _apply(product, histogram):
+    count = sum(histogram.values())
+    total = sum(int(star) * n for star, n in histogram.items())
+    product.rating_count = count
+    product.rating_avg = round(total / count, 2) if count else 0
+    product.rating_histogram = histogram
+
+
+def refresh_product_ratings(product_ids, batch_size=500):
+    """Recompute the stored rating fields for the given products."""
+    product_ids = set(product_ids)
+    if not product_ids:
+        return 0
+
+    histograms = _collect(product_ids)
+    products = list(Product.objects.filter(id__in=product_ids).only('id'))
+    for product in products:
+        _apply(product, histograms.get(product.id, empty_rating_histogram()))
+
+    Product.objects.bulk_update(
+        products, ['rating_avg', 'rating_count', 'rating_histogram'], batch_size=batch_size
+    )
+    invalidate_product_cards(product_ids)
+    return len(products)
+
+
+def rebuild_all_ratings(batch_size=500):
+    """Recompute rating fields for every product (used by the rebuild_ratings command)."""
+    histograms = _collect()
+    updated = 0
+    batch = []
+    for product in Product.objects.only('id').order_by('id').iterator(chunk_size=batch_size):
+        _apply(product, histograms.get(product.id, empty_rating_histogram()))
+        batch.append(product)
+        if len(batch) >= batch_size:
+            _save(batch)
+            updated += len(batch)
+            batch = []
+    if batch:
+        _save(batch)
+        updated += len(batch)
+    return updated
+
+
+def _save(products):
+    Product.objects.bulk_update(products, ['rating_avg', 'rating_count', 'rating_histogram'])
+    invalidate_product_cards(p.id for p in products)
@@ -0,0 +1,108 @@
+# shop/recommendations.py
+"""
+Offline "related products" mining for the build_related_products command.
+
+Scores mix how often two products were bought together (from OrderLine
+rows, grouped in SQL; older orders need `manage.py backfill_order_lines`)
+with category similarity, and the top RELATED_LIMIT per product are stored
+in RelatedProduct so ProductDetailView needs a single indexed lookup.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Product, RelatedProduct
+
+RELATED_LIMIT = 8
+CO_PURCHASE_WEIGHT = 1.0    # for the most frequent partner; others scale linearly
+CATEGORY_WEIGHT = 0.3       # bonus for sharing a category
+RATING_WEIGHT = 0.1         # tie-breaker among same-category fillers
+
+
+def mine_co_purchases(targets=None):
+    """{product_id: Counter(partner_id -> orders together)}, optionally only for ``targets``."""
+    from cart.models import OrderLine
+
+    lines = OrderLine.objects.filter(product__isnull=False)
+    if targets is not None:
+        lines = lines.filter(product_id__in=targets)
+    # Self-join through the order: one row per (product, partner) with the number of shared orders
+    # (filtering on the annotation keeps it on the joined row; exclude() on the relation would not)
+    pairs = (
+        lines.annotate(partner=F('order__lines__product'))
+        .filter(partner__isnull=False)
+        .exclude(partner=F('product'))
+        .values_list('product_id', 'partner')
+        .annotate(orders=Count('order_id', distinct=True))
+        .order_by()
+    )
+    co_purchases = defaultdict(Counter)
+    for product_id, partner_id, orders in pairs.iterator():
+        co_purchases[product_id][partner_id] = orders
+    return co_purchases
+
+
+def rank_related(product, catalog, by_category, partners):
+    scores, together = {}, {}
+    top = max(partners.values(), default=0)
+    for partner_id, n in partners.items():
+        partner = catalog.get(partner_id)
+        if partner is None:
+            continue  # unavailable or deleted
+        same_category = partner['category_id'] == product['category_id']
+        scores[partner_id] = CO_PURCHASE_WEIGHT * n / top + (CATEGORY_WEIGHT if same_category else 0)
+        together[partner_id] = n
+
+    for partner_id in by_category[product['category_id']]:
+        if len(scores) >= RELATED_LIMIT * 2:
+            break
+        if partner_id != product['id'] and partner_id not in scores:
+            rating = catalog[partner_id]['rating_avg'] or 0
+            scores[partner_id] = CATEGORY_WEIGHT + RATING_WEIGHT * rating / 5
+
+    ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:RELATED_LIMIT]
+    return [(partner_id, score, together.get(partner_id, 0)) for partner_id, score in ranked]
+
+
+def build_related_products(product_ids=None, batch_size=1000):
+    """Recompute recommendations for ``product_ids`` (all available products when None)."""
+    catalog = {
+        row['id']: row for row in Product.objects.available().order_by('-rating_avg', '-created')
+        .values('id', 'category_id', 'rating_avg')
+    }
+    by_category = defaultdict(list)
+    for row in catalog.values():  # already in rating / recency order
+        by_category[row['category_id']].append(row['id'])
+
+    targets = set(catalog) if product_ids is None else set(product_ids) & set(catalog)
+    co_purchases = mine_co_purchases(None if product_ids is None else targets)
+
+    rows = []
+    for product_id in targets:
+        for partner_id, score, together in rank_related(
+            catalog[product_id], catalog, by_category, co_purchases.get(product_id, {})
+        ):
+            rows.append(RelatedProduct(
+                product_id=product_id, related_id=partner_id, score=score, co_purchases=together,
+            ))
+
+    with transaction.atomic():
+        stale = RelatedProduct.objects.all()
+        if product_ids is not None:
+            stale = stale.filter(product_id__in=set(product_ids))
+        stale.delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=batch_size)
+    return len(targets), len(rows)
+
+
+def changed_since(since):
+    """Products whose recommendations may be out of date since ``since``."""
+    from cart.models import OrderLine
+
+    changed = set(Product.objects.filter(updated__gt=since).values_list('id', flat=True))
+    changed |= set(
+        OrderLine.objects.filter(created__gt=since, product__isnull=False)
+        .values_list('product_id', flat=True).distinct()
+    )
+    return changed
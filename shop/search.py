@@ -0,0 +1,175 @@
+# shop/search.py
+"""
+Product search backends.
+
+SQLite builds use an FTS5 virtual table (shop_product_fts) kept in sync by
+the signals in shop/signals.py. PostgreSQL builds use the native full-text
+search from django.contrib.postgres. Anything else falls back to the old
+icontains search. Every backend returns a queryset annotated with
+``search_rank`` (higher is better).
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'shop_product_fts'
+FTS_COLUMNS = ('name', 'short_description', 'description', 'category')
+# bm25() column weights, in FTS_COLUMNS order
+FTS_WEIGHTS = (10.0, 4.0, 1.0, 3.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return _TOKEN_RE.findall((query or '').lower())
+
+
+def no_results(queryset):
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+class BasicSearchBackend:
+    """Unranked icontains search; used when no full-text engine is available."""
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return no_results(queryset)
+        for token in tokens:
+            queryset = queryset.filter(
+                Q(name__icontains=token) |
+                Q(short_description__icontains=token) |
+                Q(description__icontains=token) |
+                Q(category__name__icontains=token)
+            )
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def index_products(self, product_ids):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SqliteFTS5Backend(BasicSearchBackend):
+    """FTS5 with the porter stemmer, prefix matching and bm25 ranking."""
+
+    @staticmethod
+    def match_expression(tokens):
+        # Quote every token so user input can't inject FTS5 syntax; the
+        # trailing * turns each one into a prefix match.
+        return ' '.join('"%s"*' % token.replace('"', '') for token in tokens)
+
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return no_results(queryset)
+
+        # Join the FTS table on rowid rather than collecting ranked ids first: SQLite drives
+        # the join from the MATCH, so the scope (category, availability, facets...) and the
+        # ordering stay in one query and every hit is kept, however broad the query.
+        table = connection.ops.quote_name(queryset.model._meta.db_table)
+        weights = ', '.join(map(str, FTS_WEIGHTS))
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id', f'{FTS_TABLE} MATCH %s'],
+            params=[self.match_expression(tokens)],
+        ).annotate(
+            # bm25() is "lower is better"; flip it so search_rank sorts descending.
+            search_rank=RawSQL(f'-bm25({FTS_TABLE}, {weights})', [], output_field=FloatField()),
+        )
+
+    def index_products(self, product_ids):
+        from .models import Product
+
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        rows = Product.objects.filter(pk__in=product_ids).values_list(
+            'pk', 'name', 'short_description', 'description', 'category__name'
+        )
+        with connection.cursor() as cursor:
+            self._delete(cursor, product_ids)
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+                list(rows),
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if product_ids:
+            with connection.cursor() as cursor:
+                self._delete(cursor, product_ids)
+
+    def rebuild(self):
+        from .models import Category, Product
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) "
+                f"SELECT p.id, p.name, p.short_description, p.description, c.name "
+                f"FROM {Product._meta.db_table} p "
+                f"JOIN {Category._meta.db_table} c ON c.id = p.category_id"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def _delete(cursor, product_ids):
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+
+
+class PostgresSearchBackend(BasicSearchBackend):
+    """Native tsvector search; the vector is computed in the query, so there is nothing to sync."""
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        tokens = tokenize(query)
+        if not tokens:
+            return no_results(queryset)
+
+        vector = (
+            SearchVector('name', weight='A', config='english') +
+            SearchVector('category__name', weight='B', config='english') +
+            SearchVector('short_description', weight='B', config='english') +
+            SearchVector('description', weight='C', config='english')
+        )
+        search_query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens), search_type='raw', config='english'
+        )
+        return queryset.annotate(
+            search_document=vector,
+            search_rank=SearchRank(vector, search_query),
+        ).filter(search_document=search_query)
+
+
+_backend = None
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        if connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        elif fts5_available():
+            _backend = SqliteFTS5Backend()
+        else:
+            _backend = BasicSearchBackend()
+    return _backend
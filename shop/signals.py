@@ -0,0 +1,131 @@
+# shop/signals.py
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .autocomplete import index as autocomplete_index
+from .cards import cards_invalidated, invalidate_product_cards
+from .facets import invalidate_facets
+from .images import delete_variants, schedule_variants
+from .models import Category, Product, ProductImage, Recipe, RecipeIngredient, Review
+from .pdfs import delete_recipe_pdfs
+from .ratings import refresh_product_ratings
+from .search import get_search_backend
+
+
+# ==================== RATINGS ====================
+
+@receiver(pre_save, sender=Review)
+def review_saving(sender, instance, raw=False, **kwargs):
+    # A review moved to another product must also refresh the product it left
+    instance._previous_product_id = None
+    if not raw and not instance._state.adding:
+        instance._previous_product_id = (
+            Review.objects.filter(pk=instance.pk).values_list('product_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def review_changed(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_product_id', None)
+    refresh_product_ratings({instance.product_id} | ({previous} if previous else set()))
+
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, origin=None, **kwargs):
+    # Reviews only cascade from their product (or its category): nothing left to refresh then
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is None or origin_model is Review:
+        refresh_product_ratings([instance.product_id])
+
+
+# ==================== SEARCH INDEX ====================
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_search_backend().index_products([instance.pk])
+        invalidate_product_cards([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+    invalidate_product_cards([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        product_ids = list(instance.products.values_list('pk', flat=True))
+        get_search_backend().index_products(product_ids)
+        invalidate_product_cards(product_ids)
+
+
+# ==================== PRODUCT CARDS ====================
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def product_image_changed(sender, instance, **kwargs):
+    invalidate_product_cards([instance.product_id])
+
+
+# ==================== IMAGE VARIANTS ====================
+
+@receiver(post_save, sender=ProductImage)
+@receiver(post_save, sender=Recipe)
+def image_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_variants(instance.image, [instance.product_id] if sender is ProductImage else [])
+
+
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Recipe)
+def image_deleted(sender, instance, **kwargs):
+    # Rows can share a file (e.g. the benchmark seeder's): keep its variants while one still uses it
+    name = instance.image.name
+    if name and not (
+        ProductImage.objects.filter(image=name).exists() or Recipe.objects.filter(image=name).exists()
+    ):
+        delete_variants(name)
+
+
+# ==================== RECIPE PDFS ====================
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    # Files aren't rolled back with the transaction, so only delete once it commits
+    slug = instance.slug
+    transaction.on_commit(lambda: delete_recipe_pdfs(slug))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    slug = instance.recipe.slug
+    transaction.on_commit(lambda: delete_recipe_pdfs(slug))
+
+
+# ==================== FACET COUNTS ====================
+
+@receiver(cards_invalidated)
+def facet_counts_changed(sender, product_ids, **kwargs):
+    invalidate_facets()
+
+
+# ==================== AUTOCOMPLETE INDEX ====================
+
+@receiver(cards_invalidated)
+def autocomplete_products_changed(sender, product_ids, **kwargs):
+    product_ids = set(product_ids)
+    transaction.on_commit(lambda: autocomplete_index.refresh_products(product_ids))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def autocomplete_category_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        category_id = instance.pk   # a deleted instance loses its pk before the commit
+        transaction.on_commit(lambda: autocomplete_index.refresh_category(category_id))
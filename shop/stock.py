@@ -0,0 +1,56 @@
+# shop/stock.py
+"""
+Stock reservation at checkout.
+
+Product.stock counts units on hand (None = not tracked). reserve_stock()
+takes every cart line with one conditional UPDATE ... WHERE stock >= qty,
+so two shoppers can never both get the last unit, and no row stays locked
+longer than that statement — there is no SELECT ... FOR UPDATE to queue on.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, Case, F, Q, Value, When
+
+from .cards import invalidate_product_cards
+from .models import Product
+
+
+class OutOfStock(Exception):
+    def __init__(self, name, available):
+        self.name = name
+        self.available = available or 0
+        super().__init__(f'Only {self.available} of "{name}" left in stock.')
+
+
+def reserve_stock(quantities):
+    """
+    Take ``{product_id: quantity}`` from stock. Must run inside the checkout's
+    transaction.atomic(): on OutOfStock the caller's rollback returns any
+    units already taken for earlier lines.
+    """
+    if connection.vendor == 'postgresql':
+        # Fail fast instead of queueing behind another checkout's row lock
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL lock_timeout = %s", [f'{settings.STOCK_LOCK_TIMEOUT_MS}ms'])
+
+    for product_id in sorted(quantities):   # fixed order, so concurrent checkouts can't deadlock
+        quantity = quantities[product_id]
+        taken = Product.objects.filter(
+            Q(stock__isnull=True) | Q(stock__gte=quantity), pk=product_id,
+        ).update(
+            stock=F('stock') - quantity,   # NULL (untracked) stays NULL
+            in_stock=Case(
+                When(stock__isnull=True, then=Value(True)),
+                When(stock__gt=quantity, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
+        if not taken:
+            product = Product.objects.filter(pk=product_id).values('name', 'stock').first() or {}
+            raise OutOfStock(product.get('name', f'#{product_id}'), product.get('stock'))
+
+    sold_out = list(Product.objects.filter(pk__in=quantities, stock=0).values_list('pk', flat=True))
+    if sold_out:
+        # Cards show availability; update() skips the post_save signal that would refresh them
+        invalidate_product_cards(sold_out)
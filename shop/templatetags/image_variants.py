@@ -0,0 +1,26 @@
+# shop/templatetags/image_variants.py
+from django import template
+
+from shop.images import variant_srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, fmt='webp'):
+    """{% srcset product_image.image %} → "…-thumbnail.webp 160w, …-card.webp 400w, …" """
+    return variant_srcset(image, fmt)
+
+
+@register.inclusion_tag('shop/partials/responsive_image.html')
+def responsive_image(image, alt='', sizes='100vw', css_class='', style=''):
+    """<picture> with WebP and JPEG variants, falling back to the original upload."""
+    return {
+        'image': image,
+        'webp_srcset': variant_srcset(image, 'webp'),
+        'jpeg_srcset': variant_srcset(image, 'jpeg'),
+        'alt': alt,
+        'sizes': sizes,
+        'css_class': css_class,
+        'style': style,
+    }
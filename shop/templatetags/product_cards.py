@@ -0,0 +1,12 @@
+# shop/templatetags/product_cards.py
+from django import template
+
+from shop.cards import DEFAULT_CARD_TEMPLATE, render_product_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def product_cards(products, template_name=DEFAULT_CARD_TEMPLATE):
+    """{% product_cards products as cards %} — cached card HTML, one entry per product."""
+    return render_product_cards(products, template_name)
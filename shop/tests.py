@@ -1,3 +1,828 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from cart.models import Order, OrderLine
+from core.pdf import _local_path as local_path, local_roots
+from . import images
+from .autocomplete import CHANGE_KEY, VERSION_KEY, PrefixIndex, index as autocomplete_index, warm_up
+from .cards import invalidate_product_cards, render_product_cards
+from .catalog_import import CatalogImporter
+from .facets import Facets
+from .images import manifest_name, schedule_variants, variant_srcset
+from .models import Category, Product, ProductImage, RelatedProduct, Recipe, RecipeIngredient, Review
+from .recommendations import build_related_products, changed_since, mine_co_purchases
+from .search import get_search_backend
+
+ROWS = 1200
+
+
+class AdminQueryBudgetTests(TestCase):
+    """The admin pages run a fixed number of queries, however many rows there are."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        categories = Category.objects.bulk_create(
+            Category(name=f'Category {i}', slug=f'category-{i}') for i in range(ROWS)
+        )
+        cls.products = Product.objects.bulk_create(
+            Product(category=categories[i % 10], name=f'Product {i}', slug=f'product-{i}', description='', price='10.00')
+            for i in range(ROWS)
+        )
+        cls.product = cls.products[0]
+        Review.objects.bulk_create(
+            Review(product=cls.product if i % 2 else cls.products[i], name=f'Reviewer {i}',
+                   email='r@example.com', rating=i % 5 + 1, comment='Good')
+            for i in range(ROWS)
+        )
+        ProductImage.objects.bulk_create(
+            ProductImage(product=cls.product, image=f'products/{i}.jpg', is_main=not i) for i in range(3)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(title=f'Recipe {i}', slug=f'recipe-{i}', image=f'recipes/recipe-{i}/photo.jpg',
+                   description='', instructions='', prep_time=5, cook_time=10, servings=2)
+            for i in range(ROWS)
+        )
+        cls.recipe = recipes[0]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=cls.recipe, product=product) for product in cls.products[:15]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def assertQueryBudget(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_category_changelist(self):
+        self.assertQueryBudget(reverse('admin:shop_category_changelist'), 5)
+
+    def test_product_changelist(self):
+        self.assertQueryBudget(reverse('admin:shop_product_changelist'), 8)
+
+    def test_review_changelist(self):
+        self.assertQueryBudget(reverse('admin:shop_review_changelist'), 6)
+
+    def test_recipe_changelist(self):
+        self.assertQueryBudget(reverse('admin:shop_recipe_changelist'), 5)
+
+    def test_product_change_form_shows_recent_reviews_only(self):
+        response = self.assertQueryBudget(reverse('admin:shop_product_change', args=[self.product.pk]), 7)
+        self.assertEqual(len(response.context['inline_admin_formsets'][1].formset.forms), 20)
+
+    def test_recipe_change_form(self):
+        url = reverse('admin:shop_recipe_change', args=[self.recipe.pk])
+        response = self.assertQueryBudget(url, 6)
+        self.assertContains(response, '<option value="%d" selected>Product 0</option>' % self.products[0].pk, html=True)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, product=product) for product in self.products[15:40]
+        )
+        ContentType.objects.clear_cache()   # looked up again, as on the first request
+        self.assertQueryBudget(url, 6)   # the same with more ingredients
+
+
+class ShopFacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.veg, cls.fruit = Category.objects.bulk_create([
+            Category(name='Vegetables', slug='vegetables'), Category(name='Fruits', slug='fruits'),
+        ])
+        Product.objects.bulk_create([
+            Product(category=cls.veg, name='Kale', slug='kale', description='', price='100.00', is_hot=True),
+            Product(category=cls.veg, name='Spinach', slug='spinach', description='', price='300.00', on_sale=True),
+            Product(category=cls.fruit, name='Mango', slug='mango', description='', price='300.00', is_hot=True),
+            Product(category=cls.fruit, name='Avocado', slug='avocado', description='', price='3000.00',
+                    in_stock=False),
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def facets(self, query):
+        return Facets(QueryDict(query), Category.objects.order_by('id'))
+
+    def counts(self, facets):
+        groups = facets.groups(Product.objects.available())
+        return {group: {o['value']: o['count'] for o in options} for group, options in groups.items()}
+
+    def test_counts_leave_out_their_own_group(self):
+        counts = self.counts(self.facets('category=fruits&badge=hot'))
+        self.assertEqual(counts['categories'], {'vegetables': 1, 'fruits': 1})
+        self.assertEqual(counts['badges'], {'hot': 1, 'new': 0, 'sale': 0, 'in_stock': 1})
+        self.assertEqual(counts['prices'], {'0-250': 0, '250-500': 1, '500-1000': 0, '1000-2500': 0, '2500-': 0})
+
+    def test_counts_are_one_cached_query(self):
+        facets = self.facets('price=250-500')
+        with self.assertNumQueries(1):
+            self.counts(facets)
+        with self.assertNumQueries(0):
+            self.counts(facets)
+
+    def test_product_change_invalidates_counts(self):
+        self.assertEqual(self.counts(self.facets(''))['badges']['hot'], 2)
+        spinach = Product.objects.get(slug='spinach')
+        spinach.is_hot = True
+        with self.captureOnCommitCallbacks(execute=True):
+            spinach.save()
+        self.assertEqual(self.counts(self.facets(''))['badges']['hot'], 3)
+
+    def test_shop_list_applies_facets(self):
+        response = self.client.get(reverse('shop:shop_list'), {'badge': 'hot', 'price': '250-500'})
+        self.assertEqual([p.slug for p in response.context['products']], ['mango'])
+
+
+class AutocompleteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.veg = Category.objects.create(name='Vegetables', slug='vegetables')
+        Product.objects.bulk_create([
+            Product(category=cls.veg, name='Baby Spinach', slug='baby-spinach', description='', price='120.00'),
+            Product(category=cls.veg, name='Spring Onions', slug='spring-onions', description='', price='80.00'),
+            Product(category=cls.veg, name='Hidden Kale', slug='hidden-kale', description='', price='80.00',
+                    available=False),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        autocomplete_index.rebuild()
+
+    def suggest(self, query):
+        response = self.client.get(reverse('shop:autocomplete'), {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [s['name'] for s in response.json()['suggestions']]
+
+    def test_matches_word_prefixes_without_queries(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('sp'), ['Spring Onions', 'Baby Spinach'])
+            self.assertEqual(self.suggest('baby SPIN'), ['Baby Spinach'])
+            self.assertEqual(self.suggest('veg'), ['Vegetables'])
+            self.assertEqual(self.suggest('kale'), [])
+            self.assertEqual(self.suggest('s'), [])
+
+    def test_warm_up_builds_the_index(self):
+        autocomplete_index.version = None
+        autocomplete_index.data = ([], {})
+        warm_up()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('baby'), ['Baby Spinach'])
+
+    def test_saving_updates_the_index(self):
+        product = Product.objects.get(slug='hidden-kale')
+        product.available = True
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        self.assertEqual(self.suggest('kal'), ['Hidden Kale'])
+
+        self.veg.name = 'Greens'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.veg.save()
+        self.assertEqual(self.suggest('gre'), ['Greens'])
+        self.assertEqual(self.suggest('veg'), [])
+
+    def test_unchanged_suggestions_are_not_logged(self):
+        product = Product.objects.get(slug='baby-spinach')
+        version = cache.get(VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_product_cards([product.pk])   # e.g. a new rating
+        autocomplete_index.refresh_products([product.pk])
+        self.assertEqual(cache.get(VERSION_KEY), version)
+
+    def test_other_processes_replay_the_change_log(self):
+        other = PrefixIndex()   # stands in for another process
+        other.rebuild()
+        product = Product.objects.get(slug='spring-onions')
+        product.name = 'Spring Garlic'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        with self.assertNumQueries(1):   # just the changed product, not a rebuild
+            self.assertEqual([s['name'] for s in other.lookup('garl')], ['Spring Garlic'])
+        self.assertEqual(other.version, cache.get(VERSION_KEY))
+
+        product.name = 'Spring Leeks'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        cache.delete(CHANGE_KEY.format(cache.get(VERSION_KEY)))   # expired: the log can't bridge the gap
+        with self.assertNumQueries(2):   # full rebuild: categories and products
+            self.assertEqual([s['name'] for s in other.lookup('leek')], ['Spring Leeks'])
+
+
+class RatingAggregateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        cls.kale = Product.objects.create(category=category, name='Kale', slug='kale', description='', price='100.00')
+        cls.mango = Product.objects.create(category=category, name='Mango', slug='mango', description='', price='90.00')
+
+    def review(self, product, rating, **kwargs):
+        return Review.objects.create(product=product, name='Wanjiru', comment='Good', rating=rating, **kwargs)
+
+    def assertRatings(self, product, avg, count, **histogram):
+        product.refresh_from_db()
+        self.assertEqual((product.rating_avg, product.rating_count), (avg, count))
+        self.assertEqual(product.rating_histogram, {str(star): histogram.get(f's{star}', 0) for star in range(1, 6)})
+
+    def test_create_approve_and_delete(self):
+        self.review(self.kale, 5)
+        pending = self.review(self.kale, 2, is_approved=False)
+        self.assertRatings(self.kale, 5.0, 1, s5=1)
+
+        pending.is_approved = True
+        pending.save()
+        self.assertRatings(self.kale, 3.5, 2, s2=1, s5=1)
+
+        pending.delete()
+        self.assertRatings(self.kale, 5.0, 1, s5=1)
+
+    def test_deleting_a_product_skips_the_rating_refresh(self):
+        for rating in range(1, 6):
+            self.review(self.kale, rating)
+        with CaptureQueriesContext(connection) as queries:
+            self.kale.delete()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE "shop_product"')])
+        self.review(self.mango, 4)
+        Review.objects.filter(product=self.mango).delete()
+        self.assertRatings(self.mango, 0, 0)
+
+    def test_moving_a_review_refreshes_both_products(self):
+        self.review(self.kale, 4)
+        moved = self.review(self.kale, 1)
+        self.assertRatings(self.kale, 2.5, 2, s1=1, s4=1)
+
+        moved.product = self.mango
+        moved.save()
+        self.assertRatings(self.kale, 4.0, 1, s4=1)
+        self.assertRatings(self.mango, 1.0, 1, s1=1)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.veg, cls.fruit = Category.objects.bulk_create([
+            Category(name='Vegetables', slug='vegetables'), Category(name='Fruits', slug='fruits'),
+        ])
+        Product.objects.bulk_create(
+            Product(category=cls.fruit if i % 2 else cls.veg, name=f'Crate {i}', slug=f'crate-{i}',
+                    description='Sweet tomatoes picked this morning.', price='100.00')
+            for i in range(40)
+        )
+        Product.objects.create(category=cls.veg, name='Cherry Tomatoes', slug='cherry-tomatoes', description='',
+                               price='150.00')
+        get_search_backend().rebuild()
+
+    def search(self, **params):
+        response = self.client.get(reverse('shop:shop_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['paginator'].count, [p.slug for p in response.context['products']]
+
+    def test_ranks_name_matches_first_and_keeps_every_hit(self):
+        count, slugs = self.search(q='tomato')
+        self.assertEqual(count, 41)
+        self.assertEqual(slugs[0], 'cherry-tomatoes')
+
+    def facet_counts(self, **params):
+        groups = self.client.get(reverse('shop:shop_list'), params).context['facet_groups']
+        return {option['value']: option['count'] for option in groups['categories']}
+
+    def test_search_within_a_category(self):
+        count, slugs = self.search(q='tomatoes', category='fruits')
+        self.assertEqual(count, 20)
+        self.assertNotIn('cherry-tomatoes', slugs)
+        # Sibling categories still count every search hit
+        self.assertEqual(self.facet_counts(q='tomatoes', category='fruits'), {'vegetables': 21, 'fruits': 20})
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search(q='"tomato* OR NEAR(')[0], 0)
+
+    def test_query_without_terms_matches_nothing(self):
+        self.assertEqual(self.search(q='!!', category='fruits')[0], 0)
+        self.assertEqual(self.facet_counts(q='!!'), {'vegetables': 0, 'fruits': 0})
+
+
+@override_settings(CATALOG_PAGINATION='cursor')
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        Product.objects.bulk_create(
+            Product(category=category, name=f'Product {i}', slug=f'product-{i}', description='', price=i % 7 + 1)
+            for i in range(30)
+        )
+        # Ties on every ordering column: only the pk tie-breaker keeps pages apart
+        Product.objects.update(created=timezone.now())
+
+    def page(self, **params):
+        response = self.client.get(reverse('shop:shop_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj']
+
+    def walk(self, **params):
+        page, slugs = self.page(**params), []
+        slugs.extend(p.slug for p in page)
+        while page.has_next():
+            page = self.page(**params, cursor=page.next_cursor)
+            slugs.extend(p.slug for p in page)
+        return page, slugs
+
+    def test_forward_pages_visit_every_product_once_in_order(self):
+        for orderby, key in [('latest', None), ('price', lambda p: p.price), ('price-desc', lambda p: -p.price)]:
+            with self.subTest(orderby=orderby):
+                _, slugs = self.walk(orderby=orderby)
+                self.assertCountEqual(slugs, [f'product-{i}' for i in range(30)])
+                if key:
+                    products = {p.slug: p for p in Product.objects.all()}
+                    values = [key(products[slug]) for slug in slugs]
+                    self.assertEqual(values, sorted(values))
+
+    def test_previous_cursor_returns_the_same_pages(self):
+        first = self.page(orderby='price')
+        second = self.page(orderby='price', cursor=first.next_cursor)
+        self.assertTrue(first.is_cursor)
+        self.assertFalse(first.has_previous())
+        back = self.page(orderby='price', cursor=second.previous_cursor)
+        self.assertEqual([p.pk for p in back], [p.pk for p in first])
+        self.assertFalse(back.has_previous())
+
+    def test_last_page_has_no_next_cursor(self):
+        page, slugs = self.walk()
+        self.assertEqual(len(slugs), 30)
+        self.assertEqual(len(page), 6)
+        self.assertIsNone(page.next_cursor)
+
+    def test_tampered_cursor_is_a_404(self):
+        response = self.client.get(reverse('shop:shop_list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_cursor_from_another_ordering_starts_over(self):
+        cursor = self.page(orderby='price').next_cursor
+        page = self.page(orderby='latest', cursor=cursor)
+        self.assertEqual([p.pk for p in page], [p.pk for p in self.page(orderby='latest')])
+
+    @override_settings(CATALOG_APPROXIMATE_COUNT=True)
+    def test_approximate_count_is_cached(self):
+        cache.clear()
+        self.assertEqual(self.page().paginator.count, 30)
+        Product.objects.filter(slug='product-0').delete()
+        self.assertEqual(self.page().paginator.count, 30)
+        cache.clear()
+        self.assertEqual(self.page().paginator.count, 29)
+
+    @override_settings(CATALOG_APPROXIMATE_COUNT=True)
+    def test_approximate_count_of_nothing(self):
+        for params in ({'q': '!!'}, {'category': 'no-such-category'}):
+            for cursor in ({}, {'cursor': ''}):
+                with self.subTest(**params, **cursor):
+                    self.assertEqual(self.page(**params, **cursor).paginator.count, 0)
+
+
+class ListingPrefetchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Vegetables', slug='vegetables')
+        cls.products = Product.objects.bulk_create(
+            Product(category=cls.category, name=f'Product {i}', slug=f'product-{i}', description='', price='10.00')
+            for i in range(12)
+        )
+        first, second = cls.products[:2]
+        ProductImage.objects.bulk_create([
+            ProductImage(product=first, image='products/first-a.jpg'),
+            ProductImage(product=first, image='products/first-main.jpg', is_main=True),
+            ProductImage(product=second, image='products/second-a.jpg'),
+            ProductImage(product=second, image='products/second-b.jpg'),
+        ])
+
+    def test_main_image_prefers_is_main_then_the_earliest(self):
+        products = {p.slug: p for p in Product.objects.with_main_image()}
+        self.assertEqual(products['product-0'].main_image.image.name, 'products/first-main.jpg')
+        self.assertEqual(products['product-1'].main_image.image.name, 'products/second-a.jpg')
+        self.assertIsNone(products['product-2'].main_image)
+
+    def test_prefetched_main_image_matches_the_fallback_query(self):
+        for product in Product.objects.with_main_image():
+            with self.subTest(product=product.slug):
+                fallback = Product.objects.get(pk=product.pk).main_image
+                self.assertEqual(product.main_image, fallback)
+
+    def test_listing_queries_do_not_grow_with_the_page(self):
+        def queries(count):
+            Product.objects.exclude(pk__in=[p.pk for p in self.products[:count]]).update(available=False)
+            cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                self.client.get(reverse('shop:shop_list'))
+            Product.objects.update(available=True)
+            return len(captured)
+
+        self.assertEqual(queries(2), queries(12))
+
+
+class ProductCardCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        cls.kale = Product.objects.create(category=category, name='Kale', slug='kale', description='', price='100.00')
+
+    def setUp(self):
+        cache.clear()
+
+    def card(self):
+        return render_product_cards(Product.objects.for_listing().filter(pk=self.kale.pk))[0]
+
+    def test_cards_are_served_from_cache_until_invalidated(self):
+        self.assertIn('Kale', self.card())
+        Product.objects.filter(pk=self.kale.pk).update(name='Curly Kale')   # no signals
+        self.assertNotIn('Curly Kale', self.card())
+        with self.captureOnCommitCallbacks(execute=True):
+            invalidate_product_cards([self.kale.pk])
+        self.assertIn('Curly Kale', self.card())
+
+    def test_stamp_changes_only_when_the_transaction_commits(self):
+        self.card()
+        self.kale.name = 'Curly Kale'
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.kale.save()
+            self.assertNotIn('Curly Kale', self.card())   # the stamp still names the cached card
+        self.assertTrue(callbacks)
+        for callback in callbacks:
+            callback()
+        self.assertIn('Curly Kale', self.card())
+
+
+class RelatedProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        veg, fruit = Category.objects.bulk_create([
+            Category(name='Vegetables', slug='vegetables'), Category(name='Fruits', slug='fruits'),
+        ])
+        cls.kale, cls.spinach, cls.mango, cls.lemon = Product.objects.bulk_create(
+            Product(category=category, name=name, slug=name.lower(), description='', price='10.00')
+            for category, name in [(veg, 'Kale'), (veg, 'Spinach'), (fruit, 'Mango'), (fruit, 'Lemon')]
+        )
+        cls.order(cls.kale, cls.mango)
+        cls.order(cls.kale, cls.mango, cls.mango)   # the same product twice counts once
+        cls.order(cls.kale, cls.lemon)
+        cls.order(cls.spinach)
+
+    @staticmethod
+    def order(*products, created=None):
+        items = [{'product_id': p.id, 'name': p.name, 'quantity': 1, 'price': '10.00'} for p in products]
+        order = Order.objects.create(total_paid='10.00', items=items)
+        if created:
+            Order.objects.filter(pk=order.pk).update(created=created)
+            order.refresh_from_db()
+        OrderLine.objects.bulk_create(OrderLine.from_items(order))
+        return order
+
+    def test_co_purchases_are_counted_per_order(self):
+        co_purchases = mine_co_purchases()
+        self.assertEqual(co_purchases[self.kale.id], {self.mango.id: 2, self.lemon.id: 1})
+        self.assertEqual(co_purchases[self.mango.id], {self.kale.id: 2})
+        self.assertNotIn(self.spinach.id, co_purchases)
+        self.assertEqual(mine_co_purchases({self.mango.id}), {self.mango.id: {self.kale.id: 2}})
+
+    def test_related_products_rank_co_purchases_first(self):
+        build_related_products()
+        related = list(RelatedProduct.objects.filter(product=self.kale).values_list('related__name', 'co_purchases'))
+        self.assertEqual(related[:2], [('Mango', 2), ('Lemon', 1)])
+        # Nothing bought with it: same-category fillers only
+        self.assertEqual(
+            list(RelatedProduct.objects.filter(product=self.spinach).values_list('related__name', flat=True)),
+            ['Kale'],
+        )
+
+    def test_changed_since_only_sees_new_orders_and_edits(self):
+        since = timezone.now()
+        self.assertEqual(changed_since(since), set())
+        self.order(self.spinach, self.lemon, created=since + timedelta(minutes=1))
+        self.assertEqual(changed_since(since), {self.spinach.id, self.lemon.id})
+
+    def test_incremental_build_keeps_other_products(self):
+        build_related_products()
+        before = RelatedProduct.objects.exclude(product=self.lemon).count()
+        self.assertEqual(build_related_products({self.lemon.id})[0], 1)
+        self.assertEqual(RelatedProduct.objects.exclude(product=self.lemon).count(), before)
+        self.assertTrue(RelatedProduct.objects.filter(product=self.lemon, related=self.kale).exists())
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        self.product = Product.objects.create(
+            category=category, name='Kale', slug='kale', description='', price='10.00',
+        )
+
+    def upload(self, width):
+        buffer = BytesIO()
+        Image.new('RGB', (width, width // 2), 'green').save(buffer, 'JPEG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(
+                product=self.product, is_main=True, image=SimpleUploadedFile('kale.jpg', buffer.getvalue()),
+            )
+
+    def test_srcset_uses_generated_widths(self):
+        image = self.upload(300)
+        # card and detail are both the 300px original: listed once, at its real width
+        self.assertEqual(variant_srcset(image.image, 'webp').count('w,'), 1)
+        self.assertRegex(variant_srcset(image.image, 'webp'), r'-thumbnail\.webp 160w, \S+-card\.webp 300w$')
+
+    def test_srcset_reads_no_storage_once_cached(self):
+        image = self.upload(1200)
+        variant_srcset(image.image, 'jpeg')
+        os.remove(os.path.join(settings.MEDIA_ROOT, manifest_name(image.image.name)))
+        self.assertIn('1000w', variant_srcset(image.image, 'jpeg'))
+
+    def test_srcset_is_empty_until_generated(self):
+        self.assertEqual(variant_srcset(SimpleUploadedFile('missing.jpg', b''), 'webp'), '')
+
+    def test_finished_variants_invalidate_cards(self):
+        render_product_cards([self.product])
+        before = cache.get(f'product-card-version:{self.product.pk}')
+        self.upload(300)
+        self.assertNotEqual(cache.get(f'product-card-version:{self.product.pk}'), before)
+
+    def test_finished_variants_skip_the_database(self):
+        image = self.upload(300)
+        with self.assertNumQueries(0):
+            images._variants_done(image.image.name, {self.product.pk})
+
+    def test_shared_file_keeps_its_variants(self):
+        image = self.upload(300)
+        other = Product.objects.create(category=self.product.category, name='Spinach', slug='spinach',
+                                       description='', price='10.00')
+        ProductImage.objects.create(product=other, image=image.image.name)
+        manifest = os.path.join(settings.MEDIA_ROOT, manifest_name(image.image.name))
+        image.delete()
+        self.assertTrue(os.path.exists(manifest))
+        ProductImage.objects.get().delete()
+        self.assertFalse(os.path.exists(manifest))
+
+    def test_backfill_refreshes_cards(self):
+        buffer = BytesIO()
+        Image.new('RGB', (300, 150), 'green').save(buffer, 'JPEG')
+        image = ProductImage.objects.create(   # on_commit not run: no variants yet
+            product=self.product, is_main=True, image=SimpleUploadedFile('kale.jpg', buffer.getvalue()),
+        )
+        self.assertEqual(images.thumbnail_url(image.image), image.image.url)
+        render_product_cards([self.product])
+        before = cache.get(f'product-card-version:{self.product.pk}')
+
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+        self.assertNotEqual(cache.get(f'product-card-version:{self.product.pk}'), before)
+        self.assertTrue(images.thumbnail_url(image.image).endswith('-thumbnail.jpg'))
+
+    def test_failed_generation_is_logged(self):
+        images._pool = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(setattr, images, '_pool', None)
+        with self.settings(IMAGE_VARIANTS_ASYNC=True), self.assertLogs('shop.images', 'ERROR') as logs:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_variants(SimpleUploadedFile('missing.jpg', b'x'))
+            images._pool.shutdown(wait=True)
+        self.assertIn('missing.jpg', logs.output[0])
+
+
+@override_settings(PDF_RENDER_POOL=False)
+class RecipePdfTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        overrides = override_settings(MEDIA_ROOT=media_root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        self.kale = Product.objects.create(category=category, name='Kale', slug='kale', description='', price='10.00')
+        self.recipe = Recipe.objects.create(title='Kale Stew', slug='kale-stew', image='recipes/kale.jpg', instructions='Stew it.')
+        self.ingredient = RecipeIngredient.objects.create(recipe=self.recipe, product=self.kale, quantity='1 bunch')
+        self.url = reverse('shop:recipe_pdf', args=[self.recipe.slug])
+        os.makedirs(os.path.join(media_root, 'recipes'))
+        Image.new('RGB', (40, 40), 'green').save(os.path.join(media_root, 'recipes', 'kale.jpg'))
+
+    def stored(self):
+        return sorted(os.listdir(os.path.join(settings.MEDIA_ROOT, 'recipe_pdfs')))
+
+    def test_rendered_once_then_served_from_disk(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        etag = response['ETag']
+        [stored] = self.stored()
+        with open(os.path.join(settings.MEDIA_ROOT, 'recipe_pdfs', stored), 'wb') as pdf:
+            pdf.write(b'%PDF-cached')
+
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-cached')
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_ingredient_change_replaces_the_pdf(self):
+        etag = self.client.get(self.url)['ETag']
+        before = self.stored()
+        self.ingredient.quantity = '2 bunches'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ingredient.save()
+        self.assertEqual(self.stored(), [])   # invalidated on save
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertNotEqual(self.stored(), before)
+
+    def test_host_does_not_change_the_pdf(self):
+        etag = self.client.get(self.url)['ETag']
+        before = self.stored()
+        for host in ('www.example.com', '203.0.113.5'):
+            with self.subTest(host=host):
+                response = self.client.get(self.url, HTTP_HOST=host)
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(self.stored(), before)
+
+    def test_photo_is_read_from_media_root(self):
+        self.assertEqual(
+            local_path(local_roots(), self.recipe.image.url, None),
+            os.path.join(settings.MEDIA_ROOT, 'recipes', 'kale.jpg'),
+        )
+        self.assertEqual(local_path(local_roots(), '/media/recipes/missing.jpg', None), '/media/recipes/missing.jpg')
+
+    def test_inactive_recipe_is_404(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class RecipeIngredientsTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Vegetables', slug='vegetables')
+        self.recipe = Recipe.objects.create(title='Greens', slug='greens', image='recipes/greens.jpg', instructions='Cook.')
+        self.kale, self.spinach, self.cabbage = (
+            Product.objects.create(category=category, name=name, slug=name.lower(), description='', price='10.00', **extra)
+            for name, extra in [('Kale', {}), ('Spinach', {'stock': 0}), ('Cabbage', {'available': False})]
+        )
+        for product in (self.kale, self.spinach, self.cabbage):
+            RecipeIngredient.objects.create(recipe=self.recipe, product=product)
+
+    def test_add_all_skips_unavailable_ingredients(self):
+        response = self.client.get(reverse('shop:recipe_detail', args=[self.recipe.slug]))
+        self.assertContains(response, 'Sold out', count=1)
+        product_ids = re.search(r'data-products="([^"]*)"', response.content.decode()).group(1).split()
+        self.assertEqual(product_ids, [str(self.kale.id)])
+
+        response = self.client.post(
+            reverse('cart:cart_batch'),
+            json.dumps({'operations': [{'op': 'add', 'product_id': int(pk), 'quantity': 1} for pk in product_ids]}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['cart_total'], 1)
+
+
+class CatalogImportTests(TestCase):
+    def setUp(self):
+        self.images_dir = tempfile.mkdtemp()
+        media_root = tempfile.mkdtemp()
+        for path in (self.images_dir, media_root):
+            self.addCleanup(shutil.rmtree, path)
+        overrides = override_settings(MEDIA_ROOT=media_root, IMAGE_VARIANTS_ASYNC=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        Image.new('RGB', (40, 40), 'green').save(os.path.join(self.images_dir, 'kale.jpg'))
+
+    def run_import(self, data, **options):
+        importer = CatalogImporter(images_dir=self.images_dir, **options)
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.run(data)
+        return importer
+
+    def test_create_then_upsert(self):
+        importer = self.run_import({'products': [
+            {'name': 'Kale', 'category': 'Vegetables', 'price': '120', 'stock': '5', 'images': 'kale.jpg'},
+            {'name': 'Mango', 'category': 'Fruits', 'price': '1,250.50'},
+            {'name': '', 'category': 'Fruits', 'price': '10'},
+            {'name': 'Lemon', 'category': 'Fruits', 'price': 'cheap'},
+            {'name': 'Spinach', 'price': '10'},
+        ]})
+        self.assertEqual(
+            {k: v for k, v in importer.counts.items() if v},
+            {'categories_created': 2, 'products_created': 2, 'images_added': 1, 'errors': 3},
+        )
+        self.assertEqual(Product.objects.get(slug='mango').price, Decimal('1250.50'))
+        self.assertEqual(get_search_backend().search(Product.objects.all(), 'kale').count(), 1)
+
+        importer = self.run_import({'products': [
+            {'name': 'Kale', 'price': '100', 'stock': '0'},
+            {'name': 'Mango', 'price': '1250.50'},
+        ]}, upsert=True)
+        self.assertEqual((importer.counts['products_updated'], importer.counts['products_unchanged']), (1, 1))
+        kale = Product.objects.get(slug='kale')
+        self.assertEqual((kale.price, kale.stock, kale.in_stock), (Decimal('100'), 0, False))
+
+    def test_create_mode_skips_existing(self):
+        self.run_import({'products': [{'name': 'Kale', 'category': 'Vegetables', 'price': '120'}]})
+        importer = self.run_import({'products': [{'name': 'kale', 'price': '1'}]})
+        self.assertEqual(importer.counts['products_skipped'], 1)
+        self.assertEqual(Product.objects.get().price, Decimal('120'))
+
+    def test_unknown_slug_falls_back_to_the_name(self):
+        self.run_import({'products': [{'name': 'Kale', 'category': 'Vegetables', 'price': '120'}]})
+        self.run_import({'products': [{'name': 'Kale', 'slug': 'curly-kale', 'price': '90'}]}, upsert=True)
+        self.assertEqual(list(Product.objects.values_list('slug', 'price')), [('kale', Decimal('90'))])
+
+    def test_images_for_products_with_images_are_reported(self):
+        self.run_import({'products': [{'name': 'Kale', 'category': 'Vegetables', 'price': '1', 'images': 'kale.jpg'}]})
+        importer = self.run_import({'products': [{'name': 'Kale', 'price': '2', 'images': 'kale.jpg'}]}, upsert=True)
+        self.assertEqual((importer.counts['images_added'], importer.counts['images_skipped']), (0, 1))
+        self.assertIn('already has images', importer.skipped[0])
+        self.assertEqual(ProductImage.objects.count(), 1)
+
+    def test_missing_image_is_an_error(self):
+        importer = self.run_import({'products': [
+            {'name': 'Kale', 'category': 'Vegetables', 'price': '1', 'images': 'missing.jpg'},
+        ]})
+        self.assertIn("'missing.jpg' not found", importer.errors[0])
+        self.assertTrue(Product.objects.filter(slug='kale').exists())
+
+    def test_recipes_and_duplicate_ingredients(self):
+        importer = self.run_import({
+            'products': [
+                {'name': 'Kale', 'category': 'Vegetables', 'price': '1'},
+                {'name': 'Onion', 'category': 'Vegetables', 'price': '1'},
+            ],
+            'recipes': [{'title': 'Sukuma Wiki', 'image': 'kale.jpg', 'instructions': 'Fry.', 'ingredients': [
+                {'product': 'kale', 'quantity': '1 bunch'},
+                {'product': 'Onion', 'quantity': '1'},
+                {'product': 'Kale', 'quantity': '2 bunches'},
+                {'product': 'beef'},
+            ]}],
+        })
+        self.assertEqual(importer.counts['ingredients'], 2)
+        self.assertEqual(len(importer.errors), 2)
+        self.assertIn('duplicate of row 1', importer.errors[0])
+        recipe = Recipe.objects.get(slug='sukuma-wiki')
+        self.assertEqual(
+            dict(recipe.recipeingredient_set.values_list('product__name', 'quantity')), {'Kale': '1 bunch', 'Onion': '1'},
+        )
+
+    def test_dry_run_saves_nothing(self):
+        importer = self.run_import(
+            {'products': [{'name': 'Kale', 'category': 'Vegetables', 'price': '1', 'images': 'kale.jpg'}]},
+            dry_run=True,
+        )
+        self.assertEqual(importer.counts['products_created'], 1)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_dry_run_keeps_stored_recipe_pdfs(self):
+        self.run_import({'recipes': [{'title': 'Sukuma Wiki', 'image': 'kale.jpg', 'instructions': 'Fry.'}]})
+        stored = os.path.join(settings.MEDIA_ROOT, 'recipe_pdfs', f'sukuma-wiki-{"0" * 32}.pdf')
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        with open(stored, 'wb') as pdf:
+            pdf.write(b'%PDF-cached')
+        self.run_import({'recipes': [{'title': 'Sukuma Wiki', 'instructions': 'Fry well.'}]}, upsert=True, dry_run=True)
+        self.assertTrue(os.path.exists(stored))
+        self.run_import({'recipes': [{'title': 'Sukuma Wiki', 'instructions': 'Fry well.'}]}, upsert=True)
+        self.assertFalse(os.path.exists(stored))
+
+    def test_upsert_bumps_updated(self):
+        self.run_import({'products': [{'name': 'Kale', 'category': 'Vegetables', 'price': '120'}]})
+        Product.objects.update(updated=timezone.now() - timedelta(days=1))
+        before = Product.objects.get().updated
+        self.run_import({'products': [{'name': 'Kale', 'price': '90'}]}, upsert=True)
+        self.assertGreater(Product.objects.get().updated, before)
+
+    def test_command_reads_csv(self):
+        path = os.path.join(self.images_dir, 'products.csv')
+        with open(path, 'w', newline='') as handle:
+            writer = csv.writer(handle)
+            writer.writerow(['name', 'category', 'price'])
+            writer.writerow(['Kale', 'Vegetables', '120'])
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out)
+        self.assertIn('products created: 1', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('import_catalog', os.path.join(self.images_dir, 'kale.jpg'))
@@ -6,6 +6,7 @@ app_name = 'shop'
 
 urlpatterns = [
     path('', views.ShopListView.as_view(), name='shop_list'),
+    path('autocomplete/', views.autocomplete, name='autocomplete'),
     path('category/<slug:slug>/', views.CategoryDetailView.as_view(), name='category_detail'),
     path('product/<slug:slug>/', views.ProductDetailView.as_view(), name='product_detail'),
 
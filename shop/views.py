@@ -1,42 +1,43 @@
 # shop/views.py
 from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse
 from django.views.generic import ListView, DetailView
-from django.db.models import Q, Avg, Count
+from .autocomplete import index as autocomplete_index
+from .facets import Facets
 from .models import Product, Category
+from .pagination import CursorPaginationMixin
+from .search import get_search_backend
 
-class ShopListView(ListView):
+class ShopListView(CursorPaginationMixin, ListView):
     model = Product
     template_name = 'shop/shop_list.html'
     context_object_name = 'products'
     paginate_by = 12
 
     def get_queryset(self):
-        queryset = Product.objects.filter(available=True)
+        queryset = Product.objects.for_listing().available()
         
-        # Search functionality
-        search_query = self.request.GET.get('q')
+        # Search functionality (ranked full-text search, see shop/search.py)
+        search_query = self.request.GET.get('q', '').strip()
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(short_description__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(category__name__icontains=search_query)
-            )
+            queryset = get_search_backend().search(queryset, search_query)
         
-        # Category filter
-        category_slug = self.request.GET.get('category')
-        if category_slug:
-            queryset = queryset.filter(category__slug=category_slug)
+        # Category, badge and price facets (shop/facets.py); counts are taken before filtering
+        self.categories = list(Category.objects.all())
+        self.facets = Facets(self.request.GET, self.categories)
+        self.unfaceted = queryset
+        queryset = self.facets.apply(queryset)
         
-        # Sorting
-        order_by = self.request.GET.get('orderby', 'latest')
-        if order_by == 'price':
+        # Sorting — searches default to relevance
+        order_by = self.request.GET.get('orderby') or ('relevance' if search_query else 'latest')
+        if order_by == 'relevance' and search_query:
+            queryset = queryset.order_by('-search_rank', '-created')
+        elif order_by == 'price':
             queryset = queryset.order_by('price')
         elif order_by == 'price-desc':
             queryset = queryset.order_by('-price')
         elif order_by == 'rating':
-            # Annotate with average rating and order by it
-            queryset = queryset.annotate(avg_rating=Avg('reviews__rating')).order_by('-avg_rating')
+            queryset = queryset.order_by('-rating_avg', '-rating_count')
         else:  # latest
             queryset = queryset.order_by('-created')
         
@@ -44,10 +45,12 @@ class ShopListView(ListView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
+        context['categories'] = self.categories
+        context['facets'] = self.facets
+        context['facet_groups'] = self.facets.groups(self.unfaceted)
         return context
 
-class CategoryDetailView(ListView):
+class CategoryDetailView(CursorPaginationMixin, ListView):
     model = Product
     template_name = 'shop/category_detail.html'
     context_object_name = 'products'
@@ -55,7 +58,7 @@ class CategoryDetailView(ListView):
 
     def get_queryset(self):
         self.category = get_object_or_404(Category, slug=self.kwargs['slug'])
-        return Product.objects.filter(category=self.category, available=True)
+        return Product.objects.for_listing().available().filter(category=self.category)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -68,32 +71,43 @@ class ProductDetailView(DetailView):
     template_name = 'shop/product_detail.html'
     slug_url_kwarg = 'slug'
     context_object_name = 'product'
+    queryset = Product.objects.select_related('category')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         product = self.object
-        context['main_image'] = product.images.filter(is_main=True).first() or product.images.first()
-        context['gallery_images'] = product.images.all()
+        gallery_images = list(product.images.all())
+        context['main_image'] = next((img for img in gallery_images if img.is_main), None) or (
+            gallery_images[0] if gallery_images else None
+        )
+        context['gallery_images'] = gallery_images
         context['reviews'] = product.reviews.filter(is_approved=True)
-        context['related_products'] = Product.objects.filter(
-            category=product.category, available=True
-        ).exclude(id=product.id)[:8]
+        # Precomputed by build_related_products; same-category fallback until it has run
+        related = Product.objects.for_listing().available()
+        context['related_products'] = list(
+            related.filter(recommended_for__product=product).order_by('-recommended_for__score')[:8]
+        ) or related.filter(category=product.category).exclude(id=product.id)[:8]
         return context
+
+
+def autocomplete(request):
+    # Search-as-you-type suggestions from the in-memory prefix index (shop/autocomplete.py)
+    query = request.GET.get('q', '')
+    return JsonResponse({'query': query, 'suggestions': autocomplete_index.lookup(query)})
     
 
 
 # shop/views.py  ← add these classes/functions at the bottom
 
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-from django.http import HttpResponse
-from django.template.loader import get_template
-from xhtml2pdf import pisa
-import io
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from .models import Recipe, RecipeIngredient
+from .pdfs import get_recipe_pdf, recipe_pdf_digest
 
 
-class RecipeListView(ListView):
+class RecipeListView(CursorPaginationMixin, ListView):
     model = Recipe
     template_name = 'shop/recipe_list.html'
     context_object_name = 'recipes'
@@ -116,40 +130,44 @@ class RecipeDetailView(DetailView):
         context['main_image'] = recipe.image
         context['gallery_images'] = []  # can extend later
         context['ingredient_list'] = RecipeIngredient.objects.filter(recipe=recipe).select_related('product')
-        context['featured_products'] = recipe.featured_products.filter(available=True)
+        context['featured_products'] = recipe.featured_products.for_listing().available()
 
         # Fake data so product_detail.html doesn't break
         context['average_rating'] = 5.0
         context['reviews'] = []
-        context['related_products'] = recipe.featured_products.all()[:8]
+        context['related_products'] = recipe.featured_products.for_listing()[:8]
 
         return context
 
 
-# shop/views.py  ← Replace the old recipe_pdf_download function with this one
+def _recipe_pdf_source(request, slug):
+    """Recipe, ingredients and content digest — computed once per request."""
+    if not hasattr(request, '_recipe_pdf_source'):
+        recipe = get_object_or_404(Recipe, slug=slug, is_active=True)
+        ingredients = list(RecipeIngredient.objects.filter(recipe=recipe).select_related('product'))
+        digest = recipe_pdf_digest(recipe, ingredients)
+        request._recipe_pdf_source = (recipe, ingredients, digest)
+    return request._recipe_pdf_source
+
 
+def _recipe_pdf_etag(request, slug):
+    return _recipe_pdf_source(request, slug)[2]
 
 
+@condition(etag_func=_recipe_pdf_etag)
 def recipe_pdf_download(request, slug):
-    recipe = get_object_or_404(Recipe, slug=slug, is_active=True)
-
-    # Get ingredients with product data
-    ingredients = RecipeIngredient.objects.filter(recipe=recipe).select_related('product')
-
-    template = get_template('shop/recipe_pdf.html')
-    html = template.render({
-        'recipe': recipe,
-        'ingredients': ingredients,
-        'request': request,
-    })
-
-    # Create a PDF in memory
-    result = io.BytesIO()
-    pdf = pisa.pisaDocument(io.BytesIO(html.encode("UTF-8")), result)
-
-    if not pdf.err:
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{recipe.slug}-recipe.pdf"'
-        return response
-    else:
-        return HttpResponse("Error generating PDF", status=400)
\ No newline at end of file
+    recipe, ingredients, digest = _recipe_pdf_source(request, slug)
+
+    # Rendered once per recipe version and then served from disk (shop/pdfs.py)
+    path = get_recipe_pdf(recipe, ingredients, digest)
+    if path is None:
+        return HttpResponse("Error generating PDF", status=400)
+
+    response = FileResponse(
+        default_storage.open(path, 'rb'),
+        as_attachment=True,
+        filename=f'{recipe.slug}-recipe.pdf',
+        content_type='application/pdf',
+    )
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -10,7 +10,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.db import connections
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wamugundafarm.settings')
 
 application = get_asgi_application()
+
+# Build the search-as-you-type index before the first request needs it, then
+# drop the connection that opened so a forking server doesn't share it.
+from shop.autocomplete import warm_up  # noqa: E402
+
+warm_up()
+connections.close_all()
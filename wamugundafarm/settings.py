@@ -40,6 +40,7 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'cart.middleware.CartMiddleware',   # lazy request.cart, shared by views and templates
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -71,8 +72,93 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Resized WebP/JPEG variants of uploads (shop/images.py)
+IMAGE_VARIANT_WORKERS = 2
+IMAGE_VARIANTS_ASYNC = True   # False renders variants inline (tests, management shells)
+
 # ==================== CART SESSION ID - REQUIRED ====================
 CART_SESSION_ID = 'cart'   # THIS FIXES THE ERROR YOU HAD!
+CART_STORE = 'db'                      # 'db' (CartLine rows), 'cache' or 'session' — see cart/stores.py
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 14   # seconds an idle cart survives in the 'cache' store
+STOCK_LOCK_TIMEOUT_MS = 2000   # PostgreSQL: give up on a contended stock row instead of queueing (shop/stock.py)
+
+# ==================== CATALOG PAGINATION ====================
+CATALOG_PAGINATION = 'offset'        # 'cursor' switches list views to keyset pagination
+CATALOG_APPROXIMATE_COUNT = False    # cache result counts instead of COUNT(*) on every page
+CATALOG_COUNT_CACHE_TIMEOUT = 300    # seconds
+
+# ==================== SHOP FACETS (shop/facets.py) ====================
+FACET_CACHE_TIMEOUT = 60 * 60   # counts are versioned, so this only bounds memory
+
+# ==================== AUTOCOMPLETE (shop/autocomplete.py) ====================
+AUTOCOMPLETE_LIMIT = 8         # suggestions per response
+AUTOCOMPLETE_MIN_LENGTH = 2    # characters typed before anything is suggested
+AUTOCOMPLETE_BUILD_ON_START = True   # web workers build the index on start (wsgi.py / asgi.py), not on first lookup
+
+# ==================== CACHE ====================
+# Product card / home section / facet / autocomplete version stamps and the 'cache' cart store
+# live here, so every worker process must share it: set CACHE_URL (e.g. redis://127.0.0.1:6379/1)
+# wherever more than one process serves requests. Without it each process gets its own
+# LocMemCache, which is only right for runserver and single-process deployments
+# (`manage.py check --deploy` warns about it, see core/checks.py).
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# ==================== FRAGMENT CACHE ====================
+PRODUCT_CARD_CACHE_TIMEOUT = 60 * 60 * 24   # cards are versioned, so this only bounds memory
+
+# ==================== SECTION CACHE (core/caching.py) ====================
+SECTION_CACHE_TIMEOUT = 300       # seconds a section is served fresh
+SECTION_CACHE_STALE_GRACE = 60    # seconds it may be served stale while one worker refreshes it
+SECTION_CACHE_WAIT = 2            # seconds a cold-miss caller waits for another worker's rebuild
+
+# ==================== PDF RENDERING (core/pdf.py) ====================
+PDF_RENDER_POOL = True      # False converts HTML to PDF inline (tests, debugging)
+PDF_RENDER_WORKERS = 2      # warm xhtml2pdf processes per web/worker process
+PDF_RENDER_TIMEOUT = 30     # seconds before a render is abandoned (and its worker killed)
+PDF_WARM_UP_TEMPLATES = ['cart/invoice_pdf.html', 'shop/recipe_pdf.html']   # converted by each worker on start
+
+# ==================== INVOICE JOBS (cart/invoices.py) ====================
+INVOICE_JOB_MAX_ATTEMPTS = 5       # a job is marked failed after this many renders
+INVOICE_JOB_RETRY_DELAY = 30       # seconds, multiplied by the attempt number
+INVOICE_JOB_LOCK_TIMEOUT = 300     # a running job older than this is assumed dead and re-claimed
+INVOICE_WORKER_CONCURRENCY = 2     # render threads per run_invoice_worker process
+INVOICE_WORKER_POLL_INTERVAL = 2   # seconds an idle worker sleeps between polls
+
+# ==================== PERFORMANCE INSTRUMENTATION (core/middleware.py) ====================
+# Off by default: PERF_INSTRUMENTATION=1 adds Server-Timing headers and JSON lines in perf.jsonl.
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION') == '1'
+PERF_LOG_SAMPLE_RATE = 0.1       # share of ordinary requests logged; over-budget ones always are
+PERF_QUERY_BUDGET = 30           # queries per request
+PERF_LATENCY_BUDGET_MS = 500     # total milliseconds per request
+PERF_LOG_FILE = BASE_DIR / 'perf.jsonl'
+
+BENCHMARK_BASELINE = BASE_DIR / 'benchmarks' / 'baseline.json'   # run_benchmarks --save-baseline writes it
+
+if PERF_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'core.middleware.PerformanceMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'perf_file': {
+            'class': 'logging.FileHandler',
+            'filename': PERF_LOG_FILE,
+            'formatter': 'message',
+            'delay': True,   # the file is only created once something is logged
+        },
+    },
+    'loggers': {
+        'core.perf': {'handlers': ['perf_file'], 'level': 'INFO', 'propagate': False},
+    },
+}
 
 # ==================== WSGI ====================
 WSGI_APPLICATION = 'wamugundafarm.wsgi.application'